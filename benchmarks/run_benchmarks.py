@@ -0,0 +1,278 @@
+import argparse
+import gzip
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import polars as pl
+import synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "sample_analysis", "scripts"))
+
+RESULTS = os.path.join(ROOT, "benchmarks", "results.jsonl")
+
+
+def _load(relative_path):
+    path = os.path.join(ROOT, relative_path)
+    spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _filter_vcf(module, vcf, out):
+    # The fused per-sample rule pipes the calls through with these settings
+    with gzip.open(vcf, "rt") as ifile, open(out, "w") as ofile:
+        module.filter_vcf(ifile, ofile, min_dp=15, min_gq=30, max_missing=1, remove_indels=True)
+
+
+# Stage name -> (script, call on the data paths 'd' writing under 'out')
+STAGES = {
+    "fasta2bed": (
+        "sample_analysis/scripts/01_fasta2bed.py",
+        lambda m, d, out: m.fasta2bed(d["catalog"], os.path.join(out, "catalog.bed")),
+    ),
+    "fasta2bed_sorted_merged": (
+        "sample_analysis/scripts/01_fasta2bed.py",
+        lambda m, d, out: m.fasta2bed_sorted_merged(
+            d["catalog"], os.path.join(out, "catalog_sorted_merged.bed")
+        ),
+    ),
+    "reheader_vcf": (
+        "sample_analysis/scripts/01_vcf_reheader.py",
+        lambda m, d, out: m.reheader_vcf(d["sample_vcf"], os.path.join(out, "S1.vcf")),
+    ),
+    "filter_vcf": (
+        "sample_analysis/scripts/02_vcf_filter.py",
+        lambda m, d, out: _filter_vcf(m, d["sample_vcf"], os.path.join(out, "S1.vcf")),
+    ),
+    "filter_singletons_vcf": (
+        "sample_analysis/scripts/02_filter_singletons.py",
+        lambda m, d, out: m.filter_singletons_vcf(
+            d["sample_vcf"], os.path.join(out, "S1.sort.vcf"), d["singletons"], "S1"
+        ),
+    ),
+    "mask_singletons_vcf": (
+        "sample_analysis/scripts/02_mask_singletons.py",
+        lambda m, d, out: m.mask_singletons_vcf(
+            d["merged_vcf"], os.path.join(out, "all_merged_filtered.vcf.gz"), d["singletons"]
+        ),
+    ),
+    "diversity": (
+        "sample_analysis/scripts/03_diversity.py",
+        lambda m, d, out: m.diversity(
+            d["merged_vcf"],
+            d["bed"],
+            os.path.join(out, "piawka_pi_dxy_fst.tsv"),
+            groups_file=d["pop_index"],
+            fst=True,
+        ),
+    ),
+    "genotype_store": (
+        "sample_analysis/scripts/genotype_store.py",
+        lambda m, d, out: m.build_store(
+            d["merged_vcf"], d["bed"], os.path.join(out, "all_merged_filtered.gt")
+        ),
+    ),
+    "convert_piawka": (
+        "sample_analysis/scripts/piawka_io.py",
+        lambda m, d, out: m.convert_piawka(d["pi"], os.path.join(out, "piawka_pi_dxy_fst.parquet")),
+    ),
+    "window_piawka": (
+        "sample_analysis/scripts/03_window_piawka.py",
+        lambda m, d, out: m.window_piawka(
+            d["pi"], os.path.join(out, "window_pi_dxy_fst_table.tsv")
+        ),
+    ),
+    # The aggregation scripts write next to their input
+    "parse_piawka_het": (
+        "sample_analysis/scripts/03_genomic_piawka_het.py",
+        lambda m, d, out: m.parse_piawka_het(shutil.copy(d["het"], out), d["pop_index"]),
+    ),
+    "parse_piawka_dxy": (
+        "population_analysis/scripts/04_genomic_piawka_pi_dxy_fst.py",
+        lambda m, d, out: m.parse_piawka_dxy(shutil.copy(d["pi"], out)),
+    ),
+}
+
+
+def _max_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024**2 if sys.platform == "darwin" else rss / 1024
+
+
+def run_stage(stage, data_dir):
+    # Runs in a fresh process (see measure): time one call of the stage and
+    # report the process peak RSS before and after it
+    script, call = STAGES[stage]
+    module = _load(script)
+    paths = json.loads(open(os.path.join(data_dir, "paths.json")).read())
+    out = tempfile.mkdtemp(prefix=f"{stage}.", dir=data_dir)
+    base = _max_rss_mb()
+    start = time.perf_counter()
+    call(module, paths, out)
+    seconds = time.perf_counter() - start
+    shutil.rmtree(out)
+    return {"seconds": seconds, "base_rss_mb": base, "peak_rss_mb": _max_rss_mb()}
+
+
+def measure(stage, data_dir):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", stage, data_dir],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Stage {stage} failed:\n{result.stderr}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    loci,
+    samples,
+    populations,
+    stages,
+    repeat=3,
+    sites_per_locus=5,
+    seed=1,
+    workdir=None,
+    output=RESULTS,
+):
+    # Time every stage 'repeat' times at every (loci, samples) scale and append
+    # one JSON record per run to 'output'. The data is kept only in 'workdir'.
+    context = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+    }
+    records = []
+    keep = workdir is not None
+    workdir = workdir or tempfile.mkdtemp(prefix="jedi_bench.")
+    for n_loci, n_samples in itertools.product(loci, samples):
+        data_dir = os.path.join(workdir, f"{n_loci}_{n_samples}_{populations}")
+        start = time.perf_counter()
+        paths = synthetic.generate(
+            data_dir, n_loci, n_samples, populations, sites_per_locus=sites_per_locus, seed=seed
+        )
+        with open(os.path.join(data_dir, "paths.json"), "w") as f:
+            json.dump(paths, f)
+        print(
+            f"{n_loci} loci x {n_samples} samples: data in {time.perf_counter() - start:.1f}s",
+            file=sys.stderr,
+        )
+        scale = {
+            "loci": n_loci,
+            "samples": n_samples,
+            "populations": populations,
+            "sites_per_locus": sites_per_locus,
+        }
+        for stage in stages:
+            for r in range(repeat):
+                record = {
+                    **context,
+                    "stage": stage,
+                    **scale,
+                    "repeat": r,
+                    **measure(stage, data_dir),
+                }
+                records.append(record)
+                print(
+                    f"  {stage:<24} {record['seconds']:8.3f}s {record['peak_rss_mb']:8.1f} MB",
+                    file=sys.stderr,
+                )
+    if not keep:
+        shutil.rmtree(workdir)
+    if output:
+        with open(output, "a") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+    return records
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        print(json.dumps(run_stage(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(
+        description="Time and memory-profile the pipeline's Python stages on synthetic data"
+    )
+    parser.add_argument(
+        "-l",
+        "--loci",
+        help="Catalog loci of each scale (default 10000 100000)",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000],
+    )
+    parser.add_argument(
+        "-s",
+        "--samples",
+        help="Samples of each scale (default 20)",
+        type=int,
+        nargs="+",
+        default=[20],
+    )
+    parser.add_argument("-p", "--populations", help="Populations (default 3)", type=int, default=3)
+    parser.add_argument(
+        "--sites-per-locus", help="VCF sites per locus (default 5)", type=int, default=5
+    )
+    parser.add_argument(
+        "--stages",
+        help="Stages to run (default all)",
+        nargs="+",
+        choices=list(STAGES),
+        default=list(STAGES),
+    )
+    parser.add_argument(
+        "-r", "--repeat", help="Runs of every stage per scale (default 3)", type=int, default=3
+    )
+    parser.add_argument("--seed", help="Synthetic data seed (default 1)", type=int, default=1)
+    parser.add_argument(
+        "-w",
+        "--workdir",
+        help="Where the synthetic data is written (default: a temporary directory)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help=f"JSON lines file the results are appended to (default {RESULTS})",
+        default=RESULTS,
+    )
+    args = vars(parser.parse_args())
+
+    run_benchmarks(
+        args["loci"],
+        args["samples"],
+        args["populations"],
+        args["stages"],
+        repeat=args["repeat"],
+        sites_per_locus=args["sites_per_locus"],
+        seed=args["seed"],
+        workdir=args["workdir"],
+        output=args["output"],
+    )
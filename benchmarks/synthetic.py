@@ -0,0 +1,181 @@
+import gzip
+import os
+
+import numpy as np
+import polars as pl
+
+# Genotype calls drawn for every sample and site, and their frequencies
+GENOTYPES = np.array(["0/0", "0/1", "1/1", "./."])
+GENOTYPE_P = [0.80, 0.10, 0.05, 0.05]
+
+VCF_COLUMNS = ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+META = "##fileformat=VCFv4.2\n##source=JeDi synthetic benchmark data\n"
+
+
+def _loci(rng, n_loci, n_chroms):
+    # Catalog loci spread over the chromosomes in genome order: 100-300 bp
+    # long with 50-2000 bp between them, on either strand
+    chrom = np.sort(rng.integers(0, n_chroms, n_loci))
+    length = rng.integers(100, 301, n_loci)
+    gap = rng.integers(50, 2001, n_loci)
+    start = np.zeros(n_loci, dtype=np.int64)
+    for c in range(n_chroms):
+        idx = np.flatnonzero(chrom == c)
+        start[idx] = np.cumsum(gap[idx] + length[idx]) - length[idx]
+    return pl.DataFrame(
+        {
+            "chrom": [f"chr{c + 1}" for c in chrom],
+            "start": start,
+            "end": start + length,
+            "strand": rng.choice(["+", "-"], n_loci),
+        }
+    )
+
+
+def _sites(rng, loci, sites_per_locus):
+    # 'sites_per_locus' distinct positions inside each locus (1-based VCF POS)
+    n = loci.height * sites_per_locus
+    offset = rng.random(n)
+    starts = np.repeat(loci["start"].to_numpy(), sites_per_locus)
+    lengths = np.repeat((loci["end"] - loci["start"]).to_numpy(), sites_per_locus)
+    slot = np.tile(np.arange(sites_per_locus), loci.height)
+    pos = starts + (lengths * (slot + offset) / sites_per_locus).astype(np.int64) + 1
+    return pl.DataFrame(
+        {
+            "#CHROM": np.repeat(loci["chrom"].to_numpy(), sites_per_locus),
+            "POS": pos,
+            "REF": rng.choice(["A", "C"], n),
+            "ALT": rng.choice(["G", "T"], n),
+        }
+    )
+
+
+def write_catalog(path, loci):
+    # gstacks-style catalog: '>id pos=chrom:pos<strand>' then the sequence;
+    # '+' loci are anchored at their first base and '-' loci at their last
+    seq = "ACGT" * 80
+    with gzip.open(path, "wt") as f:
+        for i, (chrom, start, end, strand) in enumerate(loci.iter_rows(), 1):
+            pos = start + 1 if strand == "+" else end - 1
+            f.write(f">{i} pos={chrom}:{pos}{strand}\n{seq[: end - start]}\n")
+
+
+def write_bed(path, loci):
+    loci.select("chrom", "start", "end").write_csv(path, separator="\t", include_header=False)
+
+
+def write_vcf(path, sites, calls, names):
+    # 'calls' is a sites x samples array of GT strings; DP is constant
+    records = sites.select(
+        "#CHROM",
+        "POS",
+        ID=pl.lit("."),
+        REF="REF",
+        ALT="ALT",
+        QUAL=pl.lit("50"),
+        FILTER=pl.lit("PASS"),
+        INFO=pl.lit("."),
+        FORMAT=pl.lit("GT:DP"),
+    ).with_columns(
+        pl.Series(name, np.char.add(calls[:, k].astype(str), ":20")) for k, name in enumerate(names)
+    )
+    with gzip.open(path, "wt", compresslevel=1) as f:
+        f.write(META + "\t".join(VCF_COLUMNS + list(names)) + "\n")
+        f.write(records.write_csv(separator="\t", include_header=False, quote_style="never"))
+
+
+def write_singletons(path, rng, sites, calls, samples, fraction=0.01):
+    # vcftools --singletons table flagging a random 'fraction' of the sites,
+    # each in one individual that carries the alternative allele
+    carriers = np.isin(calls, ["0/1", "1/1"])
+    picked = np.flatnonzero((rng.random(sites.height) < fraction) & carriers.any(axis=1))
+    indv = [samples[rng.choice(np.flatnonzero(carriers[i]))] for i in picked]
+    kind = ["D" if calls[i, samples.index(s)] == "1/1" else "S" for i, s in zip(picked, indv)]
+    pl.DataFrame(
+        {
+            "CHROM": sites["#CHROM"].gather(picked),
+            "POS": sites["POS"].gather(picked),
+            "SINGLETON/DOUBLETON": kind,
+            "ALLELE": sites["ALT"].gather(picked),
+            "INDV": indv,
+        }
+    ).write_csv(path, separator="\t")
+
+
+def write_piawka_tables(het_path, pi_path, rng, loci, samples, populations, sites_per_locus):
+    # Per-locus tables in piawka's column layout: 'het' rows per sample, and
+    # 'pi' per population plus 'Dxy' and 'Fst_HUD' per population pair
+    names = (
+        loci["chrom"] + "_" + loci["start"].cast(pl.String) + "_" + loci["end"].cast(pl.String)
+    ).to_numpy()
+    n = loci.height
+
+    def rows(pop1, pop2, metric, comps, extra=True):
+        k = len(pop1)
+        den = np.tile(rng.integers(1, comps + 1, n * sites_per_locus).reshape(n, -1).sum(axis=1), k)
+        num = rng.binomial(den, 0.01).astype(float)
+        value = num / den if metric != "Fst_HUD" else rng.random(n * k)
+        table = {
+            "locus": np.tile(names, k),
+            "nSites": sites_per_locus,
+            "pop1": np.repeat(pop1, n),
+            "pop2": np.repeat(pop2, n),
+            "nUsed": sites_per_locus,
+            "metric": metric,
+            "value": value,
+            "numerator": num,
+            "denominator": den.astype(float),
+        }
+        if extra:
+            table["nGenotypes"] = sites_per_locus * 2
+            table["nMissing"] = 0
+        return pl.DataFrame(table)
+
+    het = rows(np.array(samples), np.full(len(samples), "."), "het", 1, extra=False)
+    het.write_csv(het_path, separator="\t", include_header=False)
+
+    pops = sorted(set(populations.values()))
+    pairs = [(a, b) for i, a in enumerate(pops) for b in pops[i + 1 :]]
+    frames = [rows(np.array(pops), np.full(len(pops), "."), "pi", 45)]
+    if pairs:
+        p1, p2 = (np.array(x) for x in zip(*pairs))
+        frames += [rows(p1, p2, "Dxy", 100), rows(p1, p2, "Fst_HUD", 100)]
+    pl.concat(frames).write_csv(pi_path, separator="\t", include_header=False)
+
+
+def generate(out_dir, n_loci, n_samples, n_populations, sites_per_locus=5, n_chroms=10, seed=1):
+    # Write one synthetic data set, with every input of the Python stages, to
+    # 'out_dir' and return the paths by name
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        name: os.path.join(out_dir, filename)
+        for name, filename in {
+            "catalog": "catalog.fa.gz",
+            "bed": "catalog_sorted_merged.bed",
+            "sample_vcf": "S1.vcf.gz",
+            "merged_vcf": "all_merged.vcf.gz",
+            "singletons": "all_merged.singletons",
+            "pop_index": "pop_index.txt",
+            "het": "piawka_het.tsv",
+            "pi": "piawka_pi_dxy_fst.tsv",
+        }.items()
+    }
+    samples = [f"S{k + 1}" for k in range(n_samples)]
+    populations = {s: f"Pop{k % n_populations + 1}" for k, s in enumerate(samples)}
+    loci = _loci(rng, n_loci, n_chroms)
+    sites = _sites(rng, loci, sites_per_locus)
+    calls = rng.choice(GENOTYPES, size=(sites.height, n_samples), p=GENOTYPE_P)
+
+    write_catalog(paths["catalog"], loci)
+    write_bed(paths["bed"], loci)
+    with open(paths["pop_index"], "w") as f:
+        f.writelines(f"{s}\t{p}\n" for s, p in populations.items())
+    # Per-sample VCFs name their sample by BAM path, as bcftools call does
+    for k, sample in enumerate(samples):
+        vcf = os.path.join(out_dir, f"{sample}.vcf.gz")
+        write_vcf(vcf, sites, calls[:, k : k + 1], [f"00-reads/{sample}.bam"])
+    write_vcf(paths["merged_vcf"], sites, calls, samples)
+    write_singletons(paths["singletons"], rng, sites, calls, samples)
+    write_piawka_tables(paths["het"], paths["pi"], rng, loci, samples, populations, sites_per_locus)
+    return paths
@@ -1,34 +1,190 @@
+import sys
+
+# Unit keys of the incremental mode
+sys.path.insert(0, os.path.join(workflow.basedir, 'scripts'))
+import piawka_units
+
+piawka_bed = config.get('sample_analysis_bed', '../sample_analysis/' + config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged{region}.bed')
+piawka_vcf = config.get('sample_analysis_vcf', '../sample_analysis/' + config['python_filter']['output_dir']  + 'all_merged_filtered{region}.vcf.gz')
+# The numpy engine reads the genotype store written next to the VCF instead
+if config['piawka']['engine'] == 'numpy' and config['python_filter']['genotype_store']:
+	piawka_vcf = piawka_vcf.replace('.vcf.gz', '.gt')
+
+def piawka_pi_command(groups):
+	# piawka or the built-in NumPy engine, which writes the same per-locus columns
+	if config['piawka']['engine'] == 'numpy':
+		return f"python /workspace/sample_analysis/scripts/03_diversity.py -b {{input.bed}} -g {groups} -v {{input.vcf}} -f"
+	return f"piawka -j {{threads}} -b {{input.bed}} -g {groups} -v {{input.vcf}} -m -f"
+
 #######################################################################################
-rule piawka_pi:
-	input:
-		bed = config.get('sample_analysis_bed', '../sample_analysis/' + config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed'),
-		vcf = config.get('sample_analysis_vcf', '../sample_analysis/' + config['python_filter']['output_dir']  + 'all_merged_filtered.vcf.gz'),
-		poi = config['pop_kept']
-	output:
-		config['piawka']['output_dir']  + 'piawka_pi_dxy_fst.tsv'
-	params:
-		config['piawka']['script_dir']
-	threads:
-		config['threads']
-	log:
-		config['piawka']['log_pi']
-	shell:
-		"piawka -j {threads} -b {input.bed} -g {input.poi} "
-		"-v {input.vcf} -m -f 2>{log} 1>{output}"
+if config['piawka']['incremental']:
+
+	# Incremental mode: piawka runs once per population (pi) and once per
+	# population pair (dxy, Fst). Each result is cached under a key made of the
+	# populations' sample membership, the engine and the VCF/BED fingerprints, so after
+	# regrouping samples only the populations and pairs that changed rerun. The
+	# cache lives in the 'cache' directory when set, since make wipes the output.
+	if config['cache']:
+		cache_dir = os.path.join(os.path.abspath(config['cache']), 'piawka_units', '')
+	else:
+		cache_dir = config['piawka']['output_dir'] + 'cache/'
+	os.makedirs(cache_dir, exist_ok=True)
 
+	populations = piawka_units.read_populations(config['pop_kept'])
+	units = {region: {} for region in regions}
+	for region in regions:
+		files = config['piawka']['engine'] + piawka_units.fingerprint(piawka_bed.format(region=region)) + piawka_units.fingerprint(piawka_vcf.format(region=region))
+		unit_map = piawka_units.units(populations, files)
+		units[region] = {key: n_pops for key, (n_pops, _members) in unit_map.items()}
+		piawka_units.write_groups(cache_dir, region, unit_map)
+
+	# Populations keep their pi rows and pairs their between-population rows.
+	# The VCF and BED are 'ancient': the fingerprints in the key decide reuse.
+	# A unit is renamed into place once complete: Snakemake's record of
+	# incomplete jobs is in .snakemake/, not next to the persistent cache.
+	rule piawka_pi_unit:
+		input:
+			bed = ancient(piawka_bed),
+			vcf = ancient(piawka_vcf),
+			groups = ancient(cache_dir + 'unit{region}.{key}.groups')
+		output:
+			cache_dir + 'unit{region}.{key}.tsv'
+		wildcard_constraints:
+			key = r"[0-9a-f]{16}"
+		params:
+			keep = lambda wildcards: '$6 == "pi"' if units[wildcards.region][wildcards.key] == 1 else '$6 != "pi"'
+		threads:
+			config['threads']
+		resources:
+			mem_mb = mem_mb(2000),
+			disk_mb = disk_mb(2)
+		benchmark:
+			config['benchmarks'] + 'piawka_pi_unit{region}.{key}.tsv'
+		log:
+			config['piawka']['log_pi'].replace('.log', '{region}.{key}.log')
+		shell:
+			piawka_pi_command('{input.groups}') + " 2>{log} | awk -F'\t' '{params.keep}' > {output}.tmp && mv {output}.tmp {output}"
+
+	rule piawka_pi:
+		input:
+			lambda wildcards: [cache_dir + f'unit{wildcards.region}.{key}.tsv' for key in units[wildcards.region]]
+		output:
+			config['piawka']['output_dir']  + 'piawka_pi_dxy_fst{region}.tsv'
+		resources:
+			mem_mb = mem_mb(200),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'piawka_pi{region}.tsv'
+		shell:
+			"cat {input} > {output}"
+
+else:
+	rule piawka_pi:
+		input:
+			bed = piawka_bed,
+			vcf = piawka_vcf,
+			poi = config['pop_kept']
+		output:
+			config['piawka']['output_dir']  + 'piawka_pi_dxy_fst{region}.tsv'
+		params:
+			config['piawka']['script_dir']
+		threads:
+			config['threads']
+		resources:
+			mem_mb = mem_mb(2000),
+			disk_mb = disk_mb(2)
+		benchmark:
+			config['benchmarks'] + 'piawka_pi{region}.tsv'
+		log:
+			config['piawka']['log_pi'].replace('.log', '{region}.log')
+		shell:
+			piawka_pi_command('{input.poi}') + " 2>{log} 1>{output}"
+
+#######################################################################################
+if n_shards > 1:
+
+	# Per-locus tables of the shards, in genome order
+	rule gather_piawka_pi:
+		input:
+			expand(config['piawka']['output_dir']  + 'piawka_pi_dxy_fst{region}.tsv', region=regions)
+		output:
+			config['piawka']['output_dir']  + 'piawka_pi_dxy_fst.tsv'
+		resources:
+			mem_mb = mem_mb(200),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'gather_piawka_pi.tsv'
+		shell:
+			"cat {input} > {output}"
+
+
+#######################################################################################
+# Columnar copy of the per-locus table read by the aggregation steps
+piawka_ext = {'tsv': '.tsv', 'parquet': '.parquet', 'arrow': '.arrow'}[config['piawka']['format']]
+
+if piawka_ext != '.tsv':
+	rule piawka_convert_pi:
+		input:
+			config['piawka']['output_dir']  + 'piawka_pi_dxy_fst.tsv'
+		output:
+			config['piawka']['output_dir']  + 'piawka_pi_dxy_fst' + piawka_ext
+		resources:
+			mem_mb = mem_mb(1000, 2),
+			disk_mb = disk_mb(0.5)
+		benchmark:
+			config['benchmarks'] + 'piawka_convert_pi.tsv'
+		log:
+			config['piawka_agg']['logs'] + 'convert_pi.log'
+		shell:
+			"python /workspace/sample_analysis/scripts/03_piawka_convert.py {input} {output} 2>{log}"
 
 #######################################################################################
 rule piawka_agg_pi:
 	input:
-		config['piawka']['output_dir']  + 'piawka_pi_dxy_fst.tsv'		
+		config['piawka']['output_dir']  + 'piawka_pi_dxy_fst' + piawka_ext		
 	output:
 		config['piawka_agg']['output_dir']  + 'genomic_dxy_matrix.tsv',
 		config['piawka_agg']['output_dir']  + 'genomic_dxy_table.tsv',
 		config['piawka_agg']['output_dir']  + 'genomic_fst_matrix.tsv',
 		config['piawka_agg']['output_dir']  + 'genomic_fst_table.tsv',
 		config['piawka_agg']['output_dir']  + 'genomic_pi_table.tsv'
+	params:
+		ci = config['resampling']['ci'],
+		replicates = config['resampling']['replicates'],
+		block_size = config['resampling']['block_size'],
+		level = config['resampling']['level'],
+		seed = config['resampling']['seed']
+	threads:
+		config['threads']
+	resources:
+		mem_mb = mem_mb(1000, 0.5),
+		disk_mb = disk_mb(0.01)
+	benchmark:
+		config['benchmarks'] + 'piawka_agg_pi.tsv'
 	log:
 		config['piawka_agg']['logs'] + 'pi_dxy.log'
 	shell:
-		"python /workspace/population_analysis/scripts/04_genomic_piawka_pi_dxy_fst.py {input} 2>{log}"
+		"python /workspace/population_analysis/scripts/04_genomic_piawka_pi_dxy_fst.py {input} "
+		"--ci {params.ci} --replicates {params.replicates} --block-size {params.block_size} "
+		"--level {params.level} --seed {params.seed} --threads {threads} 2>{log}"
 
+#######################################################################################
+# Per-window sums of the per-locus table, for Manhattan plots and outlier scans
+rule piawka_window_pi:
+	input:
+		config['piawka']['output_dir']  + 'piawka_pi_dxy_fst' + piawka_ext
+	output:
+		config['piawka_agg']['output_dir']  + 'window_pi_dxy_fst_table.tsv'
+	params:
+		window_size = config['piawka_window']['window_size'],
+		step = config['piawka_window']['step']
+	resources:
+		mem_mb = mem_mb(1000, 1),
+		disk_mb = disk_mb(0.01)
+	benchmark:
+		config['benchmarks'] + 'piawka_window_pi.tsv'
+	log:
+		config['piawka_agg']['logs'] + 'window_pi_dxy.log'
+	shell:
+		"python /workspace/sample_analysis/scripts/03_window_piawka.py {input} {output} "
+		"-w {params.window_size} -s {params.step} 2>{log}"
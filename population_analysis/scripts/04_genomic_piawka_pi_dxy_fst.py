@@ -1,10 +1,114 @@
 import argparse
+import os
+import sys
 
-import polars as pl
+# The piawka table reader and the resampling engine are shared with
+# sample_analysis/scripts, found relative to this file wherever it is run from
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "..", "sample_analysis", "scripts"
+    ),
+)
+
+import piawka_io  # noqa: E402
+import polars as pl  # noqa: E402
+import resample  # noqa: E402
+
+# Rows of the piawka table aggregated at a time
+BATCH_SIZE = 1_000_000
+
+KEYS = ["metric", "pop1", "pop2"]
+
+
+def _metric_rows(df):
+    # pi is a within-population metric, so its rows are keyed by pop1 alone
+    return df.filter(pl.col("metric").is_in(["pi", "Dxy", "Fst_HUD"])).with_columns(
+        pop2=pl.when(pl.col("metric") == "pi").then(pl.lit(None)).otherwise(pl.col("pop2"))
+    )
+
+
+def _batch_stats(df):
+    # Per-pair sums of numerator/denominator, and count, mean and sum of
+    # squared deviations (M2) of the per-locus values of one chunk
+    return (
+        _metric_rows(df)
+        .group_by(KEYS)
+        .agg(
+            diffs=pl.col("numerator").sum(),
+            comps=pl.col("denominator").sum(),
+            n=pl.col("value").count(),
+            mean=pl.col("value").mean().fill_null(0.0),
+            m2=(pl.col("value").var(ddof=0) * pl.col("value").count()).fill_null(0.0),
+        )
+    )
+
+
+def _merge_stats(a, b):
+    # Combine running states (Chan et al. parallel form of Welford's update):
+    # n = na + nb, mean = (na*ma + nb*mb) / n, M2 = M2a + M2b + sum(ni*(mi - mean)^2)
+    n = pl.col("n").sum()
+    mean = pl.when(n > 0).then((pl.col("n") * pl.col("mean")).sum() / n).otherwise(0.0)
+    return (
+        pl.concat([a, b])
+        .group_by(KEYS)
+        .agg(
+            diffs=pl.col("diffs").sum(),
+            comps=pl.col("comps").sum(),
+            n=n,
+            mean=mean,
+            m2=pl.col("m2").sum() + (pl.col("n") * (pl.col("mean") - mean) ** 2).sum(),
+        )
+    )
+
+
+def _block_sums(df, block):
+    # Per-pair sums within each resampling block, for confidence intervals
+    return (
+        _metric_rows(df)
+        .group_by([*KEYS, block])
+        .agg(
+            diffs=pl.col("numerator").sum(),
+            comps=pl.col("denominator").sum(),
+            vsum=pl.col("value").sum(),
+            n=pl.col("value").count(),
+        )
+    )
+
+
+def _merge_block_sums(a, b):
+    return pl.concat([a, b]).group_by([*KEYS, "block"]).agg(pl.all().sum())
+
+
+def _ratio(num, den):
+    return pl.when(pl.col(den) != 0).then(pl.col(num) / pl.col(den)).otherwise(0.0)
+
+
+def _write_matrix(table, value, output_filename):
+    # pop1 x pop2 matrix of 'value'; pairs that were not computed are 0
+    if table.height == 0:
+        with open(output_filename, "w") as f:
+            f.write("pop1\t\n")
+        return
+    pops2 = sorted(table["pop2"].unique())
+    (
+        table.pivot(on="pop2", index="pop1", values=value)
+        .select(["pop1", *pops2])
+        .fill_null(0.0)
+        .sort("pop1")
+        .write_csv(output_filename, separator="\t")
+    )
 
 
 def parse_piawka_dxy(
     input_filename,
+    batch_size=BATCH_SIZE,
+    ci="none",
+    replicates=resample.REPLICATES,
+    block_size=resample.BLOCK_SIZE,
+    level=resample.LEVEL,
+    seed=None,
+    threads=1,
 ):
     # Name output files
     wdir = "/".join(input_filename.split("/")[:-1])
@@ -16,180 +120,92 @@ def parse_piawka_dxy(
     output_fst_filename1 = wdir + "genomic_fst_table.tsv"
     output_fst_filename2 = wdir + "genomic_fst_matrix.tsv"
 
-    schema = {
-        "column_1": pl.String,
-        "column_2": pl.Int32,
-        "column_3": pl.String,
-        "column_4": pl.String,
-        "column_5": pl.Int32,
-        "column_6": pl.String,
-        "column_7": pl.Float64,
-        "column_8": pl.Float64,
-        "column_9": pl.Float64,
-        "column_10": pl.Int32,
-        "column_11": pl.Int32,
-    }
-
-    names = [
-        "locus",
-        "nSites",
-        "pop1",
-        "pop2",
-        "nUsed ",
-        "metric",
-        "value",
-        "numerator",
-        "denominator",
-        "nGenotypes",
-        "nMissing",
-    ]
-    cols = [
-        "column_1",
-        "column_2",
-        "column_3",
-        "column_4",
-        "column_5",
-        "column_6",
-        "column_7",
-        "column_8",
-        "column_9",
-        "column_10",
-        "column_11",
-    ]
-
-    # Read data into a DataFrame (avoid LazyFrame.rename segfaults)
-    try:
-        df = pl.read_csv(
-            input_filename,
-            separator="\t",
-            has_header=False,
-            schema=schema,
-            ignore_errors=True,
-            new_columns=names,
+    # One chunked pass keeps only per (metric, pop1, pop2) running state,
+    # plus per-block sums of each pair when confidence intervals are wanted
+    block = resample.block_expr(ci, block_size)
+    empty = pl.DataFrame(schema=piawka_io.SCHEMA)
+    stats = _batch_stats(empty)
+    blocks = _block_sums(empty, block)
+    for df in piawka_io.scan_piawka(input_filename).collect_batches(chunk_size=batch_size):
+        stats = _merge_stats(stats, _batch_stats(df))
+        if ci != "none":
+            blocks = _merge_block_sums(blocks, _block_sums(df, block))
+
+    def with_intervals(table, metric, keys, num, den, name):
+        if ci == "none":
+            return table
+        intervals = resample.confidence_intervals(
+            blocks.filter(pl.col("metric") == metric),
+            keys,
+            num,
+            den,
+            name,
+            ci,
+            replicates,
+            level,
+            seed,
+            threads,
         )
-    except TypeError:
-        df = pl.read_csv(
-            input_filename,
-            separator="\t",
-            has_header=False,
-            schema=schema,
-            ignore_errors=True,
-        ).rename(dict(zip(cols, names)))
-
-    # Filters per metric (as dict rows)
-    rows_pi = (
-        df.filter(pl.col("metric") == "pi").select(["pop1", "numerator", "denominator"]).to_dicts()
-    )
-    rows_dxy = (
-        df.filter(pl.col("metric") == "Dxy")
-        .select(["pop1", "pop2", "numerator", "denominator"])
-        .to_dicts()
-    )
-    rows_fst = df.filter(pl.col("metric") == "Fst_HUD").select(["pop1", "pop2", "value"]).to_dicts()
+        return table.join(intervals, on=keys, how="left")
 
     # --------------------------------------------------
     # PI Table
-    agg_pi = {}
-    for r in rows_pi:
-        p = r["pop1"]
-        agg_pi.setdefault(p, {"diffs": 0.0, "comps": 0.0})
-        agg_pi[p]["diffs"] += float(r["numerator"]) if r["numerator"] is not None else 0.0
-        agg_pi[p]["comps"] += float(r["denominator"]) if r["denominator"] is not None else 0.0
-    pi_rows = []
-    for p in sorted(agg_pi.keys()):
-        diffs = agg_pi[p]["diffs"]
-        comps = agg_pi[p]["comps"]
-        pi_rows.append(
-            {"pop1": p, "diffs": diffs, "comps": comps, "pi": (diffs / comps) if comps else 0.0}
-        )
-    pl.DataFrame(pi_rows).write_csv(
-        output_pi_filename,
-        separator="\t",
+    pi = (
+        stats.filter(pl.col("metric") == "pi")
+        .select(["pop1", "diffs", "comps", _ratio("diffs", "comps").alias("pi")])
+        .sort("pop1")
     )
+    pi = with_intervals(pi, "pi", ["pop1"], "diffs", "comps", "pi")
+    pi.write_csv(output_pi_filename, separator="\t")
 
     # --------------------------------------------------
-    # DXY Table
-    agg_dxy = {}
-    pops2 = set()
-    for r in rows_dxy:
-        key = (r["pop1"], r["pop2"])
-        pops2.add(r["pop2"])
-        agg_dxy.setdefault(key, {"diffs": 0.0, "comps": 0.0})
-        agg_dxy[key]["diffs"] += float(r["numerator"]) if r["numerator"] is not None else 0.0
-        agg_dxy[key]["comps"] += float(r["denominator"]) if r["denominator"] is not None else 0.0
-    dxy_rows = []
-    for p1, p2 in sorted(agg_dxy.keys()):
-        diffs = agg_dxy[(p1, p2)]["diffs"]
-        comps = agg_dxy[(p1, p2)]["comps"]
-        dxy_rows.append(
-            {
-                "pop1": p1,
-                "pop2": p2,
-                "diffs": diffs,
-                "comps": comps,
-                "dxy": (diffs / comps) if comps else 0.0,
-            }
-        )
-    pl.DataFrame(dxy_rows).write_csv(output_dxy_filename1, separator="\t")
-
-    # DXY Matrix manual pivot
-    pops1 = sorted({p1 for (p1, _p2) in agg_dxy.keys()})
-    pops2_sorted = sorted(pops2)
-    with open(output_dxy_filename2, "w") as f:
-        f.write("pop1\t" + "\t".join(pops2_sorted) + "\n")
-        for p1 in pops1:
-            row = [p1]
-            for p2 in pops2_sorted:
-                diffs = agg_dxy.get((p1, p2), {}).get("diffs", 0.0)
-                comps = agg_dxy.get((p1, p2), {}).get("comps", 0.0)
-                row.append(str((diffs / comps) if comps else 0.0))
-            f.write("\t".join(row) + "\n")
+    # DXY Table and matrix
+    dxy = (
+        stats.filter(pl.col("metric") == "Dxy")
+        .select(["pop1", "pop2", "diffs", "comps", _ratio("diffs", "comps").alias("dxy")])
+        .sort(["pop1", "pop2"])
+    )
+    dxy = with_intervals(dxy, "Dxy", ["pop1", "pop2"], "diffs", "comps", "dxy")
+    dxy.write_csv(output_dxy_filename1, separator="\t")
+    _write_matrix(dxy, "dxy", output_dxy_filename2)
 
     # --------------------------------------------------
-    # FST Table
-    agg_fst = {}
-    pops2_fst = set()
-    for r in rows_fst:
-        key = (r["pop1"], r["pop2"])
-        pops2_fst.add(r["pop2"])
-        agg_fst.setdefault(key, [])
-        agg_fst[key].append(float(r["value"]))
-
-    def mean_std(vals):
-        n = len(vals)
-        if n == 0:
-            return 0.0, 0.0
-        m = sum(vals) / n
-        if n == 1:
-            return m, 0.0
-        var = sum((x - m) ** 2 for x in vals) / (n - 1)
-        return m, var**0.5
-
-    fst_rows = []
-    for p1, p2 in sorted(agg_fst.keys()):
-        m, s = mean_std(agg_fst[(p1, p2)])
-        fst_rows.append({"pop1": p1, "pop2": p2, "avg_fst": m, "std_fst": s})
-    pl.DataFrame(fst_rows).write_csv(output_fst_filename1, separator="\t")
-
-    # FST Matrix manual pivot
-    pops1_fst = sorted({p1 for (p1, _p2) in agg_fst.keys()})
-    pops2_fst_sorted = sorted(pops2_fst)
-    with open(output_fst_filename2, "w") as f:
-        f.write("pop1\t" + "\t".join(pops2_fst_sorted) + "\n")
-        for p1 in pops1_fst:
-            row = [p1]
-            for p2 in pops2_fst_sorted:
-                m, _s = mean_std(agg_fst.get((p1, p2), []))
-                row.append(str(m))
-            f.write("\t".join(row) + "\n")
-    del df
+    # FST Table and matrix (mean and sample standard deviation over loci)
+    fst = (
+        stats.filter(pl.col("metric") == "Fst_HUD")
+        .select(
+            [
+                "pop1",
+                "pop2",
+                pl.col("mean").alias("avg_fst"),
+                pl.when(pl.col("n") > 1)
+                .then((pl.col("m2") / (pl.col("n") - 1)).sqrt())
+                .otherwise(0.0)
+                .alias("std_fst"),
+            ]
+        )
+        .sort(["pop1", "pop2"])
+    )
+    # The mean Fst over loci is sum(value) / count in each replicate
+    fst = with_intervals(fst, "Fst_HUD", ["pop1", "pop2"], "vsum", "n", "fst")
+    fst.write_csv(output_fst_filename1, separator="\t")
+    _write_matrix(fst, "avg_fst", output_fst_filename2)
     return
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="A Python script to reduce a pixy PI dataframe.")
-    parser.add_argument("filename", help="The path of the dataframe")  # positional argument
+    parser.add_argument(
+        "filename", help="The path of the dataframe (piawka TSV, Parquet or Arrow IPC)"
+    )  # positional argument
+    resample.add_arguments(parser)
     args = vars(parser.parse_args())
     parse_piawka_dxy(
         args["filename"],
+        ci=args["ci"],
+        replicates=args["replicates"],
+        block_size=args["block_size"],
+        level=args["level"],
+        seed=args["seed"],
+        threads=args["threads"],
     )
@@ -0,0 +1,68 @@
+import hashlib
+import itertools
+import os
+
+
+def read_populations(path):
+    # Sorted samples of every population of a popmap (sample, population)
+    pops = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) > 1:
+                    pops.setdefault(parts[1], []).append(parts[0])
+    return {pop: sorted(samples) for pop, samples in sorted(pops.items())}
+
+
+def fingerprint(path):
+    # Small files are hashed; a VCF by its size and its index, which records
+    # where every block of records lies, and a genotype store by its meta.json
+    h = hashlib.sha256()
+    if path.endswith(".vcf.gz"):
+        parts = [path + ".csi"]
+    elif path.endswith(".gt"):
+        parts = [path + "/meta.json"]
+    else:
+        parts = [path]
+    for part in parts:
+        if not os.path.exists(part):
+            return "missing"
+        with open(part, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    if path.endswith(".vcf.gz"):
+        h.update(str(os.path.getsize(path)).encode())
+    return h.hexdigest()
+
+
+def units(populations, files):
+    # One unit per population (pi) and per population pair (dxy, Fst), keyed
+    # on 'files' (engine and input fingerprints) and the sample membership of
+    # its populations only: {key: (number of populations, groups file text)}
+    groups = [[pop] for pop in populations] + [
+        list(pair) for pair in itertools.combinations(populations, 2)
+    ]
+    result = {}
+    for group in groups:
+        members = "".join(f"{sample}\t{pop}\n" for pop in group for sample in populations[pop])
+        key = hashlib.sha256((files + members).encode()).hexdigest()[:16]
+        result[key] = (len(group), members)
+    return result
+
+
+def write_groups(cache_dir, region, unit_map):
+    # Groups file of every unit; content-addressed, so an existing one is
+    # already up to date and keeps its mtime (its result is then reused). Each
+    # is renamed into place, so an interrupted run never leaves a partial one.
+    # Returns the keys of the groups files written.
+    written = []
+    for key, (_n_pops, members) in unit_map.items():
+        groups_file = os.path.join(cache_dir, f"unit{region}.{key}.groups")
+        if not os.path.exists(groups_file):
+            tmp = f"{groups_file}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(members)
+            os.replace(tmp, groups_file)
+            written.append(key)
+    return written
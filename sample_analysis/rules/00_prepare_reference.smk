@@ -1,14 +1,30 @@
 #######################################################################################
-# Rule to copy reference genome to writable location and create index
-# This is needed because bcftools requires write access to create .fai index
+# Rule to link the reference genome next to its index: samtools writes the .fai
+# beside the link, so the (read-only) input directory is left untouched and the
+# reference is not copied on every run
 rule prepare_reference:
 	input:
 		ref = config['ref_genome']
 	output:
-		ref = "00-reads/reference.fa",
+		ref = "00-reads/reference.fa"
+	resources:
+		mem_mb = mem_mb(100),
+		disk_mb = disk_mb(0)
+	benchmark:
+		config['benchmarks'] + 'prepare_reference.tsv'
+	shell:
+		"ln -sf {input.ref} {output.ref}"
+
+rule faidx_reference:
+	input:
+		ref = "00-reads/reference.fa"
+	output:
 		idx = "00-reads/reference.fa.fai"
+	resources:
+		mem_mb = mem_mb(500),
+		disk_mb = disk_mb(0.01)
+	benchmark:
+		config['benchmarks'] + 'faidx_reference.tsv'
 	shell:
-		"""
-		cp {input.ref} {output.ref}
-		samtools faidx {output.ref}
-		"""
+		cached("samtools faidx {input.ref}", tools = ["samtools"])
+#######################################################################################
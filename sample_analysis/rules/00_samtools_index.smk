@@ -9,5 +9,10 @@ rule samtools_index:
 		config['gstacks']['input_dir'] + '{xyz}.bam.csi'
 	threads:
 		config['threads']
+	resources:
+		mem_mb = mem_mb(500),
+		disk_mb = disk_mb(0.01)
+	benchmark:
+		config['benchmarks'] + 'samtools_index.{xyz}.tsv'
 	shell:
-		"samtools index -c -@ {threads} {input}"
+		cached("samtools index -c -@ {threads} {input}", tools = ["samtools"])
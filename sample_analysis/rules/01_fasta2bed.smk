@@ -1,16 +1,95 @@
 #######################################################################################
-rule fasta2bed:
+if config['fasta2bed']['sort_merge']:
+
+	# Parse, sort and merge catalog loci in a single streaming pass
+	rule fasta2bed:
+		input:
+			config['gstacks']['output_dir'] + 'catalog.fa.gz',
+		output:
+			config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
+		resources:
+			mem_mb = mem_mb(1000),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'fasta2bed.tsv'
+		log:
+			config['fasta2bed']['logs']
+		params:
+			pyscript = config['fasta2bed']['dir_script'] + '01_fasta2bed.py',
+			chunk_size = config['fasta2bed']['chunk_size'],
+		threads:
+			config['threads']
+		shell:
+			"python3 {params.pyscript} {input} {output} --sort-merge "
+			"--chunk-size {params.chunk_size} --threads {threads} 2>{log}"
+
+else:
+	rule fasta2bed:
+		input:
+			config['gstacks']['output_dir'] + 'catalog.fa.gz',
+		output:
+			config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
+		resources:
+			mem_mb = mem_mb(1000),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'fasta2bed.tsv'
+		log:
+			config['fasta2bed']['logs']
+		params:
+			pyscript = config['fasta2bed']['dir_script'] + '01_fasta2bed.py',
+			bed = config['fasta2bed']['dir_stacks'] + 'catalog.bed',
+			sorted_bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted.bed',
+		threads:
+			config['threads']
+		shell:
+			"python3 {params.pyscript} {input} {params.bed} --threads {threads} 2>{log} && "
+			"sortBed -i {params.bed} 1>{params.sorted_bed} 2>>{log} && "
+			"mergeBed -i {params.sorted_bed} 1>{output}"
+
+#######################################################################################
+if n_shards > 1:
+
+	# Balanced, contiguous region shards of the catalog loci
+	rule split_bed:
+		input:
+			config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
+		output:
+			expand(config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged{region}.bed', region=regions),
+		resources:
+			mem_mb = mem_mb(200, 2),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'split_bed.tsv'
+		log:
+			config['fasta2bed']['logs']
+		params:
+			pyscript = config['fasta2bed']['dir_script'] + '01_split_bed.py',
+		shell:
+			"python3 {params.pyscript} {input} {output} 2>>{log}"
+
+#######################################################################################
+# How 'bcftools mpileup' reaches the catalog loci, chosen from their density
+rule mpileup_regions:
 	input:
-		config['gstacks']['output_dir'] + 'catalog.fa.gz',
+		bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
+		idx = "00-reads/reference.fa.fai"
 	output:
-		config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
+		windows = config['fasta2bed']['dir_stacks'] + 'catalog_windows.bed',
+		args = config['fasta2bed']['dir_stacks'] + 'catalog_mpileup.args'
+	resources:
+		mem_mb = mem_mb(200, 2),
+		disk_mb = disk_mb(1)
+	benchmark:
+		config['benchmarks'] + 'mpileup_regions.tsv'
 	log:
 		config['fasta2bed']['logs']
 	params:
-		pyscript = config['fasta2bed']['dir_script'] + '01_fasta2bed.py',
-		bed = config['fasta2bed']['dir_stacks'] + 'catalog.bed',
-		sorted_bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted.bed',
+		pyscript = config['fasta2bed']['dir_script'] + '01_mpileup_regions.py',
+		strategy = config['bcftools_call']['region_access'],
+		max_gap = config['bcftools_call']['max_gap'],
+		stream_fraction = config['bcftools_call']['stream_fraction'],
 	shell:
-		"python3 {params.pyscript} {input} {params.bed} 2>{log} && "
-		"sortBed -i {params.bed} 1>{params.sorted_bed} 2>>{log} && "
-		"mergeBed -i {params.sorted_bed} 1>{output}"
+		"python3 {params.pyscript} {input.bed} {input.idx} {output.windows} {output.args} "
+		"--strategy {params.strategy} --max-gap {params.max_gap} "
+		"--stream-fraction {params.stream_fraction} 2>>{log}"
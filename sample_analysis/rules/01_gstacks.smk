@@ -12,11 +12,20 @@ rule gstacks:
 		ibams  = expand(config['gstacks']['input_dir'] + "{xyz}.bam.csi", xyz=bams,),
 	output:
 		config['gstacks']['output_dir'] + 'catalog.fa.gz',
+	resources:
+		mem_mb = mem_mb(2000, 0.1),
+		disk_mb = disk_mb(0.1)
+	benchmark:
+		config['benchmarks'] + 'gstacks.tsv'
 	log:
 		config['gstacks']['logs']
 	shell:
-		"gstacks -I {params.input_dir} "
-		"-M {input.popmap} "
-		"-O {params.output_dir} "
-		"--min-mapq {params.min_map_quality} "
-		"-t {threads} >> {log} 2>&1"
+		cached(
+			"gstacks -I {params.input_dir} "
+			"-M {input.popmap} "
+			"-O {params.output_dir} "
+			"--min-mapq {params.min_map_quality} "
+			"-t {threads} >> {log} 2>&1",
+			tools = ["gstacks"],
+			key = "{params.min_map_quality}"
+		)
@@ -3,15 +3,25 @@ rule bcftools_call:
 	input:
 		bam = config['gstacks']['input_dir'] + '{xyz}.bam',
 		bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
+		access = config['fasta2bed']['dir_stacks'] + 'catalog_mpileup.args',
 		genome = "00-reads/reference.fa",
 		idx = "00-reads/reference.fa.fai"
 	output:
 		config['bcftools_call']['output_dir'] + '_{xyz}_.vcf.gz'
+	resources:
+		mem_mb = mem_mb(1000),
+		disk_mb = disk_mb(0.1)
+	benchmark:
+		config['benchmarks'] + 'bcftools_call.{xyz}.tsv'
 	log:
 		config['bcftools_call']['logs'] + '{xyz}.log'
 	shell:
-		"bcftools mpileup -Ou -Q 30 -q 30 -a FORMAT/DP -R {input.bed} -f {input.genome} {input.bam} | "
-		"bcftools call -c -f GQ -O u | bcftools filter -e 'QUAL<30' -O z -o {output} 2>{log} "
+		cached(
+			"bcftools mpileup -Ou -Q 30 -q 30 -a FORMAT/DP $(cat {input.access}) -f {input.genome} {input.bam} | "
+			"bcftools call -c -f GQ -O u | bcftools filter -e 'QUAL<30' -O z -o {output} 2>{log} ",
+			tools = ["bcftools"],
+			key = "{wildcards.xyz}"
+		)
 
 #########################################################################################
 rule reheader:
@@ -19,11 +29,18 @@ rule reheader:
 		config['bcftools_call']['output_dir'] + '_{xyz}_.vcf.gz'
 	output:
 		config['bcftools_call']['output_dir'] + '{xyz}_reheaded.vcf.gz'
+	resources:
+		mem_mb = mem_mb(500, 10),
+		disk_mb = disk_mb(2)
+	benchmark:
+		config['benchmarks'] + 'reheader.{xyz}.tsv'
 	log:
 		config['bcftools_call']['logs'] + '{xyz}.log'
 	params:
 		config['bcftools_call']['output_dir'] + '{xyz}_reheaded.vcf'
+	threads:
+		config['threads']
 	shell:
-		"python /workspace/sample_analysis/scripts/01_vcf_reheader.py -v {input} -o {params} -gz 2>>{log} "
+		"python /workspace/sample_analysis/scripts/01_vcf_reheader.py -v {input} -o {params} -gz --splice -t {threads} 2>>{log} "
 
 
@@ -0,0 +1,37 @@
+#######################################################################################
+# bcftools_call, reheader, vcftools_filter and bcftools_sort fused: the calls
+# stream through sample renaming and genotype/site filtering into bcftools sort,
+# and only the sorted BGZF VCF and its CSI index are written
+rule call_filter_sort:
+	input:
+		bam = config['gstacks']['input_dir'] + '{xyz}.bam',
+		bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
+		access = config['fasta2bed']['dir_stacks'] + 'catalog_mpileup.args',
+		genome = "00-reads/reference.fa",
+		idx = "00-reads/reference.fa.fai"
+	output:
+		vcf = config['vcftools_filter']['output_dir'] + '{xyz}.sort.vcf.gz',
+		csi = config['vcftools_filter']['output_dir'] + '{xyz}.sort.vcf.gz.csi'
+	resources:
+		mem_mb = mem_mb(2000),
+		disk_mb = disk_mb(0.2)
+	benchmark:
+		config['benchmarks'] + 'call_filter_sort.{xyz}.tsv'
+	log:
+		config['bcftools_call']['logs'] + '{xyz}.log'
+	params:
+		pyscript = config['fasta2bed']['dir_script'] + '02_vcf_filter.py',
+		minDP = config['vcftools_filter']['minDP'],
+		tempdir = config['vcftools_filter']['output_dir'] + '{xyz}/'
+	shell:
+		cached(
+			"mkdir -p {params.tempdir} && "
+			"bcftools mpileup -Ou -Q 30 -q 30 -a FORMAT/DP $(cat {input.access}) -f {input.genome} {input.bam} 2>{log} | "
+			"bcftools call -c -f GQ -O u 2>>{log} | bcftools filter -e 'QUAL<30' -O v 2>>{log} | "
+			"python3 {params.pyscript} --min-dp {params.minDP} --min-gq 30 --max-missing 1 --remove-indels 2>>{log} | "
+			"bcftools sort --temp-dir {params.tempdir} -Oz -o {output.vcf} --write-index=csi 2>>{log} && "
+			"rmdir {params.tempdir}",
+			tools = ["bcftools", "python3"],
+			key = "{wildcards.xyz} {params.minDP}",
+			scripts = ['02_vcf_filter.py']
+		)
@@ -4,12 +4,21 @@ rule vcftools_filter:
 		config['bcftools_call']['output_dir'] + '{xyz}_reheaded.vcf.gz'
 	output:
 		config['vcftools_filter']['output_dir'] + '{xyz}.vcf.gz'
+	resources:
+		mem_mb = mem_mb(500),
+		disk_mb = disk_mb(1)
+	benchmark:
+		config['benchmarks'] + 'vcftools_filter.{xyz}.tsv'
 	log:
 		config['vcftools_filter']['logs'] + '{xyz}.log'
 	params:
 		minDP = config['vcftools_filter']['minDP']
 	shell:
-		"vcftools --gzvcf {input} --minDP {params.minDP} "
-		"--minGQ 30 --max-missing-count 1 --remove-indels "
-		"--recode --recode-INFO-all --stdout 2>{log} | "
-		"gzip -c > {output} 2>>{log}"
+		cached(
+			"vcftools --gzvcf {input} --minDP {params.minDP} "
+			"--minGQ 30 --max-missing-count 1 --remove-indels "
+			"--recode --recode-INFO-all --stdout 2>{log} | "
+			"gzip -c > {output} 2>>{log}",
+			tools = ["vcftools"],
+			key = "{params.minDP}"
+		)
@@ -3,13 +3,22 @@ rule bcftools_sort:
 	input:
 		config['vcftools_filter']['output_dir'] + '{xyz}.vcf.gz'
 	output:
-		config['vcftools_filter']['output_dir'] + '{xyz}.sort.vcf.gz'
+		vcf = config['vcftools_filter']['output_dir'] + '{xyz}.sort.vcf.gz',
+		csi = config['vcftools_filter']['output_dir'] + '{xyz}.sort.vcf.gz.csi'
+	resources:
+		mem_mb = mem_mb(1024),
+		disk_mb = disk_mb(10)
+	benchmark:
+		config['benchmarks'] + 'bcftools_sort.{xyz}.tsv'
 	log:
 		config['bcftools_sort']['logs'] + '{xyz}.log'
 	params:
 		tempdir = config['vcftools_filter']['output_dir'] + '{xyz}/'
 	shell:
-		"mkdir -p {params.tempdir} && "
-		"bcftools sort --temp-dir {params.tempdir} {input} -Oz -o {output} 2>{log} && "
-		"bcftools index -c {output} 2>>{log} && "
-		"rmdir {params.tempdir}"
\ No newline at end of file
+		cached(
+			"mkdir -p {params.tempdir} && "
+			"bcftools sort --temp-dir {params.tempdir} {input} -Oz -o {output.vcf} 2>{log} && "
+			"bcftools index -c {output.vcf} 2>>{log} && "
+			"rmdir {params.tempdir}",
+			tools = ["bcftools"]
+		)
\ No newline at end of file
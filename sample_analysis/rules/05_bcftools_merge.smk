@@ -1,165 +1,109 @@
 import os
 import math
+import resource
 
 idir = config['vcftools_filter']['output_dir']
-odir = config['bcftools_merge']['output_dir'] 
+odir = config['bcftools_merge']['output_dir']
 
 # Ensure output directory exists before writing intermediate files
 os.makedirs(odir, exist_ok=True)
 
-# Use batch size of 2 for memory efficiency
-batch_size = 2
+# Largest number of VCFs one 'bcftools merge' may open: a configured ceiling,
+# bounded by the open-file limit (each input holds the VCF and its index open)
+def max_merge_fan_in():
+	fan_in = config['bcftools_merge']['max_fan_in']
+	soft, _hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+	if soft != resource.RLIM_INFINITY:
+		budget = (soft - 64) // 2
+		fan_in = min(fan_in, budget) if fan_in > 0 else budget
+	elif fan_in <= 0:
+		fan_in = 1024
+	return max(2, fan_in)
+
+# Plan a balanced merge tree: take the fewest levels the fan-in ceiling allows
+# (each level rewrites every record once), then the smallest fan-in that still
+# reaches that depth, so jobs at each level are evenly sized
+def plan_merge_tree(n_files, max_fan_in):
+	depth = 1
+	while max_fan_in ** depth < n_files:
+		depth += 1
+	fan_in = max(2, math.ceil(n_files ** (1 / depth)))
+	while fan_in ** depth < n_files:
+		fan_in += 1
+	level_counts = [math.ceil(n_files / fan_in)]
+	while level_counts[-1] > 1:
+		level_counts.append(math.ceil(level_counts[-1] / fan_in))
+	return fan_in, level_counts
+
+batch_size, level_counts = plan_merge_tree(len(bams), max_merge_fan_in())
+final_level = len(level_counts) - 1
 
-# Level 0: merge original samples into batches
+# Level 0 groups of original samples (also used by 06_python_filter.smk)
 subset_vcf = [bams[i:i+batch_size] for i in range(0, len(bams), batch_size)]
-num_level0_files = len(subset_vcf)
-subfiles = [f"subcvf{i}" for i in range(num_level0_files)]
-
-# Creates files with filenames to merge for level 0
-for i in range(len(subset_vcf)):
-	with open(odir + subfiles[i], "w") as file:
-		for line in subset_vcf[i]:
-			file.write(idir + line + '.sort.vcf.gz\n')
-
-# Calculate how many subsequent levels we need
-num_files = num_level0_files
-level_counts = [num_files]
-while num_files > batch_size:
-	num_files = math.ceil(num_files / batch_size)
-	level_counts.append(num_files)
-
-# Function to get subset files for level 0
-def get_subset_files(wildcards):
-	i = int(wildcards.i)
-	if i < len(subset_vcf):
-		return [idir + s + '.sort.vcf.gz' for s in subset_vcf[i]]
+subfiles = [f"subcvf{i}" for i in range(len(subset_vcf))]
+
+# Function to get the input files of merge job i at a given level of a region
+def get_level_inputs(level, i, region=""):
+	if level == 0:
+		files = [idir + s + '.sort.vcf.gz' for s in bams]
+	else:
+		files = [f"{odir}level{level - 1}_merge{region}.{j}.bcf" for j in range(level_counts[level - 1])]
+	return files[i * batch_size:(i + 1) * batch_size]
+
+# Leaves of a shard's tree only read the records of that shard's loci
+# (by POS, so no record lands in two shards)
+def get_region_bed(level, region):
+	if level == 0 and region:
+		return [config['fasta2bed']['dir_stacks'] + f'catalog_sorted_merged{region}.bed']
 	return []
 
-# Function to get input files for higher levels
-def get_level_inputs(wildcards, from_level):
-	i = int(wildcards.i)
-	start_idx = i * batch_size
-	end_idx = min(start_idx + batch_size, level_counts[from_level])
-	return [f"{odir}level{from_level}_merge.{j}.vcf.gz" for j in range(start_idx, end_idx)]
+def get_region_args(level, region):
+	return "".join(f"-R {bed} --regions-overlap 0" for bed in get_region_bed(level, region))
 
-###############################################################################	
-# Level 0: Merge original sample VCFs
-rule bcftools_level0_merge:
+###############################################################################
+# Intermediate levels: lightly compressed BCF, indexed while it is written
+rule bcftools_level_merge:
 	input:
-		files = get_subset_files,
-		names = odir + 'subcvf{i}'
+		files = lambda wildcards: get_level_inputs(int(wildcards.level), int(wildcards.i), wildcards.region),
+		bed = lambda wildcards: get_region_bed(int(wildcards.level), wildcards.region)
 	output:
-		odir + 'level0_merge.{i}.vcf.gz'
+		bcf = odir + 'level{level}_merge{region}.{i}.bcf',
+		idx = odir + 'level{level}_merge{region}.{i}.bcf.csi'
+	wildcard_constraints:
+		level = r"\d+",
+		i = r"\d+"
+	params:
+		regions = lambda wildcards: get_region_args(int(wildcards.level), wildcards.region)
 	threads:
 		config['threads']
+	resources:
+		mem_mb = fan_in_mem_mb(500, 20),
+		disk_mb = disk_mb(1.5)
+	benchmark:
+		config['benchmarks'] + 'bcftools_level_merge.level{level}{region}.{i}.tsv'
 	log:
-		config['bcftools_merge']['logs'] + 'level0_merge.{i}.log'
+		config['bcftools_merge']['logs'] + 'level{level}_merge{region}.{i}.log'
 	shell:
-		"bcftools merge --file-list {input.names} --force-single --threads {threads} -Oz -o {output} 2>{log} && "
-		"bcftools index -c {output} 2>>{log}"
+		"bcftools merge --force-single --threads {threads} {params.regions} {input.files} -Ob1 --write-index -o {output.bcf} 2>{log}"
 
 ###############################################################################
-# Define enough intermediate merge levels to handle up to 7 levels deep
-# (This handles up to 2^7 = 128 initial files with batch_size=2)
-
-if len(level_counts) > 1:
-	rule bcftools_level1_merge:
-		input:
-			lambda wildcards: get_level_inputs(wildcards, 0)
-		output:
-			odir + 'level1_merge.{i}.vcf.gz'
-		threads:
-			config['threads']
-		log:
-			config['bcftools_merge']['logs'] + 'level1_merge.{i}.log'
-		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && "
-			"bcftools index -c {output} 2>>{log}"
-
-if len(level_counts) > 2:
-	rule bcftools_level2_merge:
-		input:
-			lambda wildcards: get_level_inputs(wildcards, 1)
-		output:
-			odir + 'level2_merge.{i}.vcf.gz'
-		threads:
-			config['threads']
-		log:
-			config['bcftools_merge']['logs'] + 'level2_merge.{i}.log'
-		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && "
-			"bcftools index -c {output} 2>>{log}"
-
-if len(level_counts) > 3:
-	rule bcftools_level3_merge:
-		input:
-			lambda wildcards: get_level_inputs(wildcards, 2)
-		output:
-			odir + 'level3_merge.{i}.vcf.gz'
-		threads:
-			config['threads']
-		log:
-			config['bcftools_merge']['logs'] + 'level3_merge.{i}.log'
-		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && "
-			"bcftools index -c {output} 2>>{log}"
-
-if len(level_counts) > 4:
-	rule bcftools_level4_merge:
-		input:
-			lambda wildcards: get_level_inputs(wildcards, 3)
-		output:
-			odir + 'level4_merge.{i}.vcf.gz'
-		threads:
-			config['threads']
-		log:
-			config['bcftools_merge']['logs'] + 'level4_merge.{i}.log'
-		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && "
-			"bcftools index -c {output} 2>>{log}"
-
-if len(level_counts) > 5:
-	rule bcftools_level5_merge:
-		input:
-			lambda wildcards: get_level_inputs(wildcards, 4)
-		output:
-			odir + 'level5_merge.{i}.vcf.gz'
-		threads:
-			config['threads']
-		log:
-			config['bcftools_merge']['logs'] + 'level5_merge.{i}.log'
-		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && "
-			"bcftools index -c {output} 2>>{log}"
-
-if len(level_counts) > 6:
-	rule bcftools_level6_merge:
-		input:
-			lambda wildcards: get_level_inputs(wildcards, 5)
-		output:
-			odir + 'level6_merge.{i}.vcf.gz'
-		threads:
-			config['threads']
-		log:
-			config['bcftools_merge']['logs'] + 'level6_merge.{i}.log'
-		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && "
-			"bcftools index -c {output} 2>>{log}"
-
-###############################################################################
-# Final merge: get the final output from the last level
-final_level = len(level_counts) - 1
-
+# Final merge: the root of the tree
 rule bcftools_final_merge:
 	input:
-		expand(odir + f'level{final_level}_merge.{{i}}.vcf.gz', 
-		       i=range(level_counts[final_level]))
+		files = lambda wildcards: get_level_inputs(final_level, 0, wildcards.region),
+		bed = lambda wildcards: get_region_bed(final_level, wildcards.region)
 	output:
-		config['bcftools_merge']['output_dir'] + 'all_merged.vcf.gz'
+		config['bcftools_merge']['output_dir'] + 'all_merged{region}.vcf.gz'
+	params:
+		regions = lambda wildcards: get_region_args(final_level, wildcards.region)
 	threads:
 		config['threads']
+	resources:
+		mem_mb = fan_in_mem_mb(500, 20),
+		disk_mb = disk_mb(1.5)
+	benchmark:
+		config['benchmarks'] + 'bcftools_final_merge{region}.tsv'
 	log:
-		config['bcftools_merge']['logs'] + 'final_merge.log'
+		config['bcftools_merge']['logs'] + 'final_merge{region}.log'
 	shell:
-		"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && "
-		"bcftools index -c {output} 2>>{log}"
\ No newline at end of file
+		"bcftools merge --force-single --threads {threads} {params.regions} {input.files} -Oz --write-index -o {output} 2>{log}"
@@ -1,48 +1,28 @@
 import os
-import math
 
 ndir = os.path.normpath(config['python_filter']['output_dir'])
 
 # Ensure output directory exists for intermediate files
 os.makedirs(ndir, exist_ok=True)
 
-# Creates files with filenames to merge
+# Creates files with filenames to merge (rewritten only when they change)
 for i in range(len(subfiles)):
-        with open(ndir + '/' + subfiles[i], "w") as file:
-                for line in subset_vcf[i]:
-                        file.write(ndir + '/' + line + '.sort.vcf.gz\n')
-
-with open(ndir + '/merge.txt', "w") as file:
-        for i in range(len(subfiles)):
-                file.write(ndir + f'/merge.{i}.vcf.gz\n')
-
-# Calculate merge levels for filtered VCFs (at top level like 05_bcftools_merge.smk)
-batch_size_filter = 2
-num_filter_files = len(subfiles)
-
-# Calculate number of outputs at each level
-filter_level_counts = []
-current_count = num_filter_files
-while current_count > batch_size_filter:
-	current_count = math.ceil(current_count / batch_size_filter)
-	filter_level_counts.append(current_count)
-filter_level_counts.append(math.ceil(current_count / batch_size_filter))
-
-# Functions for getting inputs
-def get_filter_merge_files(wildcards):
-	"""Get input merge files for level 0 batching"""
-	i = int(wildcards.i)
-	start_idx = i * batch_size_filter
-	end_idx = min(start_idx + batch_size_filter, num_filter_files)
-	return [ndir + f'/merge.{j}.vcf.gz' for j in range(start_idx, end_idx)]
-
-def get_filter_level_inputs(wildcards, from_level):
-	"""Get input files for a given merge level"""
-	i = int(wildcards.i)
-	start_idx = i * batch_size_filter
-	prev_level_count = filter_level_counts[from_level]
-	end_idx = min(start_idx + batch_size_filter, prev_level_count)
-	return [f"{ndir}/filter_level{from_level}_merge.{j}.vcf.gz" for j in range(start_idx, end_idx)]
+        write_if_changed(ndir + '/' + subfiles[i], "".join(ndir + '/' + line + '.sort.vcf.gz\n' for line in subset_vcf[i]))
+
+write_if_changed(ndir + '/merge.txt', "".join(ndir + f'/merge.{i}.vcf.gz\n' for i in range(len(subfiles))))
+
+# Plan the merge tree of the filtered level-0 groups with the same planner as
+# 05_bcftools_merge.smk
+batch_size_filter, filter_level_counts = plan_merge_tree(len(subfiles), max_merge_fan_in())
+final_filter_level = len(filter_level_counts) - 1
+
+# Function to get the input files of filtered merge job i at a given level
+def get_filter_level_inputs(level, i):
+	if level == 0:
+		files = [ndir + f'/merge.{j}.vcf.gz' for j in range(len(subfiles))]
+	else:
+		files = [f"{ndir}/filter_level{level - 1}_merge.{j}.bcf" for j in range(filter_level_counts[level - 1])]
+	return files[i * batch_size_filter:(i + 1) * batch_size_filter]
 
 #######################################################################################
 
@@ -50,19 +30,48 @@ if config['python_filter']['mac'] > 0:
 
 	rule get_singletons:
 		input:
-			config['bcftools_merge']['output_dir']  + 'all_merged.vcf.gz'
+			config['bcftools_merge']['output_dir']  + 'all_merged{region}.vcf.gz'
 		output:
-			ndir + '/all_merged.singletons'
+			ndir + '/all_merged{region}.singletons'
+		resources:
+			mem_mb = mem_mb(500),
+			disk_mb = disk_mb(0.01)
+		benchmark:
+			config['benchmarks'] + 'get_singletons{region}.tsv'
 		log:
-			config['bcftools_merge']['logs'] + 'all_merged.log'
+			config['bcftools_merge']['logs'] + 'all_merged{region}.log'
 		params:
-			file = ndir + '/all_merged',
+			file = ndir + '/all_merged{region}',
 			mac = config['python_filter']['mac']
 		shell:
 			"vcftools --gzvcf {input} --min-alleles 2 --mac {params.mac} "
 			"--max-mac 2 --singletons --out {params.file} 2>>{log}"
 
 
+if config['python_filter']['mac'] > 0 and config['python_filter']['mask_merged']:
+
+	# Mask flagged genotypes in the merged VCF instead of re-filtering and
+	# re-merging every individual VCF
+	rule mask_singletons:
+		input:
+			vcf  = config['bcftools_merge']['output_dir']  + 'all_merged{region}.vcf.gz',
+			sing = ndir + '/all_merged{region}.singletons'
+		output:
+			ndir + '/all_merged_filtered{region}.vcf.gz'
+		threads:
+			config['threads']
+		resources:
+			mem_mb = mem_mb(1000, 0.5),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'mask_singletons{region}.tsv'
+		log:
+			config['python_filter']['logs'] + 'mask_all_merged{region}.log'
+		shell:
+			"python /workspace/sample_analysis/scripts/02_mask_singletons.py -v {input.vcf} -o {output} -s {input.sing} -gz -t {threads} > {log} 2>&1"
+
+elif config['python_filter']['mac'] > 0:
+
 	##################################################################################
 	rule filter_singletons:
 		input:
@@ -70,12 +79,19 @@ if config['python_filter']['mac'] > 0:
 			sing = ndir + "/all_merged.singletons"
 		output:
 			ndir + "/{xyz}.sort.vcf.gz"
+		resources:
+			mem_mb = mem_mb(1000, 0.5),
+			disk_mb = disk_mb(2)
+		benchmark:
+			config['benchmarks'] + 'filter_singletons.{xyz}.tsv'
 		log:
 			config['python_filter']['logs'] + "{xyz}.log"
 		params:
 			new_vcf = ndir  + "/{xyz}.sort.vcf",
+		threads:
+			config['threads']
 		shell:
-			"python /workspace/sample_analysis/scripts/02_filter_singletons.py -v {input.vcf} -o {params.new_vcf} -s {input.sing} -n {wildcards.xyz} -gz > {log} 2>&1"
+			"python /workspace/sample_analysis/scripts/02_filter_singletons.py -v {input.vcf} -o {params.new_vcf} -s {input.sing} -n {wildcards.xyz} -gz -t {threads} > {log} 2>&1"
 	#########################################################################################       	
 	rule bcftools_submerge2:
 		input:
@@ -83,6 +99,11 @@ if config['python_filter']['mac'] > 0:
 			names = ndir + '/subcvf{i}'
 		output:
 			ndir + '/merge.{i}.vcf.gz'
+		resources:
+			mem_mb = fan_in_mem_mb(500, 20),
+			disk_mb = disk_mb(1.5)
+		benchmark:
+			config['benchmarks'] + 'bcftools_submerge2.{i}.tsv'
 		log:
 			config['python_filter']['logs'] + 'merge.{i}.log'
 		shell:
@@ -90,105 +111,101 @@ if config['python_filter']['mac'] > 0:
 
 	###############################################################################
 	# Hierarchical merge rules for filtered VCFs
-	
-	rule bcftools_filter_level0_merge:
+
+	rule bcftools_filter_level_merge:
 		input:
-			get_filter_merge_files
+			lambda wildcards: get_filter_level_inputs(int(wildcards.level), int(wildcards.i))
 		output:
-			ndir + '/filter_level0_merge.{i}.vcf.gz'
+			bcf = ndir + '/filter_level{level}_merge.{i}.bcf',
+			idx = ndir + '/filter_level{level}_merge.{i}.bcf.csi'
+		wildcard_constraints:
+			level = r"\d+",
+			i = r"\d+"
 		threads:
 			config['threads']
+		resources:
+			mem_mb = fan_in_mem_mb(500, 20),
+			disk_mb = disk_mb(1.5)
+		benchmark:
+			config['benchmarks'] + 'bcftools_filter_level_merge.level{level}.{i}.tsv'
 		log:
-			config['python_filter']['logs'] + 'filter_level0_merge.{i}.log'
+			config['python_filter']['logs'] + 'filter_level{level}_merge.{i}.log'
 		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && bcftools index -c {output} 2>>{log}"
-	
-	if len(filter_level_counts) > 1:
-		rule bcftools_filter_level1_merge:
-			input:
-				lambda wildcards: get_filter_level_inputs(wildcards, 0)
-			output:
-				ndir + '/filter_level1_merge.{i}.vcf.gz'
-			threads:
-				config['threads']
-			log:
-				config['python_filter']['logs'] + 'filter_level1_merge.{i}.log'
-			shell:
-				"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && bcftools index -c {output} 2>>{log}"
-	
-	if len(filter_level_counts) > 2:
-		rule bcftools_filter_level2_merge:
-			input:
-				lambda wildcards: get_filter_level_inputs(wildcards, 1)
-			output:
-				ndir + '/filter_level2_merge.{i}.vcf.gz'
-			threads:
-				config['threads']
-			log:
-				config['python_filter']['logs'] + 'filter_level2_merge.{i}.log'
-			shell:
-				"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && bcftools index -c {output} 2>>{log}"
-	
-	if len(filter_level_counts) > 3:
-		rule bcftools_filter_level3_merge:
-			input:
-				lambda wildcards: get_filter_level_inputs(wildcards, 2)
-			output:
-				ndir + '/filter_level3_merge.{i}.vcf.gz'
-			threads:
-				config['threads']
-			log:
-				config['python_filter']['logs'] + 'filter_level3_merge.{i}.log'
-			shell:
-				"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && bcftools index -c {output} 2>>{log}"
-	
-	if len(filter_level_counts) > 4:
-		rule bcftools_filter_level4_merge:
-			input:
-				lambda wildcards: get_filter_level_inputs(wildcards, 3)
-			output:
-				ndir + '/filter_level4_merge.{i}.vcf.gz'
-			threads:
-				config['threads']
-			log:
-				config['python_filter']['logs'] + 'filter_level4_merge.{i}.log'
-			shell:
-				"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && bcftools index -c {output} 2>>{log}"
-	
-	if len(filter_level_counts) > 5:
-		rule bcftools_filter_level5_merge:
-			input:
-				lambda wildcards: get_filter_level_inputs(wildcards, 4)
-			output:
-				ndir + '/filter_level5_merge.{i}.vcf.gz'
-			threads:
-				config['threads']
-			log:
-				config['python_filter']['logs'] + 'filter_level5_merge.{i}.log'
-			shell:
-				"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && bcftools index -c {output} 2>>{log}"
-	
-	final_filter_level = len(filter_level_counts) - 1
+			"bcftools merge --force-single --threads {threads} {input} -Ob1 --write-index -o {output.bcf} 2>{log}"
+
 	rule bcftools_filter_final_merge:
 		input:
-			expand(ndir + f'/filter_level{final_filter_level}_merge.{{i}}.vcf.gz',
-			       i=range(filter_level_counts[final_filter_level]))
+			get_filter_level_inputs(final_filter_level, 0)
 		output:
 			ndir + '/all_merged_filtered.vcf.gz'
 		threads:
 			config['threads']
+		resources:
+			mem_mb = fan_in_mem_mb(500, 20),
+			disk_mb = disk_mb(1.5)
+		benchmark:
+			config['benchmarks'] + 'bcftools_filter_final_merge.tsv'
 		log:
 			config['python_filter']['logs'] + 'filter_final_merge.log'
 		shell:
-			"bcftools merge --force-single --threads {threads} {input} -Oz -o {output} 2>{log} && bcftools index -c {output} 2>>{log}"
+			"bcftools merge --force-single --threads {threads} {input} -Oz --write-index -o {output} 2>{log}"
 
 else:
 	rule skip_merge2:
 		input:
-			config['bcftools_merge']['output_dir']  + 'all_merged.vcf.gz'
+			config['bcftools_merge']['output_dir']  + 'all_merged{region}.vcf.gz'
 		output:
-			ndir + '/all_merged_filtered.vcf.gz'
+			ndir + '/all_merged_filtered{region}.vcf.gz'
+		resources:
+			mem_mb = mem_mb(200),
+			disk_mb = disk_mb(0.01)
+		benchmark:
+			config['benchmarks'] + 'skip_merge2{region}.tsv'
 		log:
-			config['python_filter']['logs'] + 'skip_all_merged.log'
+			config['python_filter']['logs'] + 'skip_all_merged{region}.log'
 		shell:
 			"ln -sf $(pwd)/{input} {output} && bcftools index -c {output} 2>>{log}"
+
+#######################################################################################
+if n_shards > 1:
+
+	# Shards are contiguous and disjoint, so concatenating them in order keeps
+	# the genome-wide VCF sorted
+	rule gather_filtered_vcf:
+		input:
+			expand(ndir + '/all_merged_filtered{region}.vcf.gz', region=regions)
+		output:
+			ndir + '/all_merged_filtered.vcf.gz'
+		threads:
+			config['threads']
+		resources:
+			mem_mb = mem_mb(500),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'gather_filtered_vcf.tsv'
+		log:
+			config['python_filter']['logs'] + 'gather_all_merged.log'
+		shell:
+			"bcftools concat --threads {threads} {input} -Oz --write-index -o {output} 2>{log}"
+
+#######################################################################################
+if config['python_filter']['genotype_store']:
+
+	# Memory-mapped genotype store of the filtered merged VCF: positions,
+	# per-locus site ranges, packed genotypes and depths, read in place of the
+	# VCF by the numpy engine (and by ad-hoc analyses, see genotype_store.py)
+	rule genotype_store:
+		input:
+			vcf = ndir + '/all_merged_filtered{region}.vcf.gz',
+			bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged{region}.bed'
+		output:
+			directory(ndir + '/all_merged_filtered{region}.gt')
+		resources:
+			mem_mb = mem_mb(1000),
+			disk_mb = disk_mb(5)
+		benchmark:
+			config['benchmarks'] + 'genotype_store{region}.tsv'
+		log:
+			config['python_filter']['logs'] + 'genotype_store{region}.log'
+		shell:
+			"python /workspace/sample_analysis/scripts/genotype_store.py -v {input.vcf} -b {input.bed} -o {output} > {log} 2>&1"
@@ -1,28 +1,116 @@
 #######################################################################################
+# piawka or the built-in NumPy engine, which writes the same per-locus columns
+piawka_het_command = {
+	'piawka': "piawka -j {threads} -b {input.bed} -g {input.poi} -v {input.vcf} -H -m",
+	'numpy': "python /workspace/sample_analysis/scripts/03_diversity.py -b {input.bed} -g {input.poi} -v {input.vcf} -H"
+}[config['piawka']['engine']]
+
+# The numpy engine reads the genotype store instead of the VCF when there is one
+piawka_het_genotypes = config['python_filter']['output_dir'] + 'all_merged_filtered{region}' + (
+	'.gt' if config['piawka']['engine'] == 'numpy' and config['python_filter']['genotype_store'] else '.vcf.gz')
+
 rule piawka_het:
 	input:
-		bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged.bed',
-		vcf = config['python_filter']['output_dir'] + 'all_merged_filtered.vcf.gz',
+		bed = config['fasta2bed']['dir_stacks'] + 'catalog_sorted_merged{region}.bed',
+		vcf = piawka_het_genotypes,
 		poi = config['pop_index']
 	output:
-		config['piawka']['output_dir']  + 'piawka_het.tsv'
+		config['piawka']['output_dir']  + 'piawka_het{region}.tsv'
 	params:
 		config['piawka']['script_dir']
 	threads:
 		config['threads']
+	resources:
+		mem_mb = mem_mb(2000),
+		disk_mb = disk_mb(2)
+	benchmark:
+		config['benchmarks'] + 'piawka_het{region}.tsv'
 	log:
-		config['piawka']['log_het']
+		config['piawka']['log_het'].replace('.log', '{region}.log')
 	shell:
-		"piawka -j {threads} -b {input.bed} -g {input.poi} -v {input.vcf} -H -m 2>{log} 1>{output}"
+		piawka_het_command + " 2>{log} 1>{output}"
+
+#######################################################################################
+if n_shards > 1:
+
+	# Per-locus tables of the shards, in genome order
+	rule gather_piawka_het:
+		input:
+			expand(config['piawka']['output_dir']  + 'piawka_het{region}.tsv', region=regions)
+		output:
+			config['piawka']['output_dir']  + 'piawka_het.tsv'
+		resources:
+			mem_mb = mem_mb(200),
+			disk_mb = disk_mb(1)
+		benchmark:
+			config['benchmarks'] + 'gather_piawka_het.tsv'
+		shell:
+			"cat {input} > {output}"
+
+#######################################################################################
+# Columnar copy of the per-locus table read by the aggregation steps
+piawka_ext = {'tsv': '.tsv', 'parquet': '.parquet', 'arrow': '.arrow'}[config['piawka']['format']]
+
+if piawka_ext != '.tsv':
+	rule piawka_convert_het:
+		input:
+			config['piawka']['output_dir']  + 'piawka_het.tsv'
+		output:
+			config['piawka']['output_dir']  + 'piawka_het' + piawka_ext
+		resources:
+			mem_mb = mem_mb(1000, 2),
+			disk_mb = disk_mb(0.5)
+		benchmark:
+			config['benchmarks'] + 'piawka_convert_het.tsv'
+		log:
+			config['piawka_agg']['logs'] + 'convert_het.log'
+		shell:
+			"python /workspace/sample_analysis/scripts/03_piawka_convert.py {input} {output} 2>{log}"
 
 #######################################################################################
 rule piawka_agg_het:
 	input:
-		het = config['piawka']['output_dir']  + 'piawka_het.tsv',
+		het = config['piawka']['output_dir']  + 'piawka_het' + piawka_ext,
 		poi = config['pop_index']
 	output:
 		config['piawka_agg']['output_dir']  + 'genomic_het_table.tsv'
+	params:
+		ci = config['resampling']['ci'],
+		replicates = config['resampling']['replicates'],
+		block_size = config['resampling']['block_size'],
+		level = config['resampling']['level'],
+		seed = config['resampling']['seed']
+	threads:
+		config['threads']
+	resources:
+		mem_mb = mem_mb(1000, 0.5),
+		disk_mb = disk_mb(0.01)
+	benchmark:
+		config['benchmarks'] + 'piawka_agg_het.tsv'
 	log:
 		config['piawka_agg']['logs'] + 'het.log'
 	shell:
-		"python /workspace/sample_analysis/scripts/03_genomic_piawka_het.py {input.het} -p {input.poi} 2>{log}"
+		"python /workspace/sample_analysis/scripts/03_genomic_piawka_het.py {input.het} -p {input.poi} "
+		"--ci {params.ci} --replicates {params.replicates} --block-size {params.block_size} "
+		"--level {params.level} --seed {params.seed} --threads {threads} 2>{log}"
+
+#######################################################################################
+# Per-window sums of the per-locus table, for Manhattan plots and outlier scans
+rule piawka_window_het:
+	input:
+		config['piawka']['output_dir']  + 'piawka_het' + piawka_ext
+	output:
+		config['piawka_agg']['output_dir']  + 'window_het_table.tsv'
+	params:
+		window_size = config['piawka_window']['window_size'],
+		step = config['piawka_window']['step']
+	resources:
+		mem_mb = mem_mb(1000, 1),
+		disk_mb = disk_mb(0.01)
+	benchmark:
+		config['benchmarks'] + 'piawka_window_het.tsv'
+	log:
+		config['piawka_agg']['logs'] + 'window_het.log'
+	shell:
+		"python /workspace/sample_analysis/scripts/03_window_piawka.py {input} {output} "
+		"-w {params.window_size} -s {params.step} 2>{log}"
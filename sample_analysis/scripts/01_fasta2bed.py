@@ -3,54 +3,201 @@
 # Author: Diana Robledo-Ruiz
 # Date: 2024.06.12
 
+import argparse
 import csv
 import gzip
+import heapq
+import os
 import re
-from sys import argv
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+# Header fields of a gstacks catalog record (e.g. '>1 pos=chr1:100+')
+CHR_RE = re.compile(r"pos=(.*?):")
+POS_RE = re.compile(r":(\d+)")
+STRAND_RE = re.compile(r"([+-])$")
 
-def fasta2bed(fasta_file, output_file):
-    table = []
+# Number of intervals kept in memory before a sorted run is spilled to disk
+CHUNK_SIZE = 1_000_000
+
+# Decompressed bytes handed to each worker in parallel mode
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def header2interval(header, seq_length):
+    # Extract 'chro' from the header
+    chro = CHR_RE.search(header).group(1)
+
+    # Extract 'pos' from the header
+    pos = int(POS_RE.search(header).group(1))
+
+    # Extract strand symbol at end of header (e.g., '+', '-')
+    symbol_match = STRAND_RE.search(header)
+    symbol = symbol_match.group(1) if symbol_match else "+"
+
+    # Set 'start' and 'end' based on 'symbol'
+    if symbol == "-":
+        return chro, pos - seq_length, pos + 1
+    return chro, pos - 1, pos + seq_length
+
+
+def iter_intervals(fasta_file):
+    # Lazily parse two-line records (header, sequence) without loading the catalog
     with gzip.open(fasta_file, "rt") as f:
-        lines = f.readlines()
-        for i in range(0, len(lines), 2):
-            header = lines[i].strip()
-            sequence = lines[i + 1].strip()
-
-            # Extract 'chro' from the header
-            chr_match = re.search(r"pos=(.*?):", header)
-            chro = chr_match.group(1)
-
-            # Extract 'pos' from the header
-            pos_match = re.search(r":(\d+)", header)
-            pos = int(pos_match.group(1))
-
-            # Extract strand symbol at end of header (e.g., '+', '-')
-            symbol_match = re.search(r"([+-])$", header)
-            symbol = symbol_match.group(1) if symbol_match else "+"
-
-            # Calculate sequence length
-            seq_length = len(sequence)
-
-            # Set 'start' and 'end' based on 'symbol'
-            if symbol == "+":
-                start = pos - 1
-                end = pos + seq_length
-            elif symbol == "-":
-                start = pos - seq_length
-                end = pos + 1
-
-            # Append to the table
-            table.append((chro, start, end))
-
-    # Export table to a tab-separated text file
+        for header in f:
+            sequence = next(f, "")
+            yield header2interval(header.strip(), len(sequence.strip()))
+
+
+def _parse_chunk(data):
+    # Parse a block of whole records; runs in a worker process
+    lines = data.decode().splitlines()
+    return [
+        header2interval(lines[i].strip(), len(lines[i + 1].strip()) if i + 1 < len(lines) else 0)
+        for i in range(0, len(lines), 2)
+    ]
+
+
+def iter_chunks(fasta_file, chunk_bytes=CHUNK_BYTES):
+    # Split the decompressed catalog into blocks that end on a record boundary
+    rest = b""
+    with gzip.open(fasta_file, "rb") as f:
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                break
+            data = rest + data
+            cut = data.rfind(b"\n>")
+            if cut < 0:
+                rest = data
+                continue
+            yield data[: cut + 1]
+            rest = data[cut + 1 :]
+    if rest:
+        yield rest
+
+
+def iter_intervals_parallel(fasta_file, threads, chunk_bytes=CHUNK_BYTES):
+    # Parse record-aligned chunks across a process pool, yielding intervals in
+    # catalog order; at most two chunks per worker are in flight at once
+    with ProcessPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        for chunk in iter_chunks(fasta_file, chunk_bytes):
+            pending.append(pool.submit(_parse_chunk, chunk))
+            if len(pending) >= 2 * threads:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _intervals(fasta_file, threads):
+    if threads > 1:
+        return iter_intervals_parallel(fasta_file, threads, CHUNK_BYTES)
+    return iter_intervals(fasta_file)
+
+
+def fasta2bed(fasta_file, output_file, threads=1):
+    # Export intervals to a tab-separated text file, in catalog order
     with open(output_file, "w", newline="") as csvfile:
         writer = csv.writer(csvfile, delimiter="\t")
-        for row in table:
-            writer.writerow(row)
+        writer.writerows(_intervals(fasta_file, threads))
+
+
+def write_bed(intervals, output_file):
+    with open(output_file, "w") as f:
+        for chro, start, end in intervals:
+            f.write(f"{chro}\t{start}\t{end}\n")
+
+
+def _write_run(intervals, tmpdir):
+    fd, path = tempfile.mkstemp(suffix=".bed", dir=tmpdir)
+    os.close(fd)
+    write_bed(intervals, path)
+    return path
+
+
+def _read_run(path):
+    with open(path) as f:
+        for line in f:
+            chro, start, end = line.rstrip("\n").split("\t")
+            yield chro, int(start), int(end)
+
+
+def sort_intervals(intervals, chunk_size=CHUNK_SIZE, tmpdir=None):
+    # External sort by (chrom, start): sorted runs of at most 'chunk_size'
+    # intervals are spilled to 'tmpdir' and merged back with a heap
+    runs = []
+    buffer = []
+    for interval in intervals:
+        buffer.append(interval)
+        if len(buffer) >= chunk_size:
+            buffer.sort()
+            runs.append(_write_run(buffer, tmpdir))
+            buffer = []
+    buffer.sort()
+    if not runs:
+        yield from buffer
+        return
+    if buffer:
+        runs.append(_write_run(buffer, tmpdir))
+    yield from heapq.merge(*(_read_run(r) for r in runs))
+
+
+def merge_intervals(sorted_intervals):
+    # Merge overlapping and book-ended intervals, as 'mergeBed' does by default
+    cur = None
+    for chro, start, end in sorted_intervals:
+        if cur is not None and chro == cur[0] and start <= cur[2]:
+            if end > cur[2]:
+                cur[2] = end
+            continue
+        if cur is not None:
+            yield tuple(cur)
+        cur = [chro, start, end]
+    if cur is not None:
+        yield tuple(cur)
+
+
+def fasta2bed_sorted_merged(fasta_file, output_file, chunk_size=CHUNK_SIZE, threads=1):
+    # Equivalent to 'fasta2bed | sortBed | mergeBed' in a single streaming pass
+    tmpdir = os.path.dirname(os.path.abspath(output_file))
+    with tempfile.TemporaryDirectory(dir=tmpdir) as runs_dir:
+        intervals = sort_intervals(_intervals(fasta_file, threads), chunk_size, runs_dir)
+        write_bed(merge_intervals(intervals), output_file)
 
 
 if __name__ == "__main__":
-    fasta_file = argv[1]
-    output_file = argv[2]
-    fasta2bed(fasta_file, output_file)
+    parser = argparse.ArgumentParser(
+        description="A Python script to convert a gstacks catalog into a BED file"
+    )
+    parser.add_argument("fasta", help="gstacks catalog.fa.gz")  # positional argument
+    parser.add_argument("output", help="Output BED file path")  # positional argument
+    parser.add_argument(
+        "-m",
+        "--sort-merge",
+        help="Sort and merge intervals in-process (same output as sortBed | mergeBed)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-c",
+        "--chunk-size",
+        help=f"Intervals held in memory while sorting (default {CHUNK_SIZE})",
+        type=int,
+        default=CHUNK_SIZE,
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        help="Worker processes used to parse the catalog (default 1)",
+        type=int,
+        default=1,
+    )
+    args = vars(parser.parse_args())
+
+    if args["sort_merge"]:
+        fasta2bed_sorted_merged(
+            args["fasta"], args["output"], chunk_size=args["chunk_size"], threads=args["threads"]
+        )
+    else:
+        fasta2bed(args["fasta"], args["output"], threads=args["threads"])
@@ -0,0 +1,128 @@
+import argparse
+import sys
+
+# Loci closer than this are fetched through one index seek: a BAM linear
+# index window spans 16 kb, so nearer loci mostly share compressed blocks
+MAX_GAP = 16384
+
+# Stream the whole BAM once the fetch windows cover this fraction of the genome
+STREAM_FRACTION = 0.5
+
+STRATEGIES = ("auto", "regions", "windows", "targets")
+
+
+def read_bed(bed_file):
+    with open(bed_file) as f:
+        for line in f:
+            if line.strip():
+                chro, start, end = line.split("\t")[:3]
+                yield chro, int(start), int(end)
+
+
+def coalesce(intervals, max_gap=MAX_GAP):
+    # Join sorted intervals separated by at most 'max_gap' bases into windows
+    cur = None
+    for chro, start, end in intervals:
+        if cur is not None and chro == cur[0] and start - cur[2] <= max_gap:
+            cur[2] = max(cur[2], end)
+            continue
+        if cur is not None:
+            yield tuple(cur)
+        cur = [chro, start, end]
+    if cur is not None:
+        yield tuple(cur)
+
+
+def genome_length(fai_file):
+    with open(fai_file) as f:
+        return sum(int(line.split("\t")[1]) for line in f if line.strip())
+
+
+def choose_strategy(n_windows, window_bp, genome_bp, stream_fraction=STREAM_FRACTION):
+    # 'targets' reads the BAM sequentially and drops pileup columns outside
+    # the loci; 'windows' seeks once per coalesced window. Dense catalogs
+    # (most of the genome within reach of a locus) are cheaper to stream.
+    if n_windows == 0 or genome_bp == 0 or window_bp >= stream_fraction * genome_bp:
+        return "targets"
+    return "windows"
+
+
+def plan_access(
+    bed_file,
+    fai_file,
+    windows_file,
+    strategy="auto",
+    max_gap=MAX_GAP,
+    stream_fraction=STREAM_FRACTION,
+):
+    # Write the coalesced fetch windows and return the region options for
+    # 'bcftools mpileup'. Every strategy restricts pileup columns to the
+    # catalog loci, so calls inside the loci are the same as with '-R <bed>'.
+    n_windows = 0
+    window_bp = 0
+    with open(windows_file, "w") as ofile:
+        for chro, start, end in coalesce(read_bed(bed_file), max_gap):
+            ofile.write(f"{chro}\t{start}\t{end}\n")
+            n_windows += 1
+            window_bp += end - start
+    n_loci = sum(1 for _locus in read_bed(bed_file))
+    genome_bp = genome_length(fai_file)
+
+    if strategy == "auto":
+        strategy = choose_strategy(n_windows, window_bp, genome_bp, stream_fraction)
+    print(
+        f"{n_loci} loci, {n_windows} windows covering {window_bp} of {genome_bp} bp: "
+        f"using '{strategy}'",
+        file=sys.stderr,
+    )
+
+    if strategy == "regions":
+        return strategy, f"-R {bed_file}"
+    if strategy == "windows":
+        return strategy, f"-R {windows_file} -T {bed_file}"
+    if strategy == "targets":
+        return strategy, f"-T {bed_file}"
+    raise ValueError(f"Unknown region access strategy '{strategy}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to choose how bcftools mpileup reads the catalog loci"
+    )
+    parser.add_argument("bed", help="Sorted and merged catalog BED file")  # positional argument
+    parser.add_argument("fai", help="Reference genome .fai index")  # positional argument
+    parser.add_argument("windows", help="Output BED of coalesced fetch windows")
+    parser.add_argument("output", help="Output file holding the mpileup region options")
+    parser.add_argument(
+        "-s",
+        "--strategy",
+        help="Region access strategy (default auto)",
+        choices=STRATEGIES,
+        default="auto",
+    )
+    parser.add_argument(
+        "-g",
+        "--max-gap",
+        help=f"Largest gap in bp between loci fetched together (default {MAX_GAP})",
+        type=int,
+        default=MAX_GAP,
+    )
+    parser.add_argument(
+        "-f",
+        "--stream-fraction",
+        help=f"Genome fraction within windows above which the BAM is streamed (default {STREAM_FRACTION})",
+        type=float,
+        default=STREAM_FRACTION,
+    )
+    args = vars(parser.parse_args())
+
+    _strategy, options = plan_access(
+        args["bed"],
+        args["fai"],
+        args["windows"],
+        strategy=args["strategy"],
+        max_gap=args["max_gap"],
+        stream_fraction=args["stream_fraction"],
+    )
+    with open(args["output"], "w") as f:
+        f.write(options + "\n")
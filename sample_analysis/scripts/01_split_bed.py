@@ -0,0 +1,45 @@
+import argparse
+
+
+def _bed_rows(bed_file):
+    with open(bed_file) as f:
+        for line in f:
+            if line.strip():
+                chro, start, end = line.split("\t")[:3]
+                yield line, int(end) - int(start)
+
+
+def split_bed(bed_file, output_files):
+    # Split a sorted BED into contiguous shards holding about the same number
+    # of bases, so per-shard outputs concatenate back in genome order. Every
+    # shard gets at least one interval while there are enough of them, as an
+    # empty regions file is rejected by 'bcftools merge -R'.
+    sizes = [size for _line, size in _bed_rows(bed_file)]
+    target = sum(sizes) / len(output_files)
+    ofiles = [open(path, "w") for path in output_files]
+    try:
+        k = 0
+        n_in_shard = 0
+        done = 0
+        for n, (line, size) in enumerate(_bed_rows(bed_file)):
+            if k < len(ofiles) - 1 and n_in_shard > 0:
+                rows_left = len(sizes) - n
+                if done >= (k + 1) * target or rows_left <= len(ofiles) - 1 - k:
+                    k += 1
+                    n_in_shard = 0
+            ofiles[k].write(line)
+            n_in_shard += 1
+            done += size
+    finally:
+        for ofile in ofiles:
+            ofile.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to split a sorted BED file into balanced region shards"
+    )
+    parser.add_argument("bed", help="Sorted and merged BED file")  # positional argument
+    parser.add_argument("outputs", help="Output shard BED files", nargs="+")
+    args = vars(parser.parse_args())
+    split_bed(args["bed"], args["outputs"])
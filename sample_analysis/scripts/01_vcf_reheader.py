@@ -1,107 +1,90 @@
 import argparse
-import gzip as gz
 import os
+import shutil
 
-import polars as pl
+import bgzf
 
 
 class MyException(Exception):
     pass
 
 
-def _count_lines(ivcf_path, gzip=True):
-    f = gz.open(ivcf_path, "rt") if gzip else open(ivcf_path, "rt")
-    with f:
-        return sum(1 for _ in f)
-
-
 def write_header(
     ivcf_path,
     ovcf_path,
     gzip=True,
 ):
-    nl = _count_lines(ivcf_path, gzip=gzip)
-    ifile = gz.open(ivcf_path, "rt") if gzip else open(ivcf_path, "rt")
-    ofile = open(ovcf_path, "wt")
-    counter = 0
-    with ifile:
-        with ofile:
-            for line in ifile:
-                counter += 1
-                if line.startswith("#CHROM"):
-                    vcf_names = [x for x in line.split("\t")]
-                    ofile.write(line)
-                    if nl == counter:
-                        return []
-                    break
-                else:
-                    ofile.write(line)
-    return [x.split("\n")[0] for x in vcf_names]
+    # Copy the header lines; returns the #CHROM names, or [] when no record
+    # follows them
+    meta, names, records = bgzf.read_vcf(ivcf_path, gzip=gzip)
+    with records, open(ovcf_path, "wt") as ofile:
+        ofile.write(meta + "\t".join(names) + "\n")
+        return names if next(records, b"") else []
 
 
 def get_header(
     ivcf_path,
     gzip=True,
 ):
-    ifile = gz.open(ivcf_path, "rt") if gzip else open(ivcf_path, "rt")
-    counter = 0
-    with ifile:
-        for line in ifile:
-            counter += 1
-            if line.startswith("#CHROM"):
-                vcf_names = [x for x in line.split("\t")]
-                break
-    return [x.split("\n")[0] for x in vcf_names]
-
-
-def reheader_vcf(vcf_path, out_vcf_path, gzip=True):
-    # Read header names
-    names = get_header(
-        vcf_path,
-        gzip=gzip,
-    )
+    names, records = bgzf.read_vcf(ivcf_path, gzip=gzip)[1:]
+    records.close()
+    return names
+
+
+def reheader_vcf(vcf_path, out_vcf_path, gzip=True, bgzip=False, threads=1):
+    # One pass over the input: the header is scanned once and the records are
+    # copied through in chunks, decompressed on 'threads' threads if BGZF
+    meta, names, records = bgzf.read_vcf(vcf_path, threads=threads, gzip=gzip)
     inds = names[names.index("FORMAT") + 1 :]
     if any(".bam" not in s for s in inds):
+        records.close()
         return False
     # Sanitize sample names
     names = [x.replace(".bam", "").split("/")[-1] for x in names]
+    header = meta + "\t".join(names) + "\n"
 
-    # Write meta header lines and sanitized #CHROM line
-    ifile = gz.open(vcf_path, "rt") if gzip else open(vcf_path, "rt")
-    with ifile:
-        with open(out_vcf_path, "wt") as ofile:
-            for line in ifile:
-                if line.startswith("#CHROM"):
-                    ofile.write("\t".join(names))
-                    if not names[-1].endswith("\n"):
-                        ofile.write("\n")
-                    break
-                else:
-                    ofile.write(line)
-
-    read_kwargs = dict(
-        comment_prefix="#",
-        separator="\t",
-        has_header=False,
-        ignore_errors=True,
-    )
-    try:
-        if gzip:
-            with gz.open(vcf_path, "rt") as f:
-                df = pl.read_csv(f, new_columns=names, **read_kwargs)
-        else:
-            df = pl.read_csv(vcf_path, new_columns=names, **read_kwargs)
-    except TypeError:
-        # Fallback for older Polars versions
-        if gzip:
-            with gz.open(vcf_path, "rt") as f:
-                df = pl.read_csv(f, **read_kwargs)
-        else:
-            df = pl.read_csv(vcf_path, **read_kwargs)
-        df = df.rename(dict(zip(df.columns, names)))
-
-    with open(out_vcf_path, "at") as ofile:
-        df.write_csv(ofile, separator="\t", include_header=False)
+    if bgzip:
+        with bgzf.VcfWriter(out_vcf_path, threads=threads, index=False) as ofile:
+            ofile.write_header(header)
+            for chunk in records:
+                ofile.write_records(chunk)
+    else:
+        with open(out_vcf_path, "wb") as ofile:
+            ofile.write(header.encode())
+            for chunk in records:
+                ofile.write(chunk)
+    return True
+
+
+def reheader_vcf_bgzf(vcf_path, out_vcf_path):
+    # Only the BGZF blocks holding the header are decompressed and rewritten;
+    # the blocks after them are copied to the output byte for byte
+    with open(vcf_path, "rb") as ifile:
+        data = b""
+        chrom_start = chrom_end = -1
+        while chrom_end < 0:
+            raw = bgzf.read_block(ifile)
+            if not raw:
+                raise MyException(f"No #CHROM line found in {vcf_path}")
+            data += bgzf.decompress_block(raw)
+            if data.startswith(b"#CHROM"):
+                chrom_start = 0
+            elif b"\n#CHROM" in data:
+                chrom_start = data.index(b"\n#CHROM") + 1
+            if chrom_start >= 0:
+                chrom_end = data.find(b"\n", chrom_start)
+
+        names = data[chrom_start:chrom_end].decode().rstrip("\r").split("\t")
+        inds = names[names.index("FORMAT") + 1 :]
+        if any(".bam" not in s for s in inds):
+            return False
+        # Sanitize sample names
+        names = [x.replace(".bam", "").split("/")[-1] for x in names]
+
+        with open(out_vcf_path, "wb") as ofile:
+            chrom_line = "\t".join(names).encode()
+            ofile.write(bgzf.compress(data[:chrom_start] + chrom_line + data[chrom_end:]))
+            shutil.copyfileobj(ifile, ofile)
     return True
 
 
@@ -121,13 +104,34 @@ if __name__ == "__main__":
         help="Boolean to indicate whether vcf file is gunzip compressed or not (default False)",
         action="store_true",
     )
+    parser.add_argument(
+        "-s",
+        "--splice",
+        help="Rewrite only the header blocks of a BGZF input and copy the rest unchanged",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        help="Threads used for BGZF decompression and compression",
+        type=int,
+        default=1,
+    )
 
     args = vars(parser.parse_args())
 
     # Call the function
-    if reheader_vcf(args["vcf"], args["output"], gzip=args["gzip"]):
-        os.system(f"bgzip -f {args['output']}")
+    if args["gzip"] and args["splice"] and bgzf.is_bgzf(args["vcf"]):
+        changed = reheader_vcf_bgzf(args["vcf"], args["output"] + ".gz")
     else:
+        changed = reheader_vcf(
+            args["vcf"],
+            args["output"] + ".gz",
+            gzip=args["gzip"],
+            bgzip=True,
+            threads=args["threads"],
+        )
+    if not changed:
         # If reheader is not needed creates symbolik link to previous vcf
         if not os.path.islink(args["output"] + ".gz"):
             os.symlink(os.path.abspath(args["vcf"]), args["output"] + ".gz")
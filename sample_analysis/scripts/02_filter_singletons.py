@@ -1,7 +1,7 @@
 import argparse
-import gzip as gz
 import os
 
+import bgzf
 import polars as pl
 
 
@@ -9,108 +9,66 @@ class MyException(Exception):
     pass
 
 
-def _count_lines(ivcf_path, gzip=True):
-    f = gz.open(ivcf_path, "rt") if gzip else open(ivcf_path, "rt")
-    with f:
-        return sum(1 for _ in f)
-
-
-def write_header(ivcf_path, ovcf_path, gzip=True):
-    nl = _count_lines(ivcf_path, gzip=gzip)
-    ifile = gz.open(ivcf_path, "rt") if gzip else open(ivcf_path, "rt")
-    ofile = open(ovcf_path, "wt")
-    counter = 0
-    with ifile:
-        with ofile:
-            for line in ifile:
-                counter += 1
-                if line.startswith("#CHROM"):
-                    vcf_names = [x for x in line.split("\t")]
-                    ofile.write(line)
-                    if nl == counter:
-                        return []
-                    break
-                else:
-                    ofile.write(line)
-    return [x.split("\n")[0] for x in vcf_names]
-
-
-def get_header(ivcf_path, gzip=True):
-    ifile = gz.open(ivcf_path, "rt") if gzip else open(ivcf_path, "rt")
-    with ifile:
-        for line in ifile:
-            if line.startswith("#CHROM"):
-                vcf_names = [x for x in line.split("\t")]
-                break
-    return [x.split("\n")[0] for x in vcf_names]
-
-
-def filter_singletons_vcf(vcf_path, out_vcf_path, singletons_path, indv_name, gzip=True):
-    # Read positions to remove for the given individual
-    dfs = pl.read_csv(singletons_path, separator="\t")
-    positions = (
+def read_singleton_positions(singletons_path, indv_name):
+    # Hashable (CHROM, POS) keys of the positions to remove for one individual,
+    # kept as strings so they match VCF fields without re-formatting them
+    dfs = pl.read_csv(singletons_path, separator="\t", infer_schema_length=0)
+    return (
         dfs.filter(pl.col("INDV") == indv_name)
         .select([pl.col("CHROM").alias("#CHROM"), pl.col("POS")])
-        .to_dicts()
+        .unique()
     )
 
+
+def filter_singletons_vcf(
+    vcf_path,
+    out_vcf_path,
+    singletons_path,
+    indv_name,
+    gzip=True,
+    bgzip=False,
+    threads=1,
+    chunk_size=bgzf.CHUNK_SIZE,
+):
+    # Read positions to remove for the given individual
+    positions = read_singleton_positions(singletons_path, indv_name)
+
     # If there are no positions to remove, do nothing
-    if len(positions) == 0:
+    if positions.height == 0:
         return False
 
-    # Read header names and write sanitized header block
-    names = get_header(vcf_path, gzip=gzip)
-    names = [x.replace(".bam", "").split("/")[-1] for x in names]
-    ifile = gz.open(vcf_path, "rt") if gzip else open(vcf_path, "rt")
-    with ifile:
-        with open(out_vcf_path, "wt") as ofile:
-            for line in ifile:
-                if line.startswith("#CHROM"):
-                    ofile.write("\t".join(names))
-                    if not names[-1].endswith("\n"):
-                        ofile.write("\n")
-                    break
-                else:
-                    ofile.write(line)
-
-    # Read into a DataFrame (avoid LazyFrame.rename segfaults)
-    read_kwargs = dict(
-        comment_prefix="#",
-        separator="\t",
-        has_header=False,
-        ignore_errors=True,
+    # Read once: header scanned a single time, records in chunks of whole
+    # lines decompressed on 'threads' threads if BGZF
+    meta, names, records = bgzf.read_vcf(
+        vcf_path, threads=threads, chunk_size=chunk_size, gzip=gzip
     )
-    try:
-        if gzip:
-            with gz.open(vcf_path, "rt") as f:
-                df = pl.read_csv(f, new_columns=names, **read_kwargs)
-        else:
-            df = pl.read_csv(vcf_path, new_columns=names, **read_kwargs)
-    except TypeError:
-        # Fallback for older Polars versions
-        try:
-            if gzip:
-                with gz.open(vcf_path, "rt") as f:
-                    df = pl.read_csv(f, columns=names, **read_kwargs)  # type: ignore[arg-type]
-            else:
-                df = pl.read_csv(vcf_path, columns=names, **read_kwargs)  # type: ignore[arg-type]
-        except TypeError:
-            if gzip:
-                with gz.open(vcf_path, "rt") as f:
-                    df = pl.read_csv(f, **read_kwargs)
-            else:
-                df = pl.read_csv(vcf_path, **read_kwargs)
-            if len(df.columns) != len(names):
-                raise MyException(
-                    f"Column count mismatch between data ({len(df.columns)}) and header ({len(names)})"
-                )
-            df = df.rename(dict(zip(df.columns, names)))
-
-    # Drop rows matching singleton positions for the given individual
-    df = df.filter(~(pl.struct(["#CHROM", "POS"]).is_in(positions)))
+    # Sanitized header names
+    names = [x.replace(".bam", "").split("/")[-1] for x in names]
+    header = meta + "\t".join(names) + "\n"
 
-    with open(out_vcf_path, "at") as ofile:
-        df.write_csv(ofile, separator="\t", include_header=False)
+    if bgzip:
+        # Compress and index in the same pass
+        ofile = bgzf.VcfWriter(out_vcf_path, threads=threads)
+        write_header, write_records = ofile.write_header, ofile.write_records
+    else:
+        ofile = open(out_vcf_path, "wt")
+        write_header = write_records = ofile.write
+    with ofile, records:
+        write_header(header)
+        # Anti-join each chunk of records (parsed from the decompressed bytes,
+        # as untouched strings) against the singleton positions, so memory
+        # does not grow with the VCF
+        for chunk in records:
+            df = pl.read_csv(
+                chunk,
+                separator="\t",
+                has_header=False,
+                new_columns=names,
+                infer_schema_length=0,
+                quote_char=None,
+            )
+            df = df.join(positions, on=["#CHROM", "POS"], how="anti", maintain_order="left")
+            write_records(df.write_csv(separator="\t", include_header=False, quote_style="never"))
     return True
 
 
@@ -134,16 +92,34 @@ if __name__ == "__main__":
         help="Boolean to indicate whether vcf file is gunzip compressed or not (default False)",
         action="store_true",
     )
+    parser.add_argument(
+        "-t",
+        "--threads",
+        help="Threads used for BGZF decompression and compression",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "-b",
+        "--chunk-size",
+        help=f"Decompressed VCF bytes filtered at a time (default {bgzf.CHUNK_SIZE})",
+        type=int,
+        default=bgzf.CHUNK_SIZE,
+    )
 
     args = vars(parser.parse_args())
 
-    # Call the function
-    if filter_singletons_vcf(
-        args["vcf"], args["output"], args["singletons"], args["name"], gzip=args["gzip"]
+    # Call the function; writes a BGZF VCF and its CSI index directly
+    if not filter_singletons_vcf(
+        args["vcf"],
+        args["output"] + ".gz",
+        args["singletons"],
+        args["name"],
+        gzip=args["gzip"],
+        bgzip=True,
+        threads=args["threads"],
+        chunk_size=args["chunk_size"],
     ):
-        os.system(f"bgzip -f {args['output']}")
-        os.system(f"bcftools index -c {args['output'] + '.gz'}")
-    else:
         # If there are no position to remove, create symbolik link to previous vcf
         if not os.path.islink(args["output"] + ".gz"):
             os.symlink(os.path.abspath(args["vcf"]), args["output"] + ".gz")
@@ -0,0 +1,98 @@
+import argparse
+import gzip as gz
+
+import bgzf
+import polars as pl
+
+
+class MyException(Exception):
+    pass
+
+
+def read_flagged_genotypes(singletons_path):
+    # Map each flagged (CHROM, POS) to the individuals carrying the private allele
+    dfs = pl.read_csv(singletons_path, separator="\t", infer_schema_length=0)
+    flagged = {}
+    for chrom, pos, indvs in (
+        dfs.group_by(["CHROM", "POS"]).agg(pl.col("INDV").unique()).iter_rows()
+    ):
+        flagged[(chrom, pos)] = indvs
+    return flagged
+
+
+def missing_genotype(sample, n_format):
+    # Missing call with the ploidy of the original GT, e.g. './.:.:.'
+    gt = sample.split(":", 1)[0]
+    sep = "|" if "|" in gt else "/"
+    ploidy = gt.count("/") + gt.count("|") + 1
+    return ":".join([sep.join(["."] * ploidy)] + ["."] * (n_format - 1))
+
+
+def mask_singletons_vcf(vcf_path, out_vcf_path, singletons_path, gzip=True, threads=1):
+    # Set flagged private singleton/doubleton genotypes to missing in one pass
+    # over the merged VCF. Records left without any called genotype are
+    # dropped, as re-merging the per-individual filtered VCFs would do.
+    flagged = read_flagged_genotypes(singletons_path)
+
+    ifile = gz.open(vcf_path, "rt") if gzip else open(vcf_path, "rt")
+    with ifile, bgzf.VcfWriter(out_vcf_path, threads=threads) as ofile:
+        header = []
+        for line in ifile:
+            header.append(line)
+            if line.startswith("#CHROM"):
+                names = line.rstrip("\n").split("\t")
+                break
+        else:
+            raise MyException(f"No #CHROM line found in {vcf_path}")
+        ofile.write_header("".join(header))
+        columns = {name: i for i, name in enumerate(names)}
+        unknown = {i for indvs in flagged.values() for i in indvs} - set(names[9:])
+        if unknown:
+            raise MyException(f"Individuals not found in {vcf_path}: {sorted(unknown)}")
+
+        batch = []
+        for line in ifile:
+            # Only records holding a flagged genotype are split and rewritten
+            indvs = flagged.get(tuple(line.split("\t", 2)[:2]))
+            if indvs is not None:
+                fields = line.rstrip("\n").split("\t")
+                n_format = fields[8].count(":") + 1
+                for indv in indvs:
+                    i = columns[indv]
+                    fields[i] = missing_genotype(fields[i], n_format)
+                if all(f.split(":", 1)[0].strip("./|") == "" for f in fields[9:]):
+                    continue
+                line = "\t".join(fields) + "\n"
+            batch.append(line)
+            if len(batch) >= 10_000:
+                ofile.write_records("".join(batch))
+                batch = []
+        ofile.write_records("".join(batch))
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to mask private single/doubletons in a merged vcf file"
+    )
+    parser.add_argument("-v", "--vcf", help="Merged VCF file", required=True)
+    parser.add_argument(
+        "-o", "--output", help="Output file path (BGZF, indexed)", required=True
+    )  # output file path
+    parser.add_argument(
+        "-s", "--singletons", help="Singletons file path", required=True
+    )  # singletons from vcftools
+    parser.add_argument(
+        "-gz",
+        "--gzip",
+        help="Boolean to indicate whether vcf file is gunzip compressed or not (default False)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-t", "--threads", help="Threads used for BGZF compression", type=int, default=1
+    )
+    args = vars(parser.parse_args())
+
+    mask_singletons_vcf(
+        args["vcf"], args["output"], args["singletons"], gzip=args["gzip"], threads=args["threads"]
+    )
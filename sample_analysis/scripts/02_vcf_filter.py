@@ -0,0 +1,96 @@
+import argparse
+import re
+import sys
+
+# Alleles of a GT field, e.g. '0/1' or '1|.'
+ALLELE_RE = re.compile(r"[^/|]+")
+
+
+class MyException(Exception):
+    pass
+
+
+def sample_name(name):
+    # 00-reads/A0119.bam -> A0119, as 01_vcf_reheader.py renames samples
+    return name.replace(".bam", "").split("/")[-1]
+
+
+def is_indel(ref, alt):
+    # vcftools --remove-indels: any allele that changes the length of REF
+    return any(
+        len(a) != len(ref) for a in alt.split(",") if a not in (".", "*") and not a.startswith("<")
+    )
+
+
+def filter_record(fields, min_dp=0, min_gq=0, max_missing=None):
+    # Set genotypes below min_dp/min_gq to missing in place (as vcftools
+    # --minDP/--minGQ do; a '.' value fails, a FORMAT without the key passes)
+    # and tell whether the site keeps at most max_missing missing alleles
+    keys = fields[8].split(":")
+    checks = [(keys.index(k), m) for k, m in (("DP", min_dp), ("GQ", min_gq)) if m and k in keys]
+    missing = 0
+    for k in range(9, len(fields)):
+        values = fields[k].split(":")
+        for i, minimum in checks:
+            value = values[i] if i < len(values) else "."
+            if value == "." or float(value) < minimum:
+                values[0] = ALLELE_RE.sub(".", values[0])
+                fields[k] = ":".join(values)
+                break
+        missing += sum(1 for a in ALLELE_RE.findall(values[0]) if a == ".")
+    return max_missing is None or missing <= max_missing
+
+
+def filter_vcf(ifile, ofile, min_dp=0, min_gq=0, max_missing=None, remove_indels=False):
+    # Stream a VCF from 'ifile' to 'ofile' (text streams): samples renamed from
+    # their BAM paths, then the vcftools --minDP, --minGQ, --max-missing-count
+    # and --remove-indels filters applied record by record. Returns the number
+    # of records kept.
+    for line in ifile:
+        if line.startswith("#CHROM"):
+            names = line.rstrip("\n").split("\t")
+            ofile.write("\t".join(names[:9] + [sample_name(x) for x in names[9:]]) + "\n")
+            break
+        ofile.write(line)
+    else:
+        raise MyException("No #CHROM line found in the input VCF")
+
+    kept = 0
+    for line in ifile:
+        fields = line.rstrip("\n").split("\t")
+        if remove_indels and is_indel(fields[3], fields[4]):
+            continue
+        if len(fields) > 9 and not filter_record(fields, min_dp, min_gq, max_missing):
+            continue
+        ofile.write("\t".join(fields) + "\n")
+        kept += 1
+    return kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to rename and filter genotypes of a vcf stream (stdin to stdout)"
+    )
+    parser.add_argument(
+        "-d", "--min-dp", help="Genotypes with a lower DP are set missing", type=float, default=0
+    )
+    parser.add_argument(
+        "-q", "--min-gq", help="Genotypes with a lower GQ are set missing", type=float, default=0
+    )
+    parser.add_argument(
+        "-m", "--max-missing", help="Most missing alleles kept per site (default any)", type=int
+    )
+    parser.add_argument(
+        "-i", "--remove-indels", help="Drop sites with an indel allele", action="store_true"
+    )
+    args = vars(parser.parse_args())
+
+    kept = filter_vcf(
+        sys.stdin,
+        sys.stdout,
+        min_dp=args["min_dp"],
+        min_gq=args["min_gq"],
+        max_missing=args["max_missing"],
+        remove_indels=args["remove_indels"],
+    )
+    print(f"Kept {kept} records", file=sys.stderr)
@@ -0,0 +1,303 @@
+import argparse
+import gzip as gz
+import os
+import sys
+from contextlib import nullcontext
+from itertools import combinations, islice
+
+import numpy as np
+import polars as pl
+from genotype_store import (
+    BATCH_SIZE,
+    genotype_array,
+    is_snp,
+    is_store,
+    open_store,
+    read_loci,
+    read_vcf_batch,
+    read_vcf_names,
+    site_loci,
+    unpack,
+)
+
+
+def read_groups(groups_file):
+    # Map each sample to its group, keeping the order of the groups file
+    groups = {}
+    with open(groups_file) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) > 1:
+                groups[parts[0]] = parts[1]
+    return groups
+
+
+def site_sums(genotypes, membership, pairs):
+    # Per-site numerators/denominators from allele counts of each group:
+    # within-group differences sum(i<j) n_i*n_j = (n^2 - sum n_a^2) / 2 out of
+    # n(n-1)/2 comparisons, and between-group differences n1*n2 - sum n1_a*n2_a
+    # out of n1*n2 comparisons (the pixy estimators, invariant sites included)
+    n_alleles = int(genotypes.max(initial=-1)) + 1
+    counts = np.stack(
+        [(genotypes == a).sum(axis=2) @ membership for a in range(max(n_alleles, 1))], axis=2
+    )
+    n = counts.sum(axis=2)
+    called = (genotypes[:, :, 0] >= 0) @ membership
+    w_comps = n * (n - 1) / 2
+    sums = {
+        "w_diffs": (n**2 - (counts**2).sum(axis=2)) / 2,
+        "w_comps": w_comps,
+        "w_used": (w_comps > 0).astype(float),
+        "called": called,
+        "missing": membership.sum(axis=0) - called,
+    }
+    if pairs:
+        i, j = np.array(pairs).T
+        b_comps = n[:, i] * n[:, j]
+        sums["b_diffs"] = b_comps - (counts[:, i, :] * counts[:, j, :]).sum(axis=2)
+        sums["b_comps"] = b_comps
+        sums["b_used"] = (b_comps > 0).astype(float)
+    return sums
+
+
+def locus_sums(loci, sums):
+    # Add up the site sums of each locus (sites of a locus are contiguous)
+    bounds = np.flatnonzero(np.r_[True, loci[1:] != loci[:-1]])
+    out = {k: np.add.reduceat(v, bounds, axis=0) for k, v in sums.items()}
+    out["nSites"] = np.diff(np.r_[bounds, len(loci)])
+    return loci[bounds], out
+
+
+def _ratio(num, den):
+    return np.divide(num, den, out=np.zeros_like(num, dtype=float), where=den != 0)
+
+
+def format_loci(names, loci, sums, groups, pairs, het=False, fst=False):
+    # piawka-compatible rows: locus, nSites, pop1, pop2, nUsed, metric, value,
+    # numerator, denominator[, nGenotypes, nMissing]; groups without usable
+    # sites at a locus are left out
+    n_loci, n_groups = sums["w_diffs"].shape
+    locus = np.repeat(np.array(names, dtype=object)[loci], n_groups)
+    frames = [
+        pl.DataFrame(
+            {
+                "order": np.repeat(np.arange(n_loci), n_groups),
+                "locus": locus,
+                "nSites": np.repeat(sums["nSites"], n_groups),
+                "pop1": np.tile(np.array(groups, dtype=object), n_loci),
+                "pop2": ".",
+                "nUsed": sums["w_used"].ravel(),
+                "metric": "het" if het else "pi",
+                "value": _ratio(sums["w_diffs"], sums["w_comps"]).ravel(),
+                "numerator": sums["w_diffs"].ravel(),
+                "denominator": sums["w_comps"].ravel(),
+                "nGenotypes": sums["called"].ravel(),
+                "nMissing": sums["missing"].ravel(),
+            },
+            strict=False,
+        )
+    ]
+    if pairs:
+        n_pairs = len(pairs)
+        i, j = np.array(pairs).T
+        pair = {
+            "order": np.repeat(np.arange(n_loci), n_pairs),
+            "locus": np.repeat(np.array(names, dtype=object)[loci], n_pairs),
+            "nSites": np.repeat(sums["nSites"], n_pairs),
+            "pop1": np.tile(np.array(groups, dtype=object)[i], n_loci),
+            "pop2": np.tile(np.array(groups, dtype=object)[j], n_loci),
+            "nUsed": sums["b_used"].ravel(),
+            "nGenotypes": (sums["called"][:, i] + sums["called"][:, j]).ravel(),
+            "nMissing": (sums["missing"][:, i] + sums["missing"][:, j]).ravel(),
+        }
+        dxy = _ratio(sums["b_diffs"], sums["b_comps"])
+        frames.append(
+            pl.DataFrame(
+                {
+                    **pair,
+                    "metric": "Dxy",
+                    "value": dxy.ravel(),
+                    "numerator": sums["b_diffs"].ravel(),
+                    "denominator": sums["b_comps"].ravel(),
+                },
+                strict=False,
+            )
+        )
+        if fst:
+            # Hudson's Fst = 1 - mean within-group pi / dxy
+            pi = _ratio(sums["w_diffs"], sums["w_comps"])
+            within = (pi[:, i] + pi[:, j]) / 2
+            frames.append(
+                pl.DataFrame(
+                    {
+                        **pair,
+                        "metric": "Fst_HUD",
+                        "value": (1 - _ratio(within, dxy)).ravel(),
+                        "numerator": (dxy - within).ravel(),
+                        "denominator": dxy.ravel(),
+                    },
+                    strict=False,
+                )
+            )
+    columns = [
+        "locus",
+        "nSites",
+        "pop1",
+        "pop2",
+        "nUsed",
+        "metric",
+        "value",
+        "numerator",
+        "denominator",
+    ]
+    if not het:
+        columns += ["nGenotypes", "nMissing"]
+    return (
+        pl.concat(frames, how="diagonal_relaxed")
+        .filter(pl.col("denominator") > 0)
+        .sort("order", maintain_order=True)
+        .with_columns(pl.col(["nSites", "nUsed", "nGenotypes", "nMissing"]).cast(pl.Int64))
+        .select(columns)
+    )
+
+
+def vcf_chunks(ifile, vcf_names, samples, index, batch_size=BATCH_SIZE):
+    # Global locus index and sites x samples x 2 allele indices of the SNP and
+    # invariant sites inside catalog loci, 'batch_size' VCF records at a time
+    while True:
+        lines = list(islice(ifile, batch_size))
+        if not lines:
+            break
+        df = read_vcf_batch(lines, vcf_names)
+        df = df.filter(is_snp(df))
+        if df.height == 0:
+            continue
+        loci = site_loci(index, df)
+        keep = loci >= 0
+        if keep.any():
+            yield loci[keep], genotype_array(df.filter(pl.Series(keep)), samples)
+
+
+def store_chunks(arrays, columns, batch_size=BATCH_SIZE):
+    # The same chunks read from a genotype store (genotype_store.py)
+    for start in range(0, len(arrays["locus"]), batch_size):
+        part = slice(start, start + batch_size)
+        keep = np.flatnonzero(arrays["snp"][part] & (arrays["locus"][part] >= 0))
+        if len(keep):
+            packed = arrays["gt"][part][keep][:, columns]
+            yield arrays["locus"][part][keep].astype(np.int64), unpack(packed)
+
+
+def diversity(
+    vcf_path,
+    bed_file,
+    output_file=None,
+    groups_file=None,
+    het=False,
+    fst=False,
+    gzip=True,
+    batch_size=BATCH_SIZE,
+):
+    # Per-locus het (each sample on its own) or pi/dxy/Fst (groups file) from
+    # the merged VCF, or from its genotype store (a directory, whose copy of
+    # the BED is used), written in the column layout of piawka's output (to
+    # stdout without 'output_file', as piawka does)
+    store = is_store(vcf_path)
+    if store:
+        meta, arrays = open_store(vcf_path)
+        vcf_samples = meta["samples"]
+        bed_file = os.path.join(vcf_path, "loci.bed")
+        ifile = nullcontext()
+    else:
+        ifile = gz.open(vcf_path, "rt") if gzip else open(vcf_path, "rt")
+        vcf_names = read_vcf_names(ifile, vcf_path)
+        vcf_samples = vcf_names[9:]
+    index, names = read_loci(bed_file)
+    out = open(output_file, "w") if output_file else nullcontext(sys.stdout)
+    with ifile, out as ofile:
+        # samples x groups 0/1 membership matrix; with het every sample (of the
+        # groups file, if given) is its own group
+        sample_groups = read_groups(groups_file) if groups_file else None
+        samples = [s for s in vcf_samples if sample_groups is None or s in sample_groups]
+        if het:
+            groups = samples
+            membership = np.eye(len(samples))
+            pairs = []
+        else:
+            groups = list(dict.fromkeys(sample_groups[s] for s in samples))
+            membership = np.array(
+                [[float(sample_groups[s] == g) for g in groups] for s in samples]
+            ).reshape(len(samples), len(groups))
+            pairs = list(combinations(range(len(groups)), 2))
+
+        if store:
+            columns = [vcf_samples.index(s) for s in samples]
+            chunks = store_chunks(arrays, columns, batch_size)
+        else:
+            chunks = vcf_chunks(ifile, vcf_names, samples, index, batch_size)
+
+        def emit(loci, sums):
+            table = format_loci(names, loci, sums, groups, pairs, het=het, fst=fst)
+            ofile.write(table.write_csv(separator="\t", include_header=False, quote_style="never"))
+
+        # Sums of the last locus of a chunk wait for the next chunk, which may
+        # continue it
+        pending = None
+        for loci, genotypes in chunks:
+            ids, sums = locus_sums(loci, site_sums(genotypes, membership, pairs))
+            if pending is not None:
+                if ids[0] == pending[0][0]:
+                    for k in sums:
+                        sums[k][0] += pending[1][k][0]
+                else:
+                    emit(*pending)
+            pending = (ids[-1:], {k: v[-1:] for k, v in sums.items()})
+            if len(ids) > 1:
+                emit(ids[:-1], {k: v[:-1] for k, v in sums.items()})
+        if pending is not None:
+            emit(*pending)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to compute per-locus het, pi, dxy and Fst from a merged vcf file"
+    )
+    parser.add_argument(
+        "-v",
+        "--vcf",
+        help="Merged VCF file (bgzip compressed), or its genotype store directory",
+        required=True,
+    )
+    parser.add_argument(
+        "-b",
+        "--bed",
+        help="Sorted and merged catalog BED file (a store has its own)",
+        required=True,
+    )
+    parser.add_argument("-o", "--output", help="Output per-locus table (default stdout)")
+    parser.add_argument(
+        "-g", "--groups", help="Sample to population file (with -H, only restricts the samples)"
+    )
+    parser.add_argument(
+        "-H", "--het", help="Per-individual heterozygosity instead of pi/dxy", action="store_true"
+    )
+    parser.add_argument("-f", "--fst", help="Also compute Hudson's Fst", action="store_true")
+    parser.add_argument(
+        "--batch-size",
+        help=f"VCF records parsed at a time (default {BATCH_SIZE})",
+        type=int,
+        default=BATCH_SIZE,
+    )
+    args = vars(parser.parse_args())
+    if not args["het"] and not args["groups"]:
+        parser.error("-g/--groups is required without -H/--het")
+
+    diversity(
+        args["vcf"],
+        args["bed"],
+        args["output"],
+        groups_file=args["groups"],
+        het=args["het"],
+        fst=args["fst"],
+        batch_size=args["batch_size"],
+    )
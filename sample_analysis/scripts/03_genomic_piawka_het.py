@@ -1,97 +1,84 @@
 import argparse
 
+import piawka_io
 import polars as pl
+import resample
 
 
-def parse_piawka_het(input_filename, pop_filename):
+def parse_piawka_het(
+    input_filename,
+    pop_filename,
+    ci="none",
+    replicates=resample.REPLICATES,
+    block_size=resample.BLOCK_SIZE,
+    level=resample.LEVEL,
+    seed=None,
+    threads=1,
+):
     # Name output files
     wdir = "/".join(input_filename.split("/")[:-1])
     if "/" in input_filename:
         wdir += "/"
     output_het_filename = wdir + "genomic_het_table.tsv"
 
-    names = [
-        "locus",
-        "nSites",
-        "pop1",
-        "pop2",
-        "nUsed",
-        "metric",
-        "value",
-        "numerator",
-        "denominator",
-    ]
-    cols = [
-        "column_1",
-        "column_2",
-        "column_3",
-        "column_4",
-        "column_5",
-        "column_6",
-        "column_7",
-        "column_8",
-        "column_9",
-    ]
-
-    schema = {
-        "column_1": pl.String,
-        "column_2": pl.Int32,
-        "column_3": pl.String,
-        "column_4": pl.String,
-        "column_5": pl.Int32,
-        "column_6": pl.String,
-        "column_7": pl.Float64,
-        "column_8": pl.Float64,
-        "column_9": pl.Float64,
-        "column_10": pl.String,
-        "column_11": pl.String,
-    }
-
-    # Read data into a DataFrame (avoid LazyFrame.rename segfaults)
-    try:
-        df = pl.read_csv(
-            input_filename,
-            separator="\t",
-            has_header=False,
-            schema=schema,
-            ignore_errors=True,
-            new_columns=names,
+    # Lazy scan: only the 'het' rows and the three needed columns are read,
+    # and the per-individual sums run in the streaming engine (bounded memory)
+    rows = piawka_io.scan_piawka(input_filename).filter(pl.col("metric") == "het")
+    agg = (
+        rows.group_by("pop1")
+        .agg(
+            pl.col("numerator").sum(),
+            pl.col("denominator").sum(),
         )
-    except TypeError:
-        df = pl.read_csv(
-            input_filename,
-            separator="\t",
-            has_header=False,
-            schema=schema,
-            ignore_errors=True,
-        ).rename(dict(zip(cols, names)))
-
-    # Filters per metric and aggregate without group_by to avoid segfaults
-    df_het_rows = (
-        df.filter(pl.col("metric") == "het").select(["pop1", "numerator", "denominator"]).to_dicts()
+        .with_columns(
+            het=pl.when(pl.col("denominator") != 0)
+            .then(pl.col("numerator") / pl.col("denominator"))
+            .otherwise(0.0)
+        )
+        .sort("pop1")
+        .collect(engine="streaming")
     )
-    agg = {}
-    for r in df_het_rows:
-        p = r["pop1"]
-        agg.setdefault(p, {"numerator": 0.0, "denominator": 0.0})
-        agg[p]["numerator"] += float(r["numerator"]) if r["numerator"] is not None else 0.0
-        agg[p]["denominator"] += float(r["denominator"]) if r["denominator"] is not None else 0.0
 
-    out_rows = []
-    for p in sorted(agg.keys()):
-        num = agg[p]["numerator"]
-        den = agg[p]["denominator"] or 0.0
-        het = (num / den) if den else 0.0
-        out_rows.append({"pop1": p, "numerator": num, "denominator": den, "het": het})
+    # Confidence intervals from per-block sums (a second streaming pass)
+    if ci != "none":
+        blocks = (
+            rows.group_by(["pop1", resample.block_expr(ci, block_size)])
+            .agg(pl.col("numerator").sum(), pl.col("denominator").sum())
+            .collect(engine="streaming")
+        )
+        intervals = resample.confidence_intervals(
+            blocks,
+            ["pop1"],
+            "numerator",
+            "denominator",
+            "het",
+            ci,
+            replicates,
+            level,
+            seed,
+            threads,
+        )
+        agg = agg.join(intervals, on="pop1", how="left")
 
-    pl.DataFrame(out_rows).write_csv(output_het_filename, separator="\t")
-    del df
+    agg.write_csv(output_het_filename, separator="\t")
     return
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="A Python script to reduce a pixy Het dataframe.")
-    parser.add_argument("filename", help="The path of the dataframe")  # positional argument
+    parser.add_argument(
+        "filename", help="The path of the dataframe (piawka TSV, Parquet or Arrow IPC)"
+    )  # positional argument
     parser.add_argument("-p", "--pop", help="Population Dataframe", default="")
+    resample.add_arguments(parser)
     args = vars(parser.parse_args())
-    parse_piawka_het(args["filename"], args["pop"])
+    parse_piawka_het(
+        args["filename"],
+        args["pop"],
+        ci=args["ci"],
+        replicates=args["replicates"],
+        block_size=args["block_size"],
+        level=args["level"],
+        seed=args["seed"],
+        threads=args["threads"],
+    )
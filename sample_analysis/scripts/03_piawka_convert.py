@@ -0,0 +1,14 @@
+import argparse
+
+import piawka_io
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to convert a per-locus piawka table to Parquet or Arrow IPC"
+    )
+    parser.add_argument("filename", help="Per-locus piawka TSV")  # positional argument
+    parser.add_argument(
+        "output", help="Output table; the format follows the extension (.parquet or .arrow)"
+    )  # positional argument
+    args = vars(parser.parse_args())
+    piawka_io.convert_piawka(args["filename"], args["output"])
@@ -0,0 +1,97 @@
+import argparse
+
+import piawka_io
+import polars as pl
+
+# Default window size and step in bp (step == size gives non-overlapping windows)
+WINDOW_SIZE = 1_000_000
+
+
+def window_piawka(input_filename, output_filename, window_size=WINDOW_SIZE, step=None):
+    # Sum numerators and denominators of every metric and (pop1, pop2) over
+    # genomic windows of each chromosome. Loci are named 'chr_start_end' (the
+    # chromosome may itself contain '_') and are placed by their midpoint, so
+    # with step < window_size a locus counts in every window holding that point.
+    step = step or window_size
+    if window_size <= 0 or step <= 0 or step > window_size:
+        raise ValueError("Windows need 0 < step <= window_size")
+
+    loci = (
+        piawka_io.scan_piawka(input_filename)
+        .with_columns(
+            pl.col("locus").str.extract_groups(r"^(?<chrom>.+)_(?<start>\d+)_(?<end>\d+)$")
+        )
+        .unnest("locus")
+        .filter(pl.col("chrom").is_not_null())
+        .with_columns(
+            mid=(pl.col("start").cast(pl.Int64) + pl.col("end").cast(pl.Int64)) // 2,
+        )
+        # Windows k cover [k*step, k*step + window_size); those holding 'mid'
+        .with_columns(
+            window=pl.int_ranges(
+                ((pl.col("mid") - window_size) // step + 1).clip(lower_bound=0),
+                pl.col("mid") // step + 1,
+            )
+        )
+        .explode("window")
+    )
+
+    (
+        loci.group_by(["metric", "pop1", "pop2", "chrom", "window"])
+        .agg(
+            nLoci=pl.len(),
+            numerator=pl.col("numerator").sum(),
+            denominator=pl.col("denominator").sum(),
+        )
+        .with_columns(
+            start=pl.col("window") * step,
+            end=pl.col("window") * step + window_size,
+            value=pl.when(pl.col("denominator") != 0)
+            .then(pl.col("numerator") / pl.col("denominator"))
+            .otherwise(0.0),
+        )
+        .sort(["metric", "pop1", "pop2", "chrom", "start"])
+        .select(
+            [
+                "chrom",
+                "start",
+                "end",
+                "metric",
+                "pop1",
+                "pop2",
+                "nLoci",
+                "numerator",
+                "denominator",
+                "value",
+            ]
+        )
+        .collect(engine="streaming")
+        .write_csv(output_filename, separator="\t")
+    )
+    return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to sum per-locus piawka metrics over genomic windows"
+    )
+    parser.add_argument(
+        "filename", help="Per-locus piawka table (TSV, Parquet or Arrow IPC)"
+    )  # positional argument
+    parser.add_argument("output", help="Output per-window table")  # positional argument
+    parser.add_argument(
+        "-w",
+        "--window-size",
+        help=f"Window size in bp (default {WINDOW_SIZE})",
+        type=int,
+        default=WINDOW_SIZE,
+    )
+    parser.add_argument(
+        "-s",
+        "--step",
+        help="Window step in bp; smaller than the size for sliding windows (default: size)",
+        type=int,
+        default=None,
+    )
+    args = vars(parser.parse_args())
+    window_piawka(args["filename"], args["output"], args["window_size"], args["step"])
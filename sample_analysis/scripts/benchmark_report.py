@@ -0,0 +1,217 @@
+import argparse
+import os
+
+import numpy as np
+import polars as pl
+
+# Columns of Snakemake benchmark files summed or maximised per stage: wall and
+# CPU seconds, peak resident memory and MB read/written
+METRICS = ["s", "cpu_time", "max_rss", "io_in", "io_out"]
+
+# Benchmark files finishing this many seconds before a job starts count as
+# the job it waited for (file mtimes and scheduling are not exact)
+SLACK = 2.0
+
+
+def read_benchmarks(bench_dir, since=None):
+    # One row per job from '<rule>[.<wildcards>].tsv' files (rule names have
+    # no dots). A file holds one line per repeat; the mean is kept. The job
+    # ended when the file was written; files written before 'since' (epoch
+    # seconds, the workflow start) are jobs of earlier runs and are skipped.
+    rows = []
+    names = sorted(os.listdir(bench_dir)) if os.path.isdir(bench_dir) else []
+    for name in names:
+        path = os.path.join(bench_dir, name)
+        # cost_*.tsv are this report's own tables
+        if not name.endswith(".tsv") or name.startswith("cost_") or not os.path.isfile(path):
+            continue
+        if since is not None and os.path.getmtime(path) < since:
+            continue
+        df = pl.read_csv(path, separator="\t", null_values=["NA", "-"], infer_schema_length=0)
+        if df.height == 0:
+            continue
+        stage, _, instance = name[: -len(".tsv")].partition(".")
+        row = {"stage": stage, "instance": instance, "end": os.path.getmtime(path)}
+        for m in METRICS:
+            value = df[m].cast(pl.Float64, strict=False).mean() if m in df.columns else None
+            row[m] = value or 0.0
+        row["start"] = row["end"] - row["s"]
+        rows.append(row)
+    schema = {"stage": pl.String, "instance": pl.String, "start": pl.Float64, "end": pl.Float64}
+    return pl.DataFrame(rows, schema=schema | {m: pl.Float64 for m in METRICS})
+
+
+def critical_path(jobs, slack=SLACK):
+    # Walk back from the last job to finish: each step goes to the job that
+    # finished last before the current one started, i.e. the one it most
+    # likely waited on. Returns the row indices of that chain, first to last.
+    if jobs.height == 0:
+        return []
+    start = jobs["start"].to_numpy()
+    end = jobs["end"].to_numpy()
+    current = int(np.argmax(end))
+    path = [current]
+    while True:
+        before = np.flatnonzero((end <= start[current] + slack) & (np.arange(len(end)) != current))
+        before = before[~np.isin(before, path)]
+        if len(before) == 0:
+            break
+        current = int(before[np.argmax(end[before])])
+        path.append(current)
+    return path[::-1]
+
+
+def stage_table(jobs, path):
+    # Totals per stage in order of their first job, with the wall time each
+    # stage adds to the critical path
+    critical = jobs.with_row_index("row").with_columns(critical=pl.col("row").is_in(path))
+    return (
+        critical.group_by("stage")
+        .agg(
+            jobs=pl.len(),
+            wall_s=pl.col("s").sum(),
+            max_job_s=pl.col("s").max(),
+            cpu_s=pl.col("cpu_time").sum(),
+            max_rss_mb=pl.col("max_rss").max(),
+            io_in_mb=pl.col("io_in").sum(),
+            io_out_mb=pl.col("io_out").sum(),
+            critical_s=pl.col("s").filter(pl.col("critical")).sum(),
+            first_start=pl.col("start").min(),
+        )
+        .with_columns(on_critical_path=pl.col("critical_s") > 0)
+        .sort("first_start")
+        .drop("first_start")
+    )
+
+
+def sample_table(jobs, samples):
+    # Per-sample jobs (their wildcards are just the sample name) summed over
+    # stages, with the costliest stage of each sample
+    per_sample = jobs.filter(pl.col("instance").is_in(samples))
+    return (
+        per_sample.group_by("instance")
+        .agg(
+            jobs=pl.len(),
+            wall_s=pl.col("s").sum(),
+            cpu_s=pl.col("cpu_time").sum(),
+            max_rss_mb=pl.col("max_rss").max(),
+            io_in_mb=pl.col("io_in").sum(),
+            io_out_mb=pl.col("io_out").sum(),
+            slowest_stage=pl.col("stage").sort_by("s").last(),
+        )
+        .rename({"instance": "sample"})
+        .sort("wall_s", descending=True)
+    )
+
+
+def scaling_table(stages, history_file, n_samples):
+    # Keep the latest totals of every stage and cohort size seen in
+    # 'history_file' (stages a partial rerun skipped keep their earlier row)
+    # and fit cost ~ n_samples^exponent per stage over the sizes available
+    current = stages.select(
+        pl.lit(n_samples).cast(pl.Int64).alias("n_samples"),
+        "stage",
+        "wall_s",
+        "cpu_s",
+        "max_rss_mb",
+    )
+    if os.path.exists(history_file):
+        past = pl.read_csv(history_file, separator="\t").join(
+            current.select("n_samples", "stage"), on=["n_samples", "stage"], how="anti"
+        )
+        history = pl.concat([past, current], how="vertical_relaxed")
+    else:
+        history = current
+    history = history.sort(["n_samples", "stage"])
+    os.makedirs(os.path.dirname(history_file) or ".", exist_ok=True)
+    history.write_csv(history_file, separator="\t", quote_style="never")
+
+    rows = []
+    for (stage,), group in history.group_by("stage", maintain_order=True):
+        group = group.filter(pl.col("cpu_s") + pl.col("wall_s") > 0)
+        sizes = group["n_samples"].to_numpy()
+        exponent = None
+        if len(np.unique(sizes)) > 1:
+            cost = np.maximum(group["cpu_s"].to_numpy(), group["wall_s"].to_numpy())
+            exponent = float(np.polyfit(np.log(sizes), np.log(cost), 1)[0])
+        now = group.filter(pl.col("n_samples") == n_samples)
+        rows.append(
+            {
+                "stage": stage,
+                "cohort_sizes": ",".join(str(s) for s in sorted(set(sizes.tolist()))),
+                "cpu_s_per_sample": now["cpu_s"].sum() / n_samples if n_samples else None,
+                "wall_s_per_sample": now["wall_s"].sum() / n_samples if n_samples else None,
+                "exponent": exponent,
+            }
+        )
+    return pl.DataFrame(
+        rows,
+        schema={
+            "stage": pl.String,
+            "cohort_sizes": pl.String,
+            "cpu_s_per_sample": pl.Float64,
+            "wall_s_per_sample": pl.Float64,
+            "exponent": pl.Float64,
+        },
+    )
+
+
+def read_samples(samples_file):
+    with open(samples_file) as f:
+        return [line.split()[0] for line in f if line.strip()]
+
+
+def benchmark_report(bench_dir, samples_file, output_dir=None, history_file=None, since=None):
+    # Write cost_by_stage.tsv, cost_by_sample.tsv, cost_critical_path.tsv and
+    # cost_scaling.tsv (from 'history_file', kept across runs; default
+    # cost_history.tsv next to the tables) for the jobs written since 'since'
+    output_dir = output_dir or bench_dir
+    history_file = history_file or os.path.join(output_dir, "cost_history.tsv")
+    samples = read_samples(samples_file)
+    jobs = read_benchmarks(bench_dir, since)
+    path = critical_path(jobs)
+
+    stages = stage_table(jobs, path)
+    stages.write_csv(
+        os.path.join(output_dir, "cost_by_stage.tsv"), separator="\t", quote_style="never"
+    )
+    sample_table(jobs, samples).write_csv(
+        os.path.join(output_dir, "cost_by_sample.tsv"), separator="\t", quote_style="never"
+    )
+    jobs[path].select("stage", "instance", "s", "cpu_time", "max_rss").write_csv(
+        os.path.join(output_dir, "cost_critical_path.tsv"), separator="\t", quote_style="never"
+    )
+    scaling_table(stages, history_file, len(samples)).write_csv(
+        os.path.join(output_dir, "cost_scaling.tsv"), separator="\t", quote_style="never"
+    )
+    return stages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to summarise Snakemake benchmark files per stage and per sample"
+    )
+    parser.add_argument(
+        "bench_dir", help="Directory of Snakemake benchmark files"
+    )  # positional argument
+    parser.add_argument(
+        "-s", "--samples", help="Population index file (first column: sample names)", required=True
+    )
+    parser.add_argument("-o", "--output-dir", help="Where the report tables go (default bench_dir)")
+    parser.add_argument(
+        "-y",
+        "--history",
+        help="Stage totals per cohort size, kept across runs (default cost_history.tsv in the output directory)",
+    )
+    parser.add_argument(
+        "--since",
+        help="Only read benchmark files written after this time (epoch seconds)",
+        type=float,
+    )
+    args = vars(parser.parse_args())
+
+    stages = benchmark_report(
+        args["bench_dir"], args["samples"], args["output_dir"], args["history"], args["since"]
+    )
+    with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_hide_dataframe_shape=True):
+        print(stages)
@@ -0,0 +1,373 @@
+import gzip as gz
+import re
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+# BGZF is a series of gzip members of at most 64 KiB, each carrying its own
+# compressed size in a 'BC' extra subfield (see the SAM/BAM specification)
+MAGIC = b"\x1f\x8b\x08\x04"
+BLOCK_SIZE = 0xFF00
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+# Decompressed bytes handed out at a time by read_chunks/read_vcf
+CHUNK_SIZE = 16 << 20
+
+# The complete #CHROM line of a VCF header
+CHROM_RE = re.compile(rb"(?m)^#CHROM[^\n]*(?:\n|\Z)")
+
+
+def is_bgzf(path):
+    with open(path, "rb") as f:
+        head = f.read(18)
+    return len(head) == 18 and head[:4] == MAGIC and head[12:14] == b"BC"
+
+
+def read_block(f):
+    # Read one raw (still compressed) block from a binary file, or b"" at EOF
+    head = f.read(12)
+    if not head:
+        return b""
+    if len(head) < 12 or head[:4] != MAGIC:
+        raise ValueError("Input is not BGZF compressed")
+    xlen = struct.unpack("<H", head[10:12])[0]
+    extra = f.read(xlen)
+    bsize = None
+    i = 0
+    while i + 4 <= len(extra):
+        slen = struct.unpack("<H", extra[i + 2 : i + 4])[0]
+        if extra[i : i + 2] == b"BC" and slen == 2:
+            bsize = struct.unpack("<H", extra[i + 4 : i + 6])[0]
+        i += 4 + slen
+    if bsize is None:
+        raise ValueError("Input is not BGZF compressed (missing BC subfield)")
+    rest = f.read(bsize + 1 - 12 - xlen)
+    return head + extra + rest
+
+
+def iter_blocks(f):
+    while True:
+        raw = read_block(f)
+        if not raw:
+            return
+        yield raw
+
+
+def decompress_block(raw):
+    xlen = struct.unpack("<H", raw[10:12])[0]
+    data = zlib.decompress(raw[12 + xlen : -8], -15)
+    crc, isize = struct.unpack("<II", raw[-8:])
+    if isize != len(data) or crc != zlib.crc32(data):
+        raise ValueError("Corrupted BGZF block")
+    return data
+
+
+def inflate(path, threads=1):
+    # Decompressed data of every block of a BGZF file, in order. Blocks are
+    # independent, so with threads > 1 they are inflated on a thread pool
+    # (zlib releases the GIL), a bounded number ahead of the consumer.
+    with open(path, "rb") as f:
+        if threads <= 1:
+            for raw in iter_blocks(f):
+                yield decompress_block(raw)
+            return
+        with ThreadPoolExecutor(threads) as pool:
+            pending = deque()
+            for raw in iter_blocks(f):
+                pending.append(pool.submit(decompress_block, raw))
+                if len(pending) > 4 * threads:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def _read_plain(path, gzip=True):
+    with gz.open(path, "rb") if gzip else open(path, "rb") as f:
+        yield from iter(lambda: f.read(BLOCK_SIZE), b"")
+
+
+def read_chunks(path, threads=1, chunk_size=CHUNK_SIZE, gzip=True):
+    # Decompressed contents of a BGZF (inflated in parallel), gzip or plain
+    # file in chunks of at least 'chunk_size' bytes that end with a newline
+    # (but the last one), so every chunk holds whole lines. Closing it closes
+    # the file (and the inflate thread pool) underneath.
+    parts = inflate(path, threads) if gzip and is_bgzf(path) else _read_plain(path, gzip)
+    buffer = bytearray()
+    try:
+        for part in parts:
+            buffer += part
+            while len(buffer) >= chunk_size:
+                cut = buffer.find(b"\n", chunk_size - 1) + 1
+                if not cut:
+                    break
+                yield bytes(buffer[:cut])
+                del buffer[:cut]
+    finally:
+        parts.close()
+    if buffer:
+        yield bytes(buffer)
+
+
+class VcfRecords:
+    # Iterator over the chunks of records of read_vcf. A reader left before
+    # its end holds the file (and inflate thread pool) open until it is closed,
+    # so close it, or use it in a with statement.
+
+    def __init__(self, rest, chunks):
+        self._chunks = chunks
+        self._iter = chain([rest] if rest else [], chunks)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._iter)
+
+    def close(self):
+        self._chunks.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_vcf(path, threads=1, chunk_size=CHUNK_SIZE, gzip=True):
+    # Read a VCF once: its meta-information lines (text, without the #CHROM
+    # line), the #CHROM column names and a VcfRecords over chunks of records
+    # (bytes of whole lines, ready for pl.read_csv)
+    chunks = read_chunks(path, threads=threads, chunk_size=chunk_size, gzip=gzip)
+    data = b""
+    for chunk in chunks:
+        data += chunk
+        match = CHROM_RE.search(data)
+        if match:
+            break
+    else:
+        chunks.close()
+        raise ValueError(f"No #CHROM line found in {path}")
+    names = match.group().decode().rstrip("\r\n").split("\t")
+    return data[: match.start()].decode(), names, VcfRecords(data[match.end() :], chunks)
+
+
+def compress_block(data, level=6):
+    # Compress at most BLOCK_SIZE bytes into a single BGZF block
+    c = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = c.compress(data) + c.flush()
+    header = MAGIC + b"\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+    bsize = struct.pack("<H", len(header) + 2 + len(cdata) + 8 - 1)
+    return header + bsize + cdata + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def compress(data, level=6):
+    # Compress bytes into consecutive BGZF blocks (without the EOF marker)
+    return b"".join(
+        compress_block(data[i : i + BLOCK_SIZE], level) for i in range(0, len(data), BLOCK_SIZE)
+    )
+
+
+class BgzfWriter:
+    # Buffered BGZF writer; full blocks are compressed on a thread pool while
+    # records keep being written (zlib releases the GIL), and written in order.
+    # tell() returns logical virtual offsets (block number << 16 | offset in
+    # block), translated to real ones with virtual_offset() once blocks land.
+
+    def __init__(self, path, threads=1, level=6):
+        self.file = open(path, "wb")
+        self.level = level
+        self.threads = max(1, threads)
+        self.pool = ThreadPoolExecutor(self.threads) if self.threads > 1 else None
+        self.pending = deque()
+        self.buffer = bytearray()
+        self.n_blocks = 0
+        self.block_offsets = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def tell(self):
+        return (self.n_blocks << 16) | len(self.buffer)
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= BLOCK_SIZE:
+            self._submit(bytes(self.buffer[:BLOCK_SIZE]))
+            del self.buffer[:BLOCK_SIZE]
+
+    def _submit(self, data):
+        self.n_blocks += 1
+        if self.pool is None:
+            self._write_block(compress_block(data, self.level))
+            return
+        self.pending.append(self.pool.submit(compress_block, data, self.level))
+        while len(self.pending) > 2 * self.threads:
+            self._write_block(self.pending.popleft().result())
+
+    def _write_block(self, raw):
+        self.block_offsets.append(self.file.tell())
+        self.file.write(raw)
+
+    def virtual_offset(self, logical):
+        return (self.block_offsets[logical >> 16] << 16) | (logical & 0xFFFF)
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.buffer:
+            self._submit(bytes(self.buffer))
+            self.buffer.clear()
+        while self.pending:
+            self._write_block(self.pending.popleft().result())
+        if self.pool is not None:
+            self.pool.shutdown()
+        # Offset of the EOF marker, for positions at the very end of the data
+        self.block_offsets.append(self.file.tell())
+        self.file.write(EOF_BLOCK)
+        self.file.close()
+
+
+def reg2bin(beg, end, min_shift, depth):
+    # Smallest CSI bin containing the 0-based half-open interval [beg, end)
+    end -= 1
+    s = min_shift
+    t = ((1 << (depth * 3)) - 1) // 7
+    for level in range(depth, 0, -1):
+        if beg >> s == end >> s:
+            return t + (beg >> s)
+        s += 3
+        t -= 1 << ((level - 1) * 3)
+    return 0
+
+
+def bin_first_window(b, depth):
+    # First linear-index window covered by bin 'b'
+    level = 0
+    first = 0
+    while b >= first + (1 << (level * 3)):
+        first += 1 << (level * 3)
+        level += 1
+    return (b - first) << ((depth - level) * 3)
+
+
+class CsiIndex:
+    # Coordinate-sorted CSI index with the tabix VCF configuration, as written
+    # by 'bcftools index -c' (min_shift 14, depth 6)
+
+    def __init__(self, min_shift=14, depth=6):
+        self.min_shift = min_shift
+        self.depth = depth
+        self.n_bins = ((1 << (3 * depth + 3)) - 1) // 7
+        self.names = []
+        self.refs = []
+        self.tid = -1
+        self.save_bin = None
+        self.save_off = None
+        self.last_end = None
+
+    def push(self, name, beg, end, vbeg, vend):
+        if not self.names or name != self.names[-1]:
+            if name in self.names:
+                raise ValueError(f"Records for '{name}' are not contiguous; input is unsorted")
+            self._save_chunk()
+            self.names.append(name)
+            self.refs.append({"bins": {}, "linear": {}, "beg": vbeg, "n": 0})
+            self.tid += 1
+        ref = self.refs[self.tid]
+        b = reg2bin(beg, max(end, beg + 1), self.min_shift, self.depth)
+        if b != self.save_bin:
+            self._save_chunk()
+            self.save_bin = b
+            self.save_off = vbeg
+        for w in range(beg >> self.min_shift, ((max(end, beg + 1) - 1) >> self.min_shift) + 1):
+            ref["linear"].setdefault(w, vbeg)
+        ref["n"] += 1
+        self.last_end = vend
+
+    def _save_chunk(self):
+        if self.save_bin is None:
+            return
+        ref = self.refs[self.tid]
+        ref["bins"].setdefault(self.save_bin, []).append((self.save_off, self.last_end))
+        ref["end"] = self.last_end
+        self.save_bin = None
+
+    def write(self, path, resolve=int):
+        self._save_chunk()
+        names = b"".join(n.encode() + b"\0" for n in self.names)
+        # tabix configuration: VCF preset, seq/beg/end columns, '#' meta, no skip
+        aux = struct.pack("<7i", 2, 1, 2, 0, ord("#"), 0, len(names)) + names
+        out = [b"CSI\1", struct.pack("<3i", self.min_shift, self.depth, len(aux)), aux]
+        out.append(struct.pack("<i", len(self.refs)))
+        for ref in self.refs:
+            first = resolve(ref["beg"])
+            # Dense linear index; empty windows take the previous offset
+            linear = [ref["beg"]] * (max(ref["linear"]) + 1)
+            for w in range(len(linear)):
+                linear[w] = ref["linear"].get(w, linear[w - 1] if w else ref["beg"])
+            # Minimal offset of each bin: first record in its leftmost window
+            loff = {}
+            for b in ref["bins"]:
+                w = bin_first_window(b, self.depth)
+                loff[b] = resolve(linear[w]) if w < len(linear) else 0
+            out.append(struct.pack("<i", len(ref["bins"]) + 1))
+            for b in sorted(ref["bins"]):
+                chunks = ref["bins"][b]
+                out.append(struct.pack("<IQi", b, loff[b], len(chunks)))
+                for cbeg, cend in chunks:
+                    out.append(struct.pack("<QQ", resolve(cbeg), resolve(cend)))
+            # Pseudo-bin with the offset span and record counts of the sequence
+            out.append(struct.pack("<IQi", self.n_bins + 1, 0, 2))
+            out.append(struct.pack("<QQQQ", first, resolve(ref["end"]), ref["n"], 0))
+        out.append(struct.pack("<Q", 0))
+        with open(path, "wb") as f:
+            f.write(compress(b"".join(out)) + EOF_BLOCK)
+
+
+class VcfWriter:
+    # Writes a BGZF-compressed VCF and, unless index=False, its '.csi' index
+    # in the same pass; records must be written in sorted order
+
+    def __init__(self, path, threads=1, index=True):
+        self.path = path
+        self.bgzf = BgzfWriter(path, threads=threads)
+        self.index = CsiIndex() if index else None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_header(self, text):
+        self.bgzf.write(text.encode())
+
+    def write_records(self, text):
+        # 'text' holds complete, newline-terminated VCF records (str or bytes)
+        data = text.encode() if isinstance(text, str) else text
+        if self.index is None:
+            self.bgzf.write(data)
+            return
+        for line in data.splitlines(keepends=True):
+            vbeg = self.bgzf.tell()
+            self.bgzf.write(line)
+            chrom, pos, _id, ref, _alt, _qual, _filter, info = line.split(b"\t", 8)[:8]
+            beg = int(pos) - 1
+            end = beg + len(ref)
+            if b"END=" in info:
+                for field in info.split(b";"):
+                    if field.startswith(b"END="):
+                        end = int(field[4:])
+            self.index.push(chrom.decode(), beg, end, vbeg, self.bgzf.tell())
+
+    def close(self):
+        if self.bgzf.file.closed:
+            return
+        self.bgzf.close()
+        if self.index is not None:
+            self.index.write(self.path + ".csi", resolve=self.bgzf.virtual_offset)
@@ -0,0 +1,271 @@
+import argparse
+import gzip as gz
+import json
+import os
+import shutil
+from contextlib import ExitStack
+from itertools import islice
+
+import numpy as np
+import polars as pl
+
+# Number of VCF records parsed into genotype arrays at a time
+BATCH_SIZE = 100_000
+
+# Allele indices of the GT field (first subfield); ploidy above 2 is cut at 2
+GT_RE = r"^(\d+|\.)(?:[/|](\d+|\.))?"
+
+# SNPs (bi- or multi-allelic) and invariant sites; indels are skipped
+SNP_RE = r"^(?:\.|[ACGTNacgtn](?:,[ACGTNacgtn])*)$"
+
+# A genotype is packed in one byte, 4 bits per allele index; this code is a
+# missing allele (so allele indices go up to 14)
+MISSING = 15
+
+# Arrays of the store, each a raw file '<name>.bin' (shapes in meta.json):
+# per site its chromosome (index into meta 'chroms'), 1-based position, SNP or
+# invariant flag and catalog locus (index into loci.bed, -1 outside every
+# locus); per site and sample the packed genotype and DP (0 when missing); per
+# locus the [first, end) range of its sites
+ARRAYS = {
+    "chrom": np.uint16,
+    "pos": np.int64,
+    "snp": np.bool_,
+    "locus": np.int32,
+    "gt": np.uint8,
+    "dp": np.uint16,
+    "locus_sites": np.int64,
+}
+
+
+def read_loci(bed_file):
+    # Sorted interval index of the (sorted, merged) catalog loci: per
+    # chromosome, the start/end arrays and the global index of its first locus
+    index = {}
+    names = []
+    rows = {}
+    with open(bed_file) as f:
+        for line in f:
+            if line.strip():
+                chrom, start, end = line.split("\t")[:3]
+                rows.setdefault(chrom, []).append((int(start), int(end)))
+    for chrom, intervals in rows.items():
+        intervals.sort()
+        starts = np.array([s for s, _e in intervals], dtype=np.int64)
+        ends = np.array([e for _s, e in intervals], dtype=np.int64)
+        index[chrom] = (starts, ends, len(names))
+        names.extend(f"{chrom}_{s}_{e}" for s, e in intervals)
+    return index, names
+
+
+def locate(index, chrom, pos0):
+    # Global locus index of each 0-based position, or -1 outside every locus
+    if chrom not in index:
+        return np.full(len(pos0), -1)
+    starts, ends, offset = index[chrom]
+    i = np.searchsorted(starts, pos0, side="right") - 1
+    inside = (i >= 0) & (pos0 < ends[np.maximum(i, 0)])
+    return np.where(inside, i + offset, -1)
+
+
+def chrom_runs(df):
+    # Consecutive records of the same chromosome, in file order
+    chroms = df["#CHROM"]
+    bounds = np.flatnonzero(np.r_[True, (chroms[1:] != chroms[:-1]).to_numpy()])
+    for start, end in zip(bounds, np.r_[bounds[1:], df.height]):
+        yield chroms[int(start)], df.slice(int(start), int(end - start))
+
+
+def site_loci(index, df):
+    return np.concatenate(
+        [
+            locate(index, chrom, part["POS"].cast(pl.Int64).to_numpy() - 1)
+            for chrom, part in chrom_runs(df)
+        ]
+    )
+
+
+def is_snp(df):
+    return df.select(
+        (pl.col("REF").str.len_chars() == 1) & pl.col("ALT").str.contains(SNP_RE)
+    ).to_series()
+
+
+def genotype_array(df, samples):
+    # sites x samples x 2 allele indices, -1 where missing
+    exprs = [
+        pl.col(s).str.extract(GT_RE, k).cast(pl.Int16, strict=False).fill_null(-1).alias(f"{s}.{k}")
+        for s in samples
+        for k in (1, 2)
+    ]
+    return df.select(exprs).to_numpy().reshape(df.height, len(samples), 2)
+
+
+def depth_array(df, samples):
+    # sites x samples FORMAT/DP, 0 where missing (capped at 65535)
+    keys = pl.col("FORMAT").str.split(":")
+    i = keys.list.eval(pl.element() == "DP").list.arg_max()
+    exprs = [
+        pl.when(keys.list.contains("DP"))
+        .then(pl.col(s).str.split(":").list.get(i, null_on_oob=True))
+        .cast(pl.Int64, strict=False)
+        .fill_null(0)
+        .clip(0, 65535)
+        .alias(s)
+        for s in samples
+    ]
+    return df.select(exprs).to_numpy().reshape(df.height, len(samples)).astype(np.uint16)
+
+
+def pack(genotypes):
+    if genotypes.max(initial=-1) >= MISSING:
+        raise ValueError(f"Allele indices above {MISSING - 1} cannot be packed")
+    codes = np.where(genotypes < 0, MISSING, genotypes)
+    return ((codes[:, :, 0] << 4) | codes[:, :, 1]).astype(np.uint8)
+
+
+def unpack(packed):
+    # Inverse of pack: sites x samples x 2 allele indices, -1 where missing
+    codes = np.stack([packed >> 4, packed & 0xF], axis=-1).astype(np.int16)
+    codes[codes == MISSING] = -1
+    return codes
+
+
+def read_vcf_batch(lines, vcf_names):
+    return pl.read_csv(
+        "".join(lines).encode(),
+        separator="\t",
+        has_header=False,
+        new_columns=vcf_names,
+        infer_schema_length=0,
+        quote_char=None,
+    )
+
+
+def read_vcf_names(ifile, vcf_path):
+    for line in ifile:
+        if line.startswith("#CHROM"):
+            return line.rstrip("\n").split("\t")
+    raise ValueError(f"No #CHROM line found in {vcf_path}")
+
+
+def build_store(vcf_path, bed_file, store_dir, gzip=True, batch_size=BATCH_SIZE):
+    # Convert a sorted (merged) VCF into a directory of memory-mappable arrays
+    # (see ARRAYS), with a copy of the catalog BED the locus indices refer to.
+    # meta.json is written last, so a store without it is incomplete.
+    index, names = read_loci(bed_file)
+    os.makedirs(store_dir, exist_ok=True)
+    meta_path = os.path.join(store_dir, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    shutil.copyfile(bed_file, os.path.join(store_dir, "loci.bed"))
+
+    chroms = {}
+    n_sites = 0
+    ifile = gz.open(vcf_path, "rt") if gzip else open(vcf_path, "rt")
+    with ifile, ExitStack() as stack:
+        vcf_names = read_vcf_names(ifile, vcf_path)
+        samples = vcf_names[9:]
+        files = {
+            name: stack.enter_context(open(os.path.join(store_dir, name + ".bin"), "wb"))
+            for name in ARRAYS
+            if name != "locus_sites"
+        }
+        while True:
+            lines = list(islice(ifile, batch_size))
+            if not lines:
+                break
+            df = read_vcf_batch(lines, vcf_names)
+            for chrom in df["#CHROM"].unique(maintain_order=True):
+                chroms.setdefault(chrom, len(chroms))
+            columns = {
+                "chrom": df["#CHROM"].replace_strict(chroms, return_dtype=pl.UInt16).to_numpy(),
+                "pos": df["POS"].cast(pl.Int64).to_numpy(),
+                "snp": is_snp(df).to_numpy(),
+                "locus": site_loci(index, df),
+                "gt": pack(genotype_array(df, samples)),
+                "dp": depth_array(df, samples),
+            }
+            for name, values in columns.items():
+                np.ascontiguousarray(values, dtype=ARRAYS[name]).tofile(files[name])
+            n_sites += df.height
+
+    # Sites of a locus are contiguous in a sorted VCF: one run per locus
+    locus = np.fromfile(os.path.join(store_dir, "locus.bin"), dtype=ARRAYS["locus"])
+    bounds = np.flatnonzero(np.r_[True, locus[1:] != locus[:-1]][:n_sites])
+    ends = np.append(bounds[1:], n_sites)[: len(bounds)]
+    ids = locus[bounds]
+    inside = ids >= 0
+    if len(np.unique(ids[inside])) != inside.sum():
+        raise ValueError(f"Sites of a locus are not contiguous in {vcf_path}; is it sorted?")
+    locus_sites = np.zeros((len(names), 2), dtype=ARRAYS["locus_sites"])
+    locus_sites[ids[inside], 0] = bounds[inside]
+    locus_sites[ids[inside], 1] = ends[inside]
+    locus_sites.tofile(os.path.join(store_dir, "locus_sites.bin"))
+
+    shapes = {
+        "chrom": [n_sites],
+        "pos": [n_sites],
+        "snp": [n_sites],
+        "locus": [n_sites],
+        "gt": [n_sites, len(samples)],
+        "dp": [n_sites, len(samples)],
+        "locus_sites": [len(names), 2],
+    }
+    meta = {
+        "version": 1,
+        "source": {"vcf": os.path.abspath(vcf_path), "size": os.path.getsize(vcf_path)},
+        "samples": samples,
+        "chroms": list(chroms),
+        "n_sites": n_sites,
+        "n_loci": len(names),
+        "arrays": {
+            name: {"dtype": np.dtype(dtype).name, "shape": shapes[name]}
+            for name, dtype in ARRAYS.items()
+        },
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+def open_store(store_dir):
+    # meta.json contents and every array, memory-mapped read-only
+    meta_path = os.path.join(store_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        raise ValueError(f"{store_dir} is not a complete genotype store (no meta.json)")
+    with open(meta_path) as f:
+        meta = json.load(f)
+    arrays = {}
+    for name, spec in meta["arrays"].items():
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            # Empty files cannot be mapped
+            arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+        else:
+            path = os.path.join(store_dir, name + ".bin")
+            arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r", shape=shape)
+    return meta, arrays
+
+
+def is_store(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to convert a merged vcf file into a memory-mapped genotype store"
+    )
+    parser.add_argument("-v", "--vcf", help="Merged VCF file (bgzip compressed)", required=True)
+    parser.add_argument("-b", "--bed", help="Sorted and merged catalog BED file", required=True)
+    parser.add_argument("-o", "--output", help="Store directory", required=True)
+    parser.add_argument(
+        "--batch-size",
+        help=f"VCF records parsed at a time (default {BATCH_SIZE})",
+        type=int,
+        default=BATCH_SIZE,
+    )
+    args = vars(parser.parse_args())
+
+    meta = build_store(args["vcf"], args["bed"], args["output"], batch_size=args["batch_size"])
+    print(f"{meta['n_sites']} sites x {len(meta['samples'])} samples, {meta['n_loci']} loci")
@@ -0,0 +1,108 @@
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+
+# Inputs at least this large (BAMs, the reference) have their content digest
+# remembered per path, size and mtime, so they are read once per version
+MEMO_SIZE = 64 << 20
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def input_digest(path, cache_dir):
+    st = os.stat(path)
+    if st.st_size < MEMO_SIZE:
+        return file_digest(path)
+    stamp = f"{os.path.realpath(path)}\t{st.st_size}\t{st.st_mtime_ns}"
+    memo = os.path.join(cache_dir, "digests", hashlib.sha256(stamp.encode()).hexdigest())
+    if os.path.exists(memo):
+        with open(memo) as f:
+            return f.read().strip()
+    digest = file_digest(path)
+    os.makedirs(os.path.dirname(memo), exist_ok=True)
+    tmp = f"{memo}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        f.write(digest + "\n")
+    os.replace(tmp, memo)
+    return digest
+
+
+def cache_key(keys, inputs, cache_dir):
+    # The rule's own key (command, code and params) and the content of every
+    # input in rule order; paths and timestamps play no part
+    h = hashlib.sha256()
+    for part in list(keys) + [input_digest(path, cache_dir) for path in inputs]:
+        h.update(part.encode() + b"\0")
+    return h.hexdigest()
+
+
+def place(src, dst):
+    # Hard link where the cache and the outputs share a filesystem, else copy
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def restore(entry, outputs):
+    # Outputs of a complete entry, in rule order; False when there is none
+    files = [os.path.join(entry, str(i)) for i in range(len(outputs))]
+    if not all(os.path.exists(f) for f in files):
+        return False
+    for src, dst in zip(files, outputs):
+        os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+        place(src, dst)
+    # Entries in use stay recent, so old ones can be pruned by mtime
+    os.utime(entry)
+    return True
+
+
+def store(entry, outputs, cache_dir):
+    # Entries are built aside and renamed into place, so a reader never sees a
+    # partial one and concurrent writers of the same key keep the first
+    if os.path.exists(entry):
+        return False
+    tmp = tempfile.mkdtemp(prefix=".tmp", dir=cache_dir)
+    try:
+        for i, src in enumerate(outputs):
+            place(src, os.path.join(tmp, str(i)))
+        os.rename(tmp, entry)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="A Python script to restore (get) or save (put) the outputs of a job in a cache keyed on the content of its inputs"
+    )
+    parser.add_argument("action", choices=["get", "put"])
+    parser.add_argument("-d", "--cache-dir", help="Cache directory", required=True)
+    parser.add_argument(
+        "-k", "--key", help="Rule command, code and params digests", nargs="+", default=[]
+    )
+    parser.add_argument("-i", "--inputs", help="Input files", nargs="+", default=[])
+    parser.add_argument("-o", "--outputs", help="Output files", nargs="+", required=True)
+    args = vars(parser.parse_args())
+
+    os.makedirs(args["cache_dir"], exist_ok=True)
+    key = cache_key(args["key"], args["inputs"], args["cache_dir"])
+    entry = os.path.join(args["cache_dir"], key)
+    if args["action"] == "get":
+        if not restore(entry, args["outputs"]):
+            sys.exit(1)
+        print(f"Restored {len(args['outputs'])} outputs from cache entry {key}", file=sys.stderr)
+    elif store(entry, args["outputs"], args["cache_dir"]):
+        print(f"Cached {len(args['outputs'])} outputs as {key}", file=sys.stderr)
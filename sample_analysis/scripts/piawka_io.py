@@ -0,0 +1,80 @@
+import polars as pl
+
+# piawka per-locus output has no header; per-sample (het) tables stop after
+# 'denominator' and leave the last two columns empty
+SCHEMA = {
+    "locus": pl.String,
+    "nSites": pl.Int32,
+    "pop1": pl.String,
+    "pop2": pl.String,
+    "nUsed": pl.Int32,
+    "metric": pl.String,
+    "value": pl.Float64,
+    "numerator": pl.Float64,
+    "denominator": pl.Float64,
+    "nGenotypes": pl.Int32,
+    "nMissing": pl.Int32,
+}
+
+# Few distinct values repeated on every row: stored dictionary-encoded
+CATEGORICAL = ["pop1", "pop2", "metric"]
+
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".ipc": "arrow", ".tsv": "tsv"}
+
+
+def table_format(path):
+    for ext, fmt in FORMATS.items():
+        if str(path).endswith(ext):
+            return fmt
+    return "tsv"
+
+
+def _tsv_width(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                return line.count("\t") + 1
+    return len(SCHEMA)
+
+
+def scan_piawka(path):
+    # Lazy per-locus table from piawka's TSV output or its columnar copy; only
+    # the columns a query uses are read from Parquet (Arrow IPC is mapped)
+    fmt = table_format(path)
+    if fmt == "tsv":
+        # Columns missing from a narrower (per-sample) table are added as nulls
+        names = list(SCHEMA)[: min(_tsv_width(path), len(SCHEMA))]
+        return pl.scan_csv(
+            path,
+            separator="\t",
+            has_header=False,
+            schema={name: SCHEMA[name] for name in names},
+            ignore_errors=True,
+            truncate_ragged_lines=True,
+        ).with_columns(
+            pl.lit(None, dtype=SCHEMA[name]).alias(name) for name in SCHEMA if name not in names
+        )
+    lf = pl.scan_parquet(path) if fmt == "parquet" else pl.scan_ipc(path, memory_map=True)
+    return lf.with_columns(pl.col(CATEGORICAL).cast(pl.String))
+
+
+def convert_piawka(input_filename, output_filename):
+    # Write a piawka table as zstd-compressed Parquet or uncompressed Arrow IPC
+    # (by extension), sorted by locus in genome order ('chr_start_end' IDs)
+    # with categorical pop1/pop2/metric columns. Arrow IPC stays uncompressed
+    # so scan_piawka can memory-map it (compressed buffers would be decoded in
+    # full); it is larger on disk than Parquet.
+    chrom = pl.col("locus").str.extract(r"^(.+)_\d+_\d+$", 1).fill_null(pl.col("locus"))
+    start = pl.col("locus").str.extract(r"_(\d+)_\d+$", 1).cast(pl.Int64)
+    lf = (
+        scan_piawka(input_filename)
+        .with_columns(pl.col(CATEGORICAL).cast(pl.Categorical))
+        .sort([chrom, start, "locus"], nulls_last=True, maintain_order=True)
+    )
+    fmt = table_format(output_filename)
+    if fmt == "parquet":
+        lf.sink_parquet(output_filename, compression="zstd")
+    elif fmt == "arrow":
+        lf.sink_ipc(output_filename, compression="uncompressed")
+    else:
+        raise ValueError(f"Unsupported output format for {output_filename}")
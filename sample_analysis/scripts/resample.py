@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import polars as pl
+
+METHODS = ("none", "bootstrap", "jackknife")
+REPLICATES = 1000
+BLOCK_SIZE = 1_000_000
+LEVEL = 0.95
+
+# Bootstrap replicates drawn and evaluated together (replicates x blocks weights)
+REPLICATE_BATCH = 256
+
+
+def add_arguments(parser):
+    # Command-line options shared by the genome-wide aggregation scripts
+    parser.add_argument(
+        "-c",
+        "--ci",
+        help="Confidence intervals: locus-block bootstrap, leave-one-chromosome-out jackknife, or none (default none)",
+        choices=METHODS,
+        default="none",
+    )
+    parser.add_argument(
+        "-r",
+        "--replicates",
+        help=f"Bootstrap replicates (default {REPLICATES})",
+        type=int,
+        default=REPLICATES,
+    )
+    parser.add_argument(
+        "-b",
+        "--block-size",
+        help=f"Genomic block in bp resampled as a unit by the bootstrap; 0 resamples loci (default {BLOCK_SIZE})",
+        type=int,
+        default=BLOCK_SIZE,
+    )
+    parser.add_argument(
+        "-l", "--level", help=f"Confidence level (default {LEVEL})", type=float, default=LEVEL
+    )
+    parser.add_argument("--seed", help="Bootstrap random seed", type=int, default=None)
+    parser.add_argument(
+        "-t", "--threads", help="Threads running bootstrap batches (default 1)", type=int, default=1
+    )
+
+
+def block_expr(method, block_size):
+    # Resampling unit of each per-locus row (loci are named 'chr_start_end'):
+    # its chromosome for the jackknife, else its genomic block of 'block_size'
+    # bp, or the locus itself when block_size is 0
+    chrom = pl.col("locus").str.extract(r"^(.+)_\d+_\d+$", 1).fill_null(pl.col("locus"))
+    if method == "jackknife":
+        return chrom.alias("block")
+    if block_size > 0:
+        start = pl.col("locus").str.extract(r"_(\d+)_\d+$", 1).cast(pl.Int64).fill_null(0)
+        return pl.concat_str([chrom, (start // block_size).cast(pl.String)], separator=":").alias(
+            "block"
+        )
+    return pl.col("locus").alias("block")
+
+
+def _ratio(num, den):
+    # num / den, and 0 where nothing was compared (as in the point estimates)
+    return np.divide(num, den, out=np.zeros_like(num, dtype=float), where=den != 0)
+
+
+def block_matrices(blocks, keys, num, den):
+    # Dense blocks x groups matrices of the per-block numerator and
+    # denominator sums, and the groups (unique 'keys', sorted) they belong to
+    groups = blocks.select(keys).unique().sort(keys).with_row_index("g")
+    block_ids = blocks.select("block").unique().sort("block").with_row_index("b")
+    rows = blocks.join(groups, on=keys).join(block_ids, on="block")
+    shape = (block_ids.height, groups.height)
+    idx = (rows["b"].to_numpy(), rows["g"].to_numpy())
+    numerators = np.zeros(shape)
+    denominators = np.zeros(shape)
+    np.add.at(numerators, idx, rows[num].fill_null(0.0).to_numpy())
+    np.add.at(denominators, idx, rows[den].fill_null(0.0).to_numpy())
+    return groups.drop("g"), numerators, denominators
+
+
+def _bootstrap_batch(rng, n, numerators, denominators):
+    # Each replicate draws as many blocks as there are, with replacement; the
+    # draw counts weight the block sums in one matrix product per batch
+    n_blocks = numerators.shape[0]
+    weights = rng.multinomial(n_blocks, np.full(n_blocks, 1 / n_blocks), size=n).astype(float)
+    return _ratio(weights @ numerators, weights @ denominators)
+
+
+def bootstrap(numerators, denominators, replicates, level, seed=None, threads=1):
+    # Percentile intervals of sum(num) / sum(den) over block bootstrap replicates.
+    # Batches get independent child generators, so results do not depend on
+    # the number of threads.
+    sizes = [min(REPLICATE_BATCH, replicates - i) for i in range(0, replicates, REPLICATE_BATCH)]
+    rngs = np.random.default_rng(seed).spawn(len(sizes))
+    with ThreadPoolExecutor(max(1, threads)) as pool:
+        reps = np.vstack(
+            list(
+                pool.map(
+                    lambda job: _bootstrap_batch(job[0], job[1], numerators, denominators),
+                    zip(rngs, sizes),
+                )
+            )
+        )
+    alpha = (1 - level) / 2
+    low, high = np.quantile(reps, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def jackknife(numerators, denominators, level):
+    # Delete-one-block jackknife (blocks are chromosomes): normal intervals
+    # around the full estimate with the jackknife standard error
+    n_blocks = numerators.shape[0]
+    total_num = numerators.sum(axis=0)
+    total_den = denominators.sum(axis=0)
+    estimate = _ratio(total_num, total_den)
+    if n_blocks < 2:
+        return estimate, estimate
+    reps = _ratio(total_num - numerators, total_den - denominators)
+    se = np.sqrt((n_blocks - 1) / n_blocks * ((reps - reps.mean(axis=0)) ** 2).sum(axis=0))
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    return estimate - z * se, estimate + z * se
+
+
+def confidence_intervals(
+    blocks, keys, num, den, name, method, replicates=1000, level=0.95, seed=None, threads=1
+):
+    # '<name>_low' and '<name>_high' columns for every group of 'keys', from
+    # per-block sums of the 'num' and 'den' columns of 'blocks'
+    groups, numerators, denominators = block_matrices(blocks, keys, num, den)
+    if groups.height == 0:
+        low = high = np.zeros(0)
+    elif method == "bootstrap":
+        low, high = bootstrap(numerators, denominators, replicates, level, seed, threads)
+    elif method == "jackknife":
+        low, high = jackknife(numerators, denominators, level)
+    else:
+        raise ValueError(f"Unknown resampling method '{method}'")
+    return groups.with_columns(
+        pl.Series(f"{name}_low", low, dtype=pl.Float64),
+        pl.Series(f"{name}_high", high, dtype=pl.Float64),
+    )
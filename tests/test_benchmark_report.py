@@ -0,0 +1,116 @@
+import os
+
+HEADER = "s\th:m:s\tmax_rss\tmax_vms\tmax_uss\tmax_pss\tio_in\tio_out\tmean_load\tcpu_time\n"
+
+
+def write_benchmark(bench_dir, name, seconds, end, rss=100.0, cpu=None):
+    path = bench_dir / name
+    path.write_text(
+        HEADER
+        + f"{seconds}\t0:00:00\t{rss}\t0\t0\t0\t1.0\t2.0\t0\t{cpu if cpu is not None else seconds}\n"
+    )
+    os.utime(path, (end, end))
+
+
+def read_tsv(path):
+    lines = path.read_text().splitlines()
+    header = lines[0].split("\t")
+    return [dict(zip(header, line.split("\t"))) for line in lines[1:]]
+
+
+def test_report(tmp_path, load_module):
+    mod = load_module("benchmark_report", "sample_analysis/scripts/benchmark_report.py")
+    bench = tmp_path / "benchmarks"
+    bench.mkdir()
+    write_benchmark(bench, "gstacks.tsv", 10, 100)
+    write_benchmark(bench, "bcftools_call.S1.tsv", 5, 110, rss=50)
+    write_benchmark(bench, "bcftools_call.S2.tsv", 8, 112, rss=80)
+    write_benchmark(bench, "reheader.S2.tsv", 1, 113)
+    write_benchmark(bench, "bcftools_final_merge.tsv", 20, 135, cpu=40)
+    samples = tmp_path / "pop_index.txt"
+    samples.write_text("S1\tA\nS2\tB\n")
+
+    mod.benchmark_report(str(bench), str(samples))
+
+    stages = {row["stage"]: row for row in read_tsv(bench / "cost_by_stage.tsv")}
+    # Stages in order of their first job
+    assert list(stages) == ["gstacks", "bcftools_call", "reheader", "bcftools_final_merge"]
+    assert stages["bcftools_call"]["jobs"] == "2"
+    assert float(stages["bcftools_call"]["wall_s"]) == 13
+    assert float(stages["bcftools_call"]["max_rss_mb"]) == 80
+    assert float(stages["bcftools_final_merge"]["cpu_s"]) == 40
+
+    # The final merge (started at 115) waited on S2's chain, which waited on gstacks
+    path = read_tsv(bench / "cost_critical_path.tsv")
+    assert [(row["stage"], row["instance"]) for row in path] == [
+        ("gstacks", ""),
+        ("bcftools_call", "S2"),
+        ("reheader", "S2"),
+        ("bcftools_final_merge", ""),
+    ]
+    assert float(stages["bcftools_call"]["critical_s"]) == 8
+
+    by_sample = read_tsv(bench / "cost_by_sample.tsv")
+    assert [(row["sample"], row["jobs"], row["slowest_stage"]) for row in by_sample] == [
+        ("S2", "2", "bcftools_call"),
+        ("S1", "1", "bcftools_call"),
+    ]
+
+
+def test_scaling_across_cohort_sizes(tmp_path, load_module):
+    mod = load_module("benchmark_report", "sample_analysis/scripts/benchmark_report.py")
+    bench = tmp_path / "benchmarks"
+    bench.mkdir()
+    samples = tmp_path / "pop_index.txt"
+
+    # The merge costs 4x with 2x the samples: exponent 2
+    for n, merge_s in ((10, 5), (20, 20)):
+        for name in os.listdir(bench):
+            if not name.startswith("cost_"):
+                os.remove(bench / name)
+        write_benchmark(bench, "bcftools_final_merge.tsv", merge_s, 100)
+        samples.write_text("".join(f"S{k}\tA\n" for k in range(n)))
+        mod.benchmark_report(str(bench), str(samples))
+
+    scaling = read_tsv(bench / "cost_scaling.tsv")
+    assert scaling[0]["stage"] == "bcftools_final_merge"
+    assert scaling[0]["cohort_sizes"] == "10,20"
+    assert abs(float(scaling[0]["exponent"]) - 2) < 1e-9
+    assert float(scaling[0]["wall_s_per_sample"]) == 1.0
+    assert len(read_tsv(bench / "cost_history.tsv")) == 2
+
+
+def test_missing_directory(tmp_path, load_module):
+    mod = load_module("benchmark_report", "sample_analysis/scripts/benchmark_report.py")
+    samples = tmp_path / "pop_index.txt"
+    samples.write_text("S1\tA\n")
+    out = tmp_path / "out"
+    out.mkdir()
+
+    stages = mod.benchmark_report(str(tmp_path / "none"), str(samples), str(out))
+    assert stages.height == 0
+    assert (out / "cost_by_stage.tsv").exists()
+
+
+def test_only_this_run_and_persistent_history(tmp_path, load_module):
+    mod = load_module("benchmark_report", "sample_analysis/scripts/benchmark_report.py")
+    bench = tmp_path / "benchmarks"
+    bench.mkdir()
+    samples = tmp_path / "pop_index.txt"
+    samples.write_text("S1\tA\nS2\tB\n")
+    history = tmp_path / "cache" / "cost_history" / "sample_analysis.tsv"
+
+    write_benchmark(bench, "gstacks.tsv", 10, 100)
+    write_benchmark(bench, "bcftools_call.S1.tsv", 5, 110)
+    mod.benchmark_report(str(bench), str(samples), history_file=str(history), since=50)
+
+    # A partial rerun: gstacks.tsv is left over from the earlier run
+    write_benchmark(bench, "bcftools_call.S1.tsv", 7, 210)
+    stages = mod.benchmark_report(str(bench), str(samples), history_file=str(history), since=200)
+    assert stages["stage"].to_list() == ["bcftools_call"]
+    assert [row["stage"] for row in read_tsv(bench / "cost_critical_path.tsv")] == ["bcftools_call"]
+    # Stages the rerun skipped keep their row in the history
+    rows = {row["stage"]: row for row in read_tsv(history)}
+    assert float(rows["gstacks"]["wall_s"]) == 10
+    assert float(rows["bcftools_call"]["wall_s"]) == 7
+    assert not (bench / "cost_history.tsv").exists()
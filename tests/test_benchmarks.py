@@ -0,0 +1,32 @@
+import gzip
+import json
+
+import run_benchmarks
+import synthetic
+
+
+def test_synthetic_data(tmp_path):
+    paths = synthetic.generate(str(tmp_path), n_loci=50, n_samples=4, n_populations=2)
+
+    with gzip.open(paths["catalog"], "rt") as f:
+        headers = [line for line in f if line.startswith(">")]
+    assert len(headers) == 50
+    with gzip.open(paths["merged_vcf"], "rt") as f:
+        lines = f.read().splitlines()
+    assert lines[2].split("\t")[9:] == ["S1", "S2", "S3", "S4"]
+    assert len(lines) == 3 + 50 * 5
+    with gzip.open(paths["sample_vcf"], "rt") as f:
+        assert f.read().splitlines()[2].endswith("\t00-reads/S1.bam")
+    het = [line.split("\t") for line in open(paths["het"]).read().splitlines()]
+    assert len(het) == 50 * 4 and all(len(row) == 9 for row in het)
+
+
+def test_every_stage_runs(tmp_path):
+    # Every stage on tiny data, in this process (the CLI runs each in its own)
+    paths = synthetic.generate(str(tmp_path), n_loci=50, n_samples=4, n_populations=2)
+    (tmp_path / "paths.json").write_text(json.dumps(paths))
+
+    for stage in run_benchmarks.STAGES:
+        result = run_benchmarks.run_stage(stage, str(tmp_path))
+        assert result["seconds"] >= 0
+        assert result["peak_rss_mb"] >= result["base_rss_mb"] > 0
@@ -0,0 +1,114 @@
+import gzip
+import struct
+
+import bgzf
+import pytest
+
+
+def test_compress_roundtrip_and_block_reader(tmp_path):
+    data = b"".join(f"line {i}\n".encode() for i in range(50000))
+    path = tmp_path / "x.gz"
+    path.write_bytes(bgzf.compress(data) + bgzf.EOF_BLOCK)
+
+    assert bgzf.is_bgzf(str(path))
+    assert gzip.decompress(path.read_bytes()) == data
+    with open(path, "rb") as f:
+        blocks = list(bgzf.iter_blocks(f))
+    assert blocks[-1] == bgzf.EOF_BLOCK
+    assert b"".join(bgzf.decompress_block(b) for b in blocks) == data
+    assert all(len(bgzf.decompress_block(b)) <= bgzf.BLOCK_SIZE for b in blocks)
+
+
+def test_bgzf_writer_parallel_matches_serial(tmp_path):
+    data = b"".join(f"chr1\t{i}\t.\tA\tG\n".encode() for i in range(100000))
+    for threads in (1, 3):
+        with bgzf.BgzfWriter(str(tmp_path / f"out{threads}.gz"), threads=threads) as w:
+            for i in range(0, len(data), 7777):
+                w.write(data[i : i + 7777])
+    serial = (tmp_path / "out1.gz").read_bytes()
+    assert (tmp_path / "out3.gz").read_bytes() == serial
+    assert gzip.decompress(serial) == data
+
+
+def test_reg2bin_matches_htslib():
+    # Values from htslib's hts_reg2bin with min_shift=14, depth=6
+    assert bgzf.reg2bin(0, 1, 14, 6) == 37449
+    assert bgzf.reg2bin(16384, 16385, 14, 6) == 37450
+    assert bgzf.reg2bin(0, 16385, 14, 6) == 4681
+    assert bgzf.reg2bin(0, 1 << 32, 14, 6) == 0
+    assert bgzf.bin_first_window(37450, 6) == 1
+    assert bgzf.bin_first_window(4682, 6) == 8
+
+
+def test_vcf_writer_builds_csi_index(tmp_path):
+    header = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\n"
+    body = "".join(
+        f"{c}\t{p}\t.\tA\tG\t.\t.\t.\tGT\t0/1\n" for c in ("chr1", "chr2") for p in (5, 70000)
+    )
+    path = tmp_path / "out.vcf.gz"
+    with bgzf.VcfWriter(str(path)) as w:
+        w.write_header(header)
+        w.write_records(body)
+
+    assert gzip.decompress(path.read_bytes()).decode() == header + body
+    csi = gzip.decompress((tmp_path / "out.vcf.gz.csi").read_bytes())
+    assert csi[:4] == b"CSI\1"
+    min_shift, depth, l_aux = struct.unpack("<3i", csi[4:16])
+    assert (min_shift, depth) == (14, 6)
+    aux = csi[16 : 16 + l_aux]
+    assert struct.unpack("<7i", aux[:28]) == (2, 1, 2, 0, ord("#"), 0, 10)
+    assert aux[28:] == b"chr1\0chr2\0"
+    assert struct.unpack("<i", csi[16 + l_aux : 20 + l_aux]) == (2,)
+
+
+def test_parallel_reader_matches_serial(tmp_path):
+    header = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\n"
+    body = "".join(f"chr1\t{i}\t.\tA\tG\t.\t.\t.\tGT\t0/1\n" for i in range(1, 60000))
+    data = (header + body).encode()
+    path = tmp_path / "in.vcf.gz"
+    path.write_bytes(bgzf.compress(data) + bgzf.EOF_BLOCK)
+
+    for threads in (1, 4):
+        chunks = list(bgzf.read_chunks(str(path), threads=threads, chunk_size=100_000))
+        assert b"".join(chunks) == data
+        assert len(chunks) > 1 and all(c.endswith(b"\n") for c in chunks)
+        assert all(len(c) >= 100_000 for c in chunks[:-1])
+
+        meta, names, records = bgzf.read_vcf(str(path), threads=threads, chunk_size=100_000)
+        assert meta == "##fileformat=VCFv4.2\n"
+        assert names[-1] == "A"
+        assert b"".join(records) == body.encode()
+
+
+def test_reader_plain_gzip_and_text(tmp_path):
+    text = "##x\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\nchr1\t1\n"
+    (tmp_path / "in.vcf.gz").write_bytes(gzip.compress(text.encode()))
+    (tmp_path / "in.vcf").write_text(text)
+
+    for name, compressed in (("in.vcf.gz", True), ("in.vcf", False)):
+        meta, names, records = bgzf.read_vcf(str(tmp_path / name), chunk_size=1, gzip=compressed)
+        assert meta == "##x\n" and names[0] == "#CHROM"
+        assert list(records) == [b"chr1\t1\n"]
+
+    (tmp_path / "none.vcf").write_text("##x\n")
+    with pytest.raises(ValueError, match="No #CHROM line"):
+        bgzf.read_vcf(str(tmp_path / "none.vcf"), gzip=False)
+
+
+def test_reader_closed_before_its_end(tmp_path, monkeypatch):
+    header = "##x\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\n"
+    body = "".join(f"chr1\t{i}\n" for i in range(1, 60000))
+    path = tmp_path / "in.vcf.gz"
+    path.write_bytes(bgzf.compress((header + body).encode()) + bgzf.EOF_BLOCK)
+    opened = []
+
+    def tracked_open(*args, **kwargs):
+        opened.append(open(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(bgzf, "open", tracked_open, raising=False)
+    for threads in (1, 4):
+        with bgzf.read_vcf(str(path), threads=threads, chunk_size=1000)[2] as records:
+            next(records)
+        assert opened and all(f.closed for f in opened)
+        opened.clear()
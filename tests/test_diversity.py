@@ -0,0 +1,123 @@
+import gzip
+
+import genotype_store
+import piawka_io
+import polars as pl
+import pytest
+
+HEADER = (
+    "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ts1\ts2\ts3\ts4\n"
+)
+
+RECORDS = [
+    # Invariant site
+    "chr1\t101\t.\tA\t.\t.\t.\t.\tGT\t0/0\t0/0\t0/0\t0/0",
+    "chr1\t102\t.\tA\tC\t.\t.\t.\tGT:DP\t0/1:3\t0/0:3\t1/1:3\t1|1:3",
+    # Indel: skipped
+    "chr1\t103\t.\tAT\tA\t.\t.\t.\tGT\t0/1\t0/1\t0/1\t0/1",
+    # Outside every locus
+    "chr1\t200\t.\tA\tC\t.\t.\t.\tGT\t0/1\t0/1\t0/1\t0/1",
+    # Multi-allelic with a missing genotype
+    "chr1\t305\t.\tA\tC,G\t.\t.\t.\tGT\t1/2\t./.\t0/0\t0/2",
+    "chr2\t5\t.\tA\tC\t.\t.\t.\tGT\t0/1\t0/1\t0/1\t0/1",
+]
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    vcf = tmp_path / "all_merged_filtered.vcf.gz"
+    with gzip.open(vcf, "wt") as f:
+        f.write(HEADER + "\n".join(RECORDS) + "\n")
+    bed = tmp_path / "catalog_sorted_merged.bed"
+    bed.write_text("chr1\t100\t110\nchr1\t300\t310\n")
+    groups = tmp_path / "pop_index.txt"
+    groups.write_text("s1\tA\ns2\tA\ns3\tB\ns4\tB\n")
+    return vcf, bed, groups
+
+
+def read_rows(path):
+    return [line.split("\t") for line in path.read_text().splitlines()]
+
+
+def test_pi_dxy_fst(tmp_path, inputs, load_module):
+    mod = load_module("diversity", "sample_analysis/scripts/03_diversity.py")
+    vcf, bed, groups = inputs
+    out = tmp_path / "piawka_pi_dxy_fst.tsv"
+
+    mod.diversity(str(vcf), str(bed), str(out), groups_file=str(groups), fst=True)
+
+    rows = read_rows(out)
+    # locus 1: pi A = 3/12, pi B = 0/12, dxy = 12/32, Fst = 1 - 0.125/0.375
+    # locus 2: pi A = 1/1 (one genotype called), pi B = 3/6, dxy = 7/8
+    assert [(r[0], r[2], r[3], r[5], r[7], r[8]) for r in rows] == [
+        ("chr1_100_110", "A", ".", "pi", "3.0", "12.0"),
+        ("chr1_100_110", "B", ".", "pi", "0.0", "12.0"),
+        ("chr1_100_110", "A", "B", "Dxy", "12.0", "32.0"),
+        ("chr1_100_110", "A", "B", "Fst_HUD", "0.25", "0.375"),
+        ("chr1_300_310", "A", ".", "pi", "1.0", "1.0"),
+        ("chr1_300_310", "B", ".", "pi", "3.0", "6.0"),
+        ("chr1_300_310", "A", "B", "Dxy", "7.0", "8.0"),
+        ("chr1_300_310", "A", "B", "Fst_HUD", "0.125", "0.875"),
+    ]
+    assert float(rows[3][6]) == pytest.approx(2 / 3)
+    # nSites, nUsed, nGenotypes and nMissing
+    assert rows[0][1] == "2" and rows[0][4] == "2" and rows[0][9:] == ["4", "0"]
+    assert rows[4][1] == "1" and rows[4][9:] == ["1", "1"]
+
+
+def test_batches_match(tmp_path, inputs, load_module):
+    mod = load_module("diversity", "sample_analysis/scripts/03_diversity.py")
+    vcf, bed, groups = inputs
+    whole = tmp_path / "whole.tsv"
+    mod.diversity(str(vcf), str(bed), str(whole), groups_file=str(groups), fst=True)
+
+    # Loci split across batches give the same rows
+    for batch_size in (1, 2, 3):
+        out = tmp_path / f"batch{batch_size}.tsv"
+        mod.diversity(
+            str(vcf), str(bed), str(out), groups_file=str(groups), fst=True, batch_size=batch_size
+        )
+        assert out.read_text() == whole.read_text()
+
+
+def test_het_is_readable(tmp_path, inputs, load_module):
+    mod = load_module("diversity", "sample_analysis/scripts/03_diversity.py")
+    vcf, bed, _groups = inputs
+    out = tmp_path / "piawka_het.tsv"
+
+    mod.diversity(str(vcf), str(bed), str(out), het=True)
+
+    rows = read_rows(out)
+    assert all(len(r) == 9 and r[5] == "het" for r in rows)
+    # s2 has no genotype at the second locus
+    assert [(r[0], r[2], r[7], r[8]) for r in rows if r[0] == "chr1_300_310"] == [
+        ("chr1_300_310", "s1", "1.0", "1.0"),
+        ("chr1_300_310", "s3", "0.0", "1.0"),
+        ("chr1_300_310", "s4", "1.0", "1.0"),
+    ]
+    table = piawka_io.scan_piawka(str(out)).collect()
+    assert table.height == 7
+    assert table.filter(pl.col("pop1") == "s1")["value"].to_list() == [0.5, 1.0]
+
+
+@pytest.mark.parametrize("het", [False, True])
+def test_genotype_store_matches_vcf(tmp_path, inputs, load_module, het):
+    mod = load_module("diversity", "sample_analysis/scripts/03_diversity.py")
+    vcf, bed, groups = inputs
+    store = tmp_path / "all_merged_filtered.gt"
+    genotype_store.build_store(str(vcf), str(bed), str(store))
+
+    # The store is read in place of the VCF (with its own copy of the BED)
+    from_vcf = tmp_path / "vcf.tsv"
+    from_store = tmp_path / "store.tsv"
+    for path, out in ((vcf, from_vcf), (store, from_store)):
+        mod.diversity(str(path), str(bed), str(out), groups_file=str(groups), het=het, fst=True)
+    assert from_store.read_text() == from_vcf.read_text()
+    assert from_vcf.read_text()
+
+    # In batches too
+    batched = tmp_path / "batched.tsv"
+    mod.diversity(
+        str(store), str(bed), str(batched), groups_file=str(groups), het=het, fst=True, batch_size=2
+    )
+    assert batched.read_text() == from_vcf.read_text()
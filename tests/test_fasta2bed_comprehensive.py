@@ -62,3 +62,88 @@ def test_fasta2bed_single_base(tmp_path, load_module):
 
     lines = output_path.read_text().strip().splitlines()
     assert lines[0] == "chr1\t99\t101"
+
+
+def test_fasta2bed_sorted_merged_matches_sort_merge_chain(tmp_path, load_module):
+    """Test in-process sort/merge against a reference sortBed | mergeBed chain."""
+    import gzip
+
+    mod = load_module("fasta2bed", "sample_analysis/scripts/01_fasta2bed.py")
+    fasta_path = tmp_path / "catalog.fa.gz"
+
+    content = (
+        ">1 pos=chr2:100+\nACGT\n"  # chr2 99-104
+        ">2 pos=chr1:300+\nACG\n"  # chr1 299-303
+        ">3 pos=chr1:10+\nACGTACGT\n"  # chr1 9-18
+        ">4 pos=chr1:20-\nAAAA\n"  # chr1 16-21, overlaps locus 3
+        ">5 pos=chr1:22+\nA\n"  # chr1 21-23, book-ended with locus 4
+        ">6 pos=chr10:5+\nAC\n"  # chr10 4-7, sorts before chr2
+    )
+    with gzip.open(fasta_path, "wt") as f:
+        f.write(content)
+
+    output_path = tmp_path / "out.bed"
+    # A chunk size of 2 forces several sorted runs to be spilled and merged back
+    mod.fasta2bed_sorted_merged(str(fasta_path), str(output_path), chunk_size=2)
+
+    assert output_path.read_text().splitlines() == [
+        "chr1\t9\t23",
+        "chr1\t299\t303",
+        "chr10\t4\t7",
+        "chr2\t99\t104",
+    ]
+    # Spilled runs are cleaned up
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["catalog.fa.gz", "out.bed"]
+
+
+def test_fasta2bed_sorted_merged_empty_input(tmp_path, load_module):
+    """Test in-process sort/merge with empty gzip file."""
+    import gzip
+
+    mod = load_module("fasta2bed", "sample_analysis/scripts/01_fasta2bed.py")
+    fasta_path = tmp_path / "empty.fa.gz"
+
+    with gzip.open(fasta_path, "wt") as f:
+        f.write("")
+
+    output_path = tmp_path / "out.bed"
+    mod.fasta2bed_sorted_merged(str(fasta_path), str(output_path))
+
+    assert output_path.read_text() == ""
+
+
+def test_fasta2bed_parallel_matches_serial(tmp_path, load_module, monkeypatch):
+    """Test that chunked multi-process parsing gives byte-identical output."""
+    import gzip
+    import sys
+
+    mod = load_module("fasta2bed", "sample_analysis/scripts/01_fasta2bed.py")
+    # Worker processes look the parse function up by module name
+    monkeypatch.setitem(sys.modules, "fasta2bed", mod)
+    monkeypatch.setattr(mod, "CHUNK_BYTES", 64)
+    fasta_path = tmp_path / "catalog.fa.gz"
+
+    records = []
+    for i in range(200):
+        strand = "-" if i % 3 == 0 else "+"
+        records.append(f">{i} pos=chr{i % 4}:{1000 + 37 * i}{strand}\n{'ACGT' * (1 + i % 5)}\n")
+    with gzip.open(fasta_path, "wt") as f:
+        f.write("".join(records))
+
+    # Record-aligned chunks cover the catalog exactly once
+    chunks = list(mod.iter_chunks(str(fasta_path), chunk_bytes=64))
+    assert len(chunks) > 1
+    assert all(c.startswith(b">") for c in chunks)
+    assert b"".join(chunks) == gzip.decompress(fasta_path.read_bytes())
+
+    serial = tmp_path / "serial.bed"
+    parallel = tmp_path / "parallel.bed"
+    mod.fasta2bed(str(fasta_path), str(serial))
+    mod.fasta2bed(str(fasta_path), str(parallel), threads=2)
+    assert parallel.read_bytes() == serial.read_bytes()
+
+    serial = tmp_path / "serial_merged.bed"
+    parallel = tmp_path / "parallel_merged.bed"
+    mod.fasta2bed_sorted_merged(str(fasta_path), str(serial))
+    mod.fasta2bed_sorted_merged(str(fasta_path), str(parallel), threads=2)
+    assert parallel.read_bytes() == serial.read_bytes()
@@ -60,3 +60,71 @@ def test_filter_singletons_no_positions_returns_false(tmp_path, load_module):
     changed = mod.filter_singletons_vcf(str(vcf), str(out), str(singletons), "C", gzip=True)
     assert changed is False
     assert not out.exists()
+
+
+def test_filter_singletons_writes_bgzf_and_csi(tmp_path, load_module):
+    mod = load_module("filter_singletons", "sample_analysis/scripts/02_filter_singletons.py")
+
+    vcf = tmp_path / "input.vcf.gz"
+    out = tmp_path / "output.vcf.gz"
+    singletons = tmp_path / "singletons.tsv"
+
+    header = (
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA.bam\tB.bam\n"
+    )
+    rows = [
+        "chr1\t10\t.\tA\tG\t.\t.\t.\tGT\t0/1\t0/0\n",
+        "chr1\t20\t.\tC\tT\t.\t.\t.\tGT\t0/0\t0/1\n",
+    ]
+    write_gz(vcf, header + "".join(rows))
+    singletons.write_text(
+        "CHROM\tPOS\tINDV\tALLELE\tSINGLETON/DOUBLETON\nchr1\t10\tA\tG\tsingleton\n"
+    )
+
+    changed = mod.filter_singletons_vcf(
+        str(vcf), str(out), str(singletons), "A", gzip=True, bgzip=True, threads=2
+    )
+    assert changed is True
+
+    # Output is BGZF (readable as gzip) with a CSI index next to it
+    out_lines = gzip.decompress(out.read_bytes()).decode().splitlines()
+    assert out_lines[1] == "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\tB"
+    assert out_lines[2:] == ["chr1\t20\t.\tC\tT\t.\t.\t.\tGT\t0/0\t0/1"]
+    assert gzip.decompress((tmp_path / "output.vcf.gz.csi").read_bytes())[:4] == b"CSI\1"
+
+
+def test_filter_singletons_streams_in_batches(tmp_path, load_module):
+    mod = load_module("filter_singletons", "sample_analysis/scripts/02_filter_singletons.py")
+
+    vcf = tmp_path / "input.vcf.gz"
+    out = tmp_path / "output.vcf"
+    singletons = tmp_path / "singletons.tsv"
+
+    header = (
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA.bam\tB.bam\n"
+    )
+    rows = [
+        "chr1\t10\t.\tA\tG\t50\t.\tDP=3\tGT\t0/1\t0/0\n",
+        'chr1\t20\t.\tC\tT\t49.5\t.\tNOTE="x"\tGT\t0/0\t0/1\n',
+        "chr2\t10\t.\tA\tG\t50\t.\t.\tGT\t0/1\t0/0\n",
+        "chr2\t30\t.\tG\tA\t1e3\t.\t.\tGT\t0/1\t0/0\n",
+    ]
+    write_gz(vcf, header + "".join(rows))
+    singletons.write_text(
+        "CHROM\tPOS\tINDV\tALLELE\tSINGLETON/DOUBLETON\n"
+        "chr2\t10\tA\tG\tsingleton\n"
+        "chr1\t10\tA\tG\tsingleton\n"
+        "chr1\t20\tB\tT\tsingleton\n"  # belongs to another individual
+    )
+
+    # One record per chunk: every chunk is anti-joined on its own
+    changed = mod.filter_singletons_vcf(
+        str(vcf), str(out), str(singletons), "A", gzip=True, chunk_size=1
+    )
+    assert changed is True
+
+    # Kept records are written back untouched and in input order
+    out_lines = out.read_text().splitlines(keepends=True)
+    assert out_lines[2:] == [rows[1], rows[3]]
@@ -26,3 +26,40 @@ def test_parse_piawka_het_writes_aggregated_table(tmp_path, load_module):
     assert rows["PopA"] == ["3.0", "30.0", "0.1"]
     # PopB: numerator=3, denominator=30, het=0.1
     assert rows["PopB"] == ["3.0", "30.0", "0.1"]
+
+
+def test_parse_piawka_het_zero_denominator_and_missing_values(tmp_path, load_module):
+    mod = load_module("piawka_het", "sample_analysis/scripts/03_genomic_piawka_het.py")
+
+    infile = tmp_path / "piawka_het.tsv"
+    lines = [
+        "locus1\t10\tPopB\tX\t10\thet\t0\t0\t0\tfoo\tbar\n",
+        "locus2\t20\tPopA\tX\t20\thet\tNA\tNA\t20\tfoo\tbar\n",
+        "locus3\t30\tPopA\tX\t30\thet\t0.1\t3\t30\n",
+    ]
+    infile.write_text("".join(lines))
+
+    mod.parse_piawka_het(str(infile), "")
+
+    text = (tmp_path / "genomic_het_table.tsv").read_text().strip().splitlines()
+    # Rows sorted by individual; missing values count as 0, het is 0 without sites
+    assert text[1:] == ["PopA\t3.0\t50.0\t0.06", "PopB\t0.0\t0.0\t0.0"]
+
+
+def test_parse_piawka_het_confidence_intervals(tmp_path, load_module):
+    mod = load_module("piawka_het", "sample_analysis/scripts/03_genomic_piawka_het.py")
+
+    infile = tmp_path / "piawka_het.tsv"
+    lines = [
+        f"chr{c}_{i * 1000}_{i * 1000 + 100}\t100\tPopA\t.\t100\thet\t0\t{(i + c) % 4}\t100\n"
+        for c in range(3)
+        for i in range(20)
+    ]
+    infile.write_text("".join(lines))
+
+    mod.parse_piawka_het(str(infile), "", ci="bootstrap", replicates=200, block_size=5000, seed=1)
+
+    text = (tmp_path / "genomic_het_table.tsv").read_text().strip().splitlines()
+    assert text[0].split("\t") == ["pop1", "numerator", "denominator", "het", "het_low", "het_high"]
+    _pop, _num, _den, het, low, high = text[1].split("\t")
+    assert float(low) < float(het) < float(high)
@@ -1,3 +1,6 @@
+import piawka_io
+
+
 def parse_tsv(path):
     lines = [line for line in path.read_text().splitlines() if line]
     header = lines[0].split("\t")
@@ -71,3 +74,74 @@ def test_parse_piawka_dxy_outputs_tables_and_matrices(tmp_path, load_module):
     assert "PopB" in h2
     mrow = next(r for r in fstM_rows if r[h2[0]] == "PopA")
     assert abs(float(mrow["PopB"]) - 0.3) < 1e-9
+
+
+def test_parse_piawka_dxy_batches_match_single_pass(tmp_path, load_module):
+    mod = load_module(
+        "piawka_dxy",
+        "population_analysis/scripts/04_genomic_piawka_pi_dxy_fst.py",
+    )
+
+    rows = [
+        f"l{i}\t10\t{p1}\t{p2}\t10\t{metric}\t{0.05 * (i % 7)}\t{i % 3}\t10\t5\t0\n"
+        for i in range(40)
+        for p1, p2, metric in [
+            ("PopA", "PopA", "pi"),
+            ("PopA", "PopB", "Dxy"),
+            ("PopA", "PopB", "Fst_HUD"),
+            ("PopA", "PopC", "Fst_HUD"),
+        ]
+    ]
+    # Loci without an Fst estimate do not count towards its mean and std
+    rows.append("l40\t10\tPopA\tPopB\t10\tFst_HUD\tNA\t0\t0\t5\t0\n")
+    outputs = []
+    for name, batch_size in [("single", 1000), ("batched", 7)]:
+        wdir = tmp_path / name
+        wdir.mkdir()
+        (wdir / "piawka.tsv").write_text("".join(rows))
+        mod.parse_piawka_dxy(str(wdir / "piawka.tsv"), batch_size=batch_size)
+        outputs.append({p.name: parse_tsv(p) for p in wdir.glob("genomic_*.tsv")})
+
+    single, batched = outputs
+    assert single.keys() == batched.keys() and len(single) == 5
+    for name, (header, rows_single) in single.items():
+        assert batched[name][0] == header
+        for a, b in zip(rows_single, batched[name][1]):
+            for key in header:
+                if key in ("pop1", "pop2"):
+                    assert a[key] == b[key]
+                else:
+                    assert abs(float(a[key]) - float(b[key])) < 1e-12
+
+    # Matrix columns are the pop2 populations; cells hold the mean Fst
+    header, matrix_rows = single["genomic_fst_matrix.tsv"]
+    assert header == ["pop1", "PopB", "PopC"]
+    values = [0.05 * (i % 7) for i in range(40)]
+    mean = sum(values) / len(values)
+    assert abs(float(matrix_rows[0]["PopB"]) - mean) < 1e-12
+
+
+def test_parse_piawka_dxy_reads_parquet(tmp_path, load_module):
+    mod = load_module(
+        "piawka_dxy",
+        "population_analysis/scripts/04_genomic_piawka_pi_dxy_fst.py",
+    )
+
+    rows = [
+        "chr1_1_100\t10\tPopA\tPopA\t10\tpi\t0.1\t2\t20\t5\t0\n",
+        "chr1_200_300\t10\tPopA\tPopB\t10\tDxy\t0.1\t4\t40\t5\t0\n",
+        "chr1_200_300\t10\tPopA\tPopB\t10\tFst_HUD\t0.2\t0\t0\t5\t0\n",
+    ]
+    outputs = []
+    for name in ("tsv", "parquet"):
+        wdir = tmp_path / name
+        wdir.mkdir()
+        (wdir / "piawka.tsv").write_text("".join(rows))
+        infile = str(wdir / "piawka.tsv")
+        if name == "parquet":
+            piawka_io.convert_piawka(infile, str(wdir / "piawka.parquet"))
+            infile = str(wdir / "piawka.parquet")
+        mod.parse_piawka_dxy(infile)
+        outputs.append({p.name: p.read_text() for p in wdir.glob("genomic_*.tsv")})
+
+    assert len(outputs[0]) == 5 and outputs[0] == outputs[1]
@@ -0,0 +1,68 @@
+import gzip
+
+import genotype_store
+import numpy as np
+import pytest
+
+HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ts1\ts2\n"
+
+RECORDS = [
+    "chr1\t101\t.\tA\t.\t.\t.\t.\tGT:DP\t0/0:12\t0/0:.",
+    "chr1\t105\t.\tA\tC,G\t.\t.\t.\tGT:DP\t1/2:20\t./.:0",
+    # Indel and a site outside every locus
+    "chr1\t106\t.\tAT\tA\t.\t.\t.\tGT\t0/1\t0|1",
+    "chr1\t200\t.\tA\tC\t.\t.\t.\tGT:AD:DP\t0/1:3,4:7\t1:8,0:8",
+    "chr2\t5\t.\tA\tC\t.\t.\t.\tGT:DP\t1|1:70000\t0/1:3",
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    vcf = tmp_path / "all_merged_filtered.vcf.gz"
+    with gzip.open(vcf, "wt") as f:
+        f.write(HEADER + "\n".join(RECORDS) + "\n")
+    # chr3 has no sites
+    bed = tmp_path / "catalog_sorted_merged.bed"
+    bed.write_text("chr1\t100\t110\nchr2\t0\t10\nchr3\t0\t10\n")
+    store_dir = tmp_path / "all_merged_filtered.gt"
+    genotype_store.build_store(str(vcf), str(bed), str(store_dir), batch_size=2)
+    return store_dir
+
+
+def test_store_arrays(store):
+    meta, arrays = genotype_store.open_store(str(store))
+
+    assert meta["samples"] == ["s1", "s2"] and meta["chroms"] == ["chr1", "chr2"]
+    assert meta["n_sites"] == 5 and meta["n_loci"] == 3
+    assert isinstance(arrays["gt"], np.memmap)
+    assert arrays["pos"].tolist() == [101, 105, 106, 200, 5]
+    assert arrays["chrom"].tolist() == [0, 0, 0, 0, 1]
+    assert arrays["snp"].tolist() == [True, True, False, True, True]
+    assert arrays["locus"].tolist() == [0, 0, 0, -1, 1]
+    # Sites [first, end) of each BED locus, aligned to loci.bed
+    assert arrays["locus_sites"].tolist() == [[0, 3], [4, 5], [0, 0]]
+    assert (store / "loci.bed").read_text().startswith("chr1\t100\t110\n")
+
+    # DP wherever FORMAT puts it, 0 when missing, capped at 65535
+    assert arrays["dp"].tolist() == [[12, 0], [20, 0], [0, 0], [7, 8], [65535, 3]]
+    genotypes = genotype_store.unpack(arrays["gt"][:])
+    assert genotypes[1].tolist() == [[1, 2], [-1, -1]]
+    # Haploid calls keep a missing second allele, as the VCF parser reads them
+    assert genotypes[3].tolist() == [[0, 1], [1, -1]]
+
+
+def test_pack_round_trip():
+    genotypes = np.array([[[0, 14], [-1, 3]], [[2, -1], [-1, -1]]], dtype=np.int16)
+    packed = genotype_store.pack(genotypes)
+    assert packed.dtype == np.uint8
+    assert np.array_equal(genotype_store.unpack(packed), genotypes)
+
+    with pytest.raises(ValueError, match="cannot be packed"):
+        genotype_store.pack(np.array([[[15, 0]]]))
+
+
+def test_incomplete_store(tmp_path, store):
+    (store / "meta.json").unlink()
+    assert not genotype_store.is_store(str(store))
+    with pytest.raises(ValueError, match="not a complete genotype store"):
+        genotype_store.open_store(str(store))
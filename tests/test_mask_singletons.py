@@ -0,0 +1,52 @@
+import gzip
+from pathlib import Path
+
+
+def write_gz(path: Path, text: str):
+    with gzip.open(path, "wt") as f:
+        f.write(text)
+
+
+def test_mask_singletons_sets_flagged_genotypes_missing(tmp_path, load_module):
+    mod = load_module("mask_singletons", "sample_analysis/scripts/02_mask_singletons.py")
+
+    vcf = tmp_path / "all_merged.vcf.gz"
+    out = tmp_path / "all_merged_filtered.vcf.gz"
+    singletons = tmp_path / "all_merged.singletons"
+
+    header = (
+        "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\tB\tC\n"
+    )
+    rows = [
+        "chr1\t10\t.\tA\tG\t50\t.\t.\tGT:DP\t0/1:20\t0/0:18\t0/0:30\n",
+        "chr1\t20\t.\tC\tT\t50\t.\t.\tGT:DP\t0/0:20\t1/1:18\t0/0:30\n",
+        "chr1\t30\t.\tC\tT\t50\t.\t.\tGT:DP\t0/0:20\t0/0:18\t0/0:30\n",
+        # Only A was called here: masking A leaves no genotype, so the record goes
+        "chr2\t5\t.\tG\tA\t50\t.\t.\tGT:DP\t0/1:20\t./.:.\t./.:.\n",
+    ]
+    write_gz(vcf, header + "".join(rows))
+    singletons.write_text(
+        "CHROM\tPOS\tSINGLETON/DOUBLETON\tALLELE\tINDV\n"
+        "chr1\t10\tS\tG\tA\n"
+        "chr1\t20\tD\tT\tB\n"
+        "chr2\t5\tS\tA\tA\n"
+    )
+
+    assert mod.mask_singletons_vcf(str(vcf), str(out), str(singletons), gzip=True) is True
+
+    lines = gzip.decompress(out.read_bytes()).decode().splitlines()
+    assert lines[1] == "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\tB\tC"
+    assert lines[2:] == [
+        "chr1\t10\t.\tA\tG\t50\t.\t.\tGT:DP\t./.:.\t0/0:18\t0/0:30",
+        "chr1\t20\t.\tC\tT\t50\t.\t.\tGT:DP\t0/0:20\t./.:.\t0/0:30",
+        rows[2].rstrip("\n"),
+    ]
+    assert (tmp_path / "all_merged_filtered.vcf.gz.csi").exists()
+
+
+def test_missing_genotype_keeps_ploidy_and_phasing(load_module):
+    mod = load_module("mask_singletons", "sample_analysis/scripts/02_mask_singletons.py")
+
+    assert mod.missing_genotype("0/1:20:99", 3) == "./.:.:."
+    assert mod.missing_genotype("0|1", 1) == ".|."
+    assert mod.missing_genotype("1", 1) == "."
@@ -0,0 +1,47 @@
+def _write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def test_coalesce_joins_nearby_loci(load_module):
+    mod = load_module("mpileup_regions", "sample_analysis/scripts/01_mpileup_regions.py")
+    loci = [("chr1", 0, 100), ("chr1", 150, 250), ("chr1", 1000, 1100), ("chr2", 0, 10)]
+    assert list(mod.coalesce(loci, max_gap=50)) == [
+        ("chr1", 0, 250),
+        ("chr1", 1000, 1100),
+        ("chr2", 0, 10),
+    ]
+
+
+def test_plan_access_sparse_catalog_uses_windows(tmp_path, load_module):
+    mod = load_module("mpileup_regions", "sample_analysis/scripts/01_mpileup_regions.py")
+    bed = _write(tmp_path / "catalog.bed", "chr1\t0\t100\nchr1\t150\t250\nchr1\t90000\t90100\n")
+    fai = _write(tmp_path / "reference.fa.fai", "chr1\t1000000\t6\t60\t61\n")
+    windows = str(tmp_path / "windows.bed")
+
+    strategy, options = mod.plan_access(bed, fai, windows, max_gap=1000)
+
+    assert strategy == "windows"
+    assert options == f"-R {windows} -T {bed}"
+    assert open(windows).read() == "chr1\t0\t250\nchr1\t90000\t90100\n"
+
+
+def test_plan_access_dense_catalog_streams(tmp_path, load_module):
+    mod = load_module("mpileup_regions", "sample_analysis/scripts/01_mpileup_regions.py")
+    bed = _write(tmp_path / "catalog.bed", "chr1\t0\t100\nchr1\t500\t600\nchr1\t900\t1000\n")
+    fai = _write(tmp_path / "reference.fa.fai", "chr1\t1000\t6\t60\t61\n")
+
+    strategy, options = mod.plan_access(bed, fai, str(tmp_path / "windows.bed"))
+
+    assert strategy == "targets"
+    assert options == f"-T {bed}"
+
+
+def test_plan_access_forced_regions(tmp_path, load_module):
+    mod = load_module("mpileup_regions", "sample_analysis/scripts/01_mpileup_regions.py")
+    bed = _write(tmp_path / "catalog.bed", "chr1\t0\t100\n")
+    fai = _write(tmp_path / "reference.fa.fai", "chr1\t1000\t6\t60\t61\n")
+
+    strategy, options = mod.plan_access(bed, fai, str(tmp_path / "w.bed"), strategy="regions")
+
+    assert (strategy, options) == ("regions", f"-R {bed}")
@@ -0,0 +1,52 @@
+import os
+
+import output_cache
+
+
+def test_key_follows_content_not_paths(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    a = tmp_path / "a.bam"
+    b = tmp_path / "b.bam"
+    a.write_text("reads")
+    b.write_text("reads")
+
+    key = output_cache.cache_key(["cmd", "15"], [str(a)], cache_dir)
+    assert output_cache.cache_key(["cmd", "15"], [str(b)], cache_dir) == key
+    assert output_cache.cache_key(["cmd", "20"], [str(a)], cache_dir) != key
+    b.write_text("other reads")
+    assert output_cache.cache_key(["cmd", "15"], [str(b)], cache_dir) != key
+
+
+def test_large_input_digest_remembered(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_cache, "MEMO_SIZE", 1)
+    cache_dir = str(tmp_path / "cache")
+    bam = tmp_path / "a.bam"
+    bam.write_text("reads")
+
+    digest = output_cache.input_digest(str(bam), cache_dir)
+    assert digest == output_cache.file_digest(str(bam))
+    assert len(os.listdir(tmp_path / "cache" / "digests")) == 1
+    # A new version of the file (size or mtime) is hashed again
+    bam.write_text("more reads")
+    assert output_cache.input_digest(str(bam), cache_dir) != digest
+
+
+def test_store_and_restore(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    os.makedirs(cache_dir)
+    entry = os.path.join(cache_dir, "key")
+    outputs = [str(tmp_path / "run1" / "s.vcf.gz"), str(tmp_path / "run1" / "s.vcf.gz.csi")]
+    assert not output_cache.restore(entry, outputs)
+
+    os.makedirs(tmp_path / "run1")
+    for path, text in zip(outputs, ["vcf", "csi"]):
+        with open(path, "w") as f:
+            f.write(text)
+    assert output_cache.store(entry, outputs, cache_dir)
+    assert not output_cache.store(entry, outputs, cache_dir)
+
+    restored = [path.replace("run1", "run2") for path in outputs]
+    assert output_cache.restore(entry, restored)
+    assert [open(path).read() for path in restored] == ["vcf", "csi"]
+    # No temporary entries left behind
+    assert sorted(os.listdir(cache_dir)) == ["key"]
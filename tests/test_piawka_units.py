@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+
+@pytest.fixture
+def mod(load_module):
+    return load_module("piawka_units", "population_analysis/scripts/piawka_units.py")
+
+
+POPULATIONS = {"A": ["a1", "a2"], "B": ["b1"], "C": ["c1", "c2"]}
+
+
+def by_group(unit_map):
+    # Unit key of each population or pair, from its groups file text
+    return {
+        tuple(sorted({line.split("\t")[1] for line in members.splitlines()})): key
+        for key, (_n, members) in unit_map.items()
+    }
+
+
+def test_membership_change_rekeys_only_affected_units(mod):
+    before = by_group(mod.units(POPULATIONS, "numpy" + "bed" + "vcf"))
+    assert len(before) == 6
+
+    moved = {"A": ["a1"], "B": ["a2", "b1"], "C": ["c1", "c2"]}
+    after = by_group(mod.units(moved, "numpy" + "bed" + "vcf"))
+    changed = {group for group in before if before[group] != after[group]}
+    assert changed == {("A",), ("B",), ("A", "B"), ("A", "C"), ("B", "C")}
+    assert after[("C",)] == before[("C",)]
+
+    # New input files re-key every unit
+    rerun = by_group(mod.units(POPULATIONS, "numpy" + "bed" + "vcf2"))
+    assert not set(rerun.values()) & set(before.values())
+
+
+def test_existing_groups_files_reused(mod, tmp_path):
+    cache_dir = str(tmp_path)
+    unit_map = mod.units(POPULATIONS, "files")
+    assert sorted(mod.write_groups(cache_dir, "", unit_map)) == sorted(unit_map)
+    c_key = by_group(unit_map)[("C",)]
+    c_file = tmp_path / f"unit.{c_key}.groups"
+    assert c_file.read_text() == "c1\tC\nc2\tC\n"
+    os.utime(c_file, (0, 0))
+
+    moved = {"A": ["a1"], "B": ["a2", "b1"], "C": ["c1", "c2"]}
+    written = mod.write_groups(cache_dir, "", mod.units(moved, "files"))
+    assert len(written) == 5 and c_key not in written
+    assert c_file.stat().st_mtime == 0
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_fingerprint_and_populations(mod, tmp_path):
+    vcf = tmp_path / "all.vcf.gz"
+    assert mod.fingerprint(str(vcf)) == "missing"
+    vcf.write_bytes(b"x" * 10)
+    (tmp_path / "all.vcf.gz.csi").write_bytes(b"index")
+    first = mod.fingerprint(str(vcf))
+    vcf.write_bytes(b"x" * 11)
+    assert mod.fingerprint(str(vcf)) != first
+
+    popmap = tmp_path / "pop_index.txt"
+    popmap.write_text("b1\tB\na2\tA\na1\tA\n\n")
+    assert mod.read_populations(str(popmap)) == {"A": ["a1", "a2"], "B": ["b1"]}
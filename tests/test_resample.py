@@ -0,0 +1,68 @@
+import numpy as np
+import polars as pl
+import resample
+
+
+def test_block_expr_units():
+    df = pl.DataFrame({"locus": ["chr_1_1500_1600", "chr2_2500000_2500100", "odd"]})
+    assert df.select(resample.block_expr("jackknife", 0))["block"].to_list() == [
+        "chr_1",
+        "chr2",
+        "odd",
+    ]
+    assert df.select(resample.block_expr("bootstrap", 1_000_000))["block"].to_list() == [
+        "chr_1:0",
+        "chr2:2",
+        "odd:0",
+    ]
+    assert (
+        df.select(resample.block_expr("bootstrap", 0))["block"].to_list() == df["locus"].to_list()
+    )
+
+
+def test_jackknife_matches_leave_one_out_loop():
+    rng = np.random.default_rng(0)
+    num = rng.integers(0, 10, size=(6, 2)).astype(float)
+    den = rng.integers(50, 100, size=(6, 2)).astype(float)
+
+    low, high = resample.jackknife(num, den, 0.95)
+
+    for g in range(2):
+        reps = [np.delete(num[:, g], i).sum() / np.delete(den[:, g], i).sum() for i in range(6)]
+        se = np.sqrt(5 / 6 * sum((r - np.mean(reps)) ** 2 for r in reps))
+        estimate = num[:, g].sum() / den[:, g].sum()
+        assert np.isclose(low[g], estimate - 1.959963984540054 * se)
+        assert np.isclose(high[g], estimate + 1.959963984540054 * se)
+
+
+def test_bootstrap_reproducible_and_brackets_estimate():
+    rng = np.random.default_rng(1)
+    num = rng.integers(0, 10, size=(200, 3)).astype(float)
+    den = rng.integers(50, 100, size=(200, 3)).astype(float)
+
+    one = resample.bootstrap(num, den, 600, 0.9, seed=7, threads=1)
+    many = resample.bootstrap(num, den, 600, 0.9, seed=7, threads=4)
+
+    assert np.array_equal(one[0], many[0]) and np.array_equal(one[1], many[1])
+    estimate = num.sum(axis=0) / den.sum(axis=0)
+    assert np.all(one[0] < estimate) and np.all(estimate < one[1])
+
+
+def test_confidence_intervals_by_group():
+    blocks = pl.DataFrame(
+        {
+            "pop1": ["A", "A", "B", "B"],
+            "block": ["chr1", "chr2", "chr1", "chr2"],
+            "numerator": [1.0, 3.0, 2.0, None],
+            "denominator": [10.0, 10.0, 10.0, 0.0],
+        }
+    )
+
+    ci = resample.confidence_intervals(
+        blocks, ["pop1"], "numerator", "denominator", "het", "jackknife"
+    )
+
+    assert ci.columns == ["pop1", "het_low", "het_high"]
+    assert ci["pop1"].to_list() == ["A", "B"]
+    # B has one informative block, so its leave-one-out replicates are 0.2 and 0
+    assert ci["het_low"][1] < 0.2 < ci["het_high"][1]
@@ -0,0 +1,44 @@
+def test_split_bed_balanced_contiguous_shards(tmp_path, load_module):
+    mod = load_module("split_bed", "sample_analysis/scripts/01_split_bed.py")
+    rows = [
+        "chr1\t0\t100\n",
+        "chr1\t200\t300\n",
+        "chr1\t400\t500\n",
+        "chr2\t0\t100\n",
+        "chr2\t150\t250\n",
+        "chr3\t0\t100\n",
+    ]
+    bed_path = tmp_path / "catalog.bed"
+    bed_path.write_text("".join(rows))
+
+    outputs = [str(tmp_path / f"catalog.shard{k}.bed") for k in range(3)]
+    mod.split_bed(str(bed_path), outputs)
+
+    shards = [open(path).readlines() for path in outputs]
+    # Shards concatenate back to the input, in order, with equal bases here
+    assert sum(shards, []) == rows
+    assert [len(s) for s in shards] == [2, 2, 2]
+
+
+def test_split_bed_more_shards_than_rows(tmp_path, load_module):
+    mod = load_module("split_bed", "sample_analysis/scripts/01_split_bed.py")
+    bed_path = tmp_path / "catalog.bed"
+    bed_path.write_text("chr1\t0\t100\n")
+
+    outputs = [str(tmp_path / f"catalog.shard{k}.bed") for k in range(3)]
+    mod.split_bed(str(bed_path), outputs)
+
+    assert [open(path).read() for path in outputs] == ["chr1\t0\t100\n", "", ""]
+
+
+def test_split_bed_no_empty_shard(tmp_path, load_module):
+    mod = load_module("split_bed", "sample_analysis/scripts/01_split_bed.py")
+    # One large locus would otherwise fill the first shards on its own
+    rows = ["chr1\t0\t10000\n", "chr1\t20000\t20010\n", "chr2\t0\t10\n"]
+    bed_path = tmp_path / "catalog.bed"
+    bed_path.write_text("".join(rows))
+
+    outputs = [str(tmp_path / f"catalog.shard{k}.bed") for k in range(3)]
+    mod.split_bed(str(bed_path), outputs)
+
+    assert [open(path).readlines() for path in outputs] == [[r] for r in rows]
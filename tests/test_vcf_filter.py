@@ -0,0 +1,42 @@
+import io
+
+HEADER = (
+    "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t00-reads/A.bam\n"
+)
+
+
+def run(mod, body, **kwargs):
+    out = io.StringIO()
+    kept = mod.filter_vcf(io.StringIO(HEADER + body), out, **kwargs)
+    lines = out.getvalue().splitlines()
+    return kept, lines
+
+
+def test_renames_and_filters_like_vcftools(load_module):
+    mod = load_module("vcf_filter", "sample_analysis/scripts/02_vcf_filter.py")
+    body = (
+        "chr1\t1\t.\tA\tG\t50\t.\t.\tGT:DP:GQ\t0/1:20:40\n"  # kept
+        "chr1\t2\t.\tA\t.\t50\t.\t.\tGT:DP:GQ\t0/0:10:40\n"  # DP < 15: missing, dropped
+        "chr1\t3\t.\tA\tG\t50\t.\t.\tGT:DP:GQ\t1/1:20:.\n"  # no GQ: missing, dropped
+        "chr1\t4\t.\tA\tAT\t50\t.\t.\tGT:DP:GQ\t0/1:20:40\n"  # indel
+        "chr1\t5\t.\tAC\tGT\t50\t.\t.\tGT:DP:GQ\t0/1:20:40\n"  # MNP, kept
+        "chr1\t6\t.\tA\tG\t50\t.\t.\tGT:DP\t0|1:20\n"  # no GQ key: not filtered on it
+    )
+    kept, lines = run(mod, body, min_dp=15, min_gq=30, max_missing=1, remove_indels=True)
+
+    assert lines[1].endswith("FORMAT\tA")
+    assert [line.split("\t")[1] for line in lines[2:]] == ["1", "5", "6"]
+    assert kept == 3
+
+
+def test_filtered_genotypes_kept_as_missing(load_module):
+    mod = load_module("vcf_filter", "sample_analysis/scripts/02_vcf_filter.py")
+    body = "chr1\t1\t.\tA\tG\t50\t.\t.\tGT:DP\t0|1:3\n"
+
+    # Without a missingness filter the site stays, with the genotype masked
+    _, lines = run(mod, body, min_dp=15)
+    assert lines[-1].endswith("\t.|.:3")
+    _, lines = run(mod, body, min_dp=15, max_missing=2)
+    assert len(lines) == 3
+    _, lines = run(mod, body, min_dp=15, max_missing=1)
+    assert len(lines) == 2
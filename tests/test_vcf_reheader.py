@@ -83,3 +83,71 @@ def test_reheader_vcf_skips_when_already_clean(tmp_path, load_module):
     changed = mod.reheader_vcf(str(vcf), str(out), gzip=True)
     assert changed is False
     assert not out.exists()
+
+
+def test_reheader_vcf_bgzf_splices_header_blocks(tmp_path, load_module):
+    mod = load_module("vcf_reheader", "sample_analysis/scripts/01_vcf_reheader.py")
+    import bgzf
+
+    vcf = tmp_path / "in.vcf.gz"
+    out = tmp_path / "out.vcf.gz"
+
+    header = (
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsome/dir/a.bam\tsome/dir/b.bam\n"
+    )
+    first = "chr1\t2\t.\tC\tT\t.\t.\t.\tGT\t0/0\t0/1\n"
+    body = "".join(f"chr1\t{i}\t.\tC\tT\t.\t.\t.\tGT\t0/0\t0/1\n" for i in range(3, 20000))
+    # Header and first record share a block, the body sits in blocks of its own
+    head_blocks = bgzf.compress((header + first).encode())
+    body_blocks = bgzf.compress(body.encode()) + bgzf.EOF_BLOCK
+    vcf.write_bytes(head_blocks + body_blocks)
+
+    changed = mod.reheader_vcf_bgzf(str(vcf), str(out))
+    assert changed is True
+
+    raw = out.read_bytes()
+    # Body blocks are copied verbatim
+    assert raw.endswith(body_blocks)
+    lines = gzip.decompress(raw).decode().splitlines()
+    assert lines[1] == "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ta\tb"
+    assert lines[2:] == (first + body).splitlines()
+    assert bgzf.is_bgzf(str(out))
+
+
+def test_reheader_vcf_bgzf_skips_when_already_clean(tmp_path, load_module):
+    mod = load_module("vcf_reheader", "sample_analysis/scripts/01_vcf_reheader.py")
+    import bgzf
+
+    vcf = tmp_path / "in2.vcf.gz"
+    out = tmp_path / "out2.vcf.gz"
+
+    header = "##source=test\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ta\tb\n"
+    body = "chr1\t3\t.\tG\tA\t.\t.\t.\tGT\t0/1\t1/1\n"
+    vcf.write_bytes(bgzf.compress((header + body).encode()) + bgzf.EOF_BLOCK)
+
+    changed = mod.reheader_vcf_bgzf(str(vcf), str(out))
+    assert changed is False
+    assert not out.exists()
+
+
+def test_reheader_vcf_writes_bgzf(tmp_path, load_module):
+    mod = load_module("vcf_reheader", "sample_analysis/scripts/01_vcf_reheader.py")
+    import bgzf
+
+    vcf = tmp_path / "in.vcf.gz"
+    out = tmp_path / "out.vcf.gz"
+
+    header = (
+        "##fileformat=VCFv4.2\n"
+        "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsome/dir/a.bam\tsome/dir/b.bam\n"
+    )
+    body = "chr1\t2\t.\tC\tT\t.\t.\t.\tGT\t0/0\t0/1\n"
+    make_gz(vcf, header + body)
+
+    changed = mod.reheader_vcf(str(vcf), str(out), gzip=True, bgzip=True)
+    assert changed is True
+    assert bgzf.is_bgzf(str(out))
+    lines = gzip.decompress(out.read_bytes()).decode().splitlines()
+    assert lines[1] == "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\ta\tb"
+    assert lines[2] == "chr1\t2\t.\tC\tT\t.\t.\t.\tGT\t0/0\t0/1"
@@ -0,0 +1,63 @@
+def parse_tsv(path):
+    lines = [line for line in path.read_text().splitlines() if line]
+    header = lines[0].split("\t")
+    return header, [r.split("\t") for r in lines[1:]]
+
+
+def test_window_piawka_fixed_windows(tmp_path, load_module):
+    mod = load_module("window_piawka", "sample_analysis/scripts/03_window_piawka.py")
+
+    infile = tmp_path / "piawka_het.tsv"
+    lines = [
+        "chr1_100_200\t100\tA\t.\t90\thet\t0.1\t1\t10\n",
+        "chr1_1500_1600\t100\tA\t.\t90\thet\t0.2\t2\t10\n",
+        "chr1_1700_1800\t100\tA\t.\t90\thet\t0.1\t1\t10\n",
+        # Chromosome names may contain '_'
+        "scaf_1_2500_2600\t100\tA\t.\t90\thet\t0.1\t3\t30\n",
+        "chr1_1500_1600\t100\tB\t.\t90\thet\t0\t0\t0\n",
+    ]
+    infile.write_text("".join(lines))
+    outfile = tmp_path / "window_het_table.tsv"
+
+    mod.window_piawka(str(infile), str(outfile), window_size=1000)
+
+    header, rows = parse_tsv(outfile)
+    assert header == [
+        "chrom",
+        "start",
+        "end",
+        "metric",
+        "pop1",
+        "pop2",
+        "nLoci",
+        "numerator",
+        "denominator",
+        "value",
+    ]
+    assert rows == [
+        ["chr1", "0", "1000", "het", "A", ".", "1", "1.0", "10.0", "0.1"],
+        ["chr1", "1000", "2000", "het", "A", ".", "2", "3.0", "20.0", "0.15"],
+        ["scaf_1", "2000", "3000", "het", "A", ".", "1", "3.0", "30.0", "0.1"],
+        ["chr1", "1000", "2000", "het", "B", ".", "1", "0.0", "0.0", "0.0"],
+    ]
+
+
+def test_window_piawka_sliding_windows(tmp_path, load_module):
+    mod = load_module("window_piawka", "sample_analysis/scripts/03_window_piawka.py")
+
+    infile = tmp_path / "piawka_pi_dxy_fst.tsv"
+    lines = [
+        "chr1_100_200\t100\tP\tQ\t90\tDxy\t0.1\t1\t10\t5\t0\n",
+        "chr1_1500_1600\t100\tP\tQ\t90\tDxy\t0.2\t2\t10\t5\t0\n",
+    ]
+    infile.write_text("".join(lines))
+    outfile = tmp_path / "window.tsv"
+
+    mod.window_piawka(str(infile), str(outfile), window_size=2000, step=1000)
+
+    _, rows = parse_tsv(outfile)
+    # The locus at 1550 lies in both [0, 2000) and [1000, 3000)
+    assert [(r[1], r[2], r[6], r[9]) for r in rows] == [
+        ("0", "2000", "2", "0.15"),
+        ("1000", "3000", "1", "0.2"),
+    ]